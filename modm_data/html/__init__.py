@@ -7,7 +7,7 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # -----------------------------------------------------------------------------
 
-from .document import Document
+from .document import Document, read_manifest, write_manifest
 from .chapter import Chapter
 from .table import Table
 from .text import Text, Heading, replace, listify
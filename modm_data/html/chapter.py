@@ -13,21 +13,48 @@ from pathlib import Path
 from functools import cached_property
 from .parser import Parser
 from .table import Table
-from .text import Heading, Text
+from .text import Heading, Text, replace as html_replace
 
 LOGGER = logging.getLogger(__name__)
 
 
 class Chapter:
-    def __init__(self, path: str):
+    def __init__(self, path: str, backend: str = "lxml", manifest: dict = None):
         self._path = Path(path)
+        self._backend = backend
+        self._manifest = manifest
 
     @cached_property
     def _parser(self):
         parser = Parser()
-        parser.feed(self._path.read_text())
+        if self._backend == "lxml":
+            parser.feed_lxml(self._path.read_text())
+        else:
+            parser.feed(self._path.read_text())
         return parser
 
+    @cached_property
+    def _items(self) -> list:
+        return self._parser._items
+
+    @property
+    def _key(self) -> tuple[int, int]:
+        # Identifies the file version for the chapter cache
+        stat = self._path.stat()
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @cached_property
+    def _summarized(self) -> bool:
+        # The manifest avoids parsing the chapter, unless the file has changed
+        return self._manifest is not None and self._manifest["key"] == list(self._key)
+
+    def _summary(self, key: str) -> list[str]:
+        if "_items" not in self.__dict__ and self._summarized:
+            return self._manifest[key]
+        if key == "headings":
+            return [h.html for h in self.headings()]
+        return [t._caption.html for t in self.tables()]
+
     @property
     def _relpath(self) -> str:
         return self._path.relative_to(Path().cwd())
@@ -42,9 +69,11 @@ class Chapter:
 
     @property
     def items(self) -> list:
-        return self._parser._items
+        return self._items
 
     def headings(self) -> list[str]:
+        if "_items" not in self.__dict__ and self._summarized:
+            return [Heading(h) for h in self._manifest["headings"]]
         return [h for h in self.items if isinstance(h, Heading)]
 
     def texts(self) -> list[str]:
@@ -67,9 +96,14 @@ class Chapter:
                     ht[0].text(**subs) if ht[0] is not None else "-1", re.IGNORECASE)]
 
     def tables(self, pattern: str = None, **subs) -> list[Table]:
-        tables = [t for t in self.items if isinstance(t, Table)]
-        if pattern is None: return tables
-        return [t for t in tables if re.search(pattern, t.caption(**subs), re.IGNORECASE)]
+        if pattern is None:
+            return [t for t in self.items if isinstance(t, Table)]
+        # Only parse the chapter if any of its table captions match
+        offsets = [ii for ii, caption in enumerate(self._summary("tables"))
+                   if re.search(pattern, html_replace(caption, **subs), re.IGNORECASE)]
+        if not offsets: return []
+        tables = self.tables()
+        return [tables[ii] for ii in offsets]
 
     def table(self, pattern: str) -> Table:
         tables = self.tables(pattern)
@@ -80,6 +114,12 @@ class Chapter:
         assert len(tables) == 1
         return tables[0]
 
+    def summary(self) -> dict:
+        """Returns the manifest entry of this chapter."""
+        return {"file": self._path.name, "name": self.name, "number": self.number,
+                "key": list(self._key), "headings": self._summary("headings"),
+                "tables": self._summary("tables")}
+
     def __hash__(self) -> int:
         return hash(self._path.stem)
 
@@ -7,33 +7,97 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # -----------------------------------------------------------------------------
 
+import os
 import re
+import json
+import pickle
 import logging
+import tempfile
 from pathlib import Path
 from functools import cached_property
 from .chapter import Chapter
 
 LOGGER = logging.getLogger(__name__)
 
+# Increment whenever the parsed chapter items change
+CHAPTER_CACHE_VERSION = 1
+MANIFEST_VERSION = 1
+
 
 class Document:
-    def __init__(self, path: str):
+    def __init__(self, path: str, backend: str = "lxml"):
         self.path = Path(path)
+        self._backend = backend
         self.fullname = self.path.stem
         self.name = self.fullname.split("-")[0]
         self.version = self.fullname.split("-")[1]
 
+    @cached_property
+    def _manifest(self) -> dict:
+        manifest = read_manifest(self.path)
+        return {} if manifest is None else {entry["file"]: entry for entry in manifest}
+
     @cached_property
     def _chapters(self) -> dict[str, Chapter]:
+        # The manifest is only used if it lists exactly the chapter files, since
+        # they may have been added, renamed or removed after it was written
+        paths = {path.name: path for path in self.path.glob("*.html")}
+        manifest = self._manifest
+        if manifest and manifest.keys() != paths.keys():
+            LOGGER.warning(f"Ignoring outdated chapter manifest of '{self.path}'!")
+            manifest = {}
         chapters = {}
-        for path in self.path.glob("*.html"):
-            chapters[path.stem.replace("_", " ")] = Chapter(path)
+        for name in (manifest or paths):
+            path = paths[name]
+            chapters[path.stem.replace("_", " ")] = Chapter(path, self._backend, manifest.get(name))
         return chapters
 
     @cached_property
     def path_pdf(self) -> str:
         return Path(str(self.path).replace("-html", "-pdf") + ".pdf")
 
+    @property
+    def _cache_file(self) -> Path:
+        # The parser backends may produce different items
+        return self.path / f"chapters-{self._backend}.pickle"
+
+    def _read_cache(self) -> dict:
+        try:
+            version, entries = pickle.loads(self._cache_file.read_bytes())
+        except FileNotFoundError:
+            return {}
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError) as error:
+            LOGGER.warning(f"Ignoring broken chapter cache '{self._cache_file}': {error}")
+            return {}
+        return entries if version == CHAPTER_CACHE_VERSION else {}
+
+    def _write_cache(self, entries: dict):
+        # Write atomically, multiple processes may load the same document
+        data = pickle.dumps((CHAPTER_CACHE_VERSION, entries), protocol=pickle.HIGHEST_PROTOCOL)
+        with tempfile.NamedTemporaryFile(dir=self.path, suffix=".pickle", delete=False) as file:
+            file.write(data)
+        os.replace(file.name, self._cache_file)
+
+    def preload(self):
+        """
+        Loads the items of all chapters with one read from the binary cache
+        next to the chapter files, with one cache per parser backend. The cache
+        entries are keyed by the file name, modification time and size, so
+        changed chapters are parsed again and then stored back into the cache.
+        """
+        entries = self._read_cache()
+        chapters = {c._path.name: c for c in self._chapters.values()}
+        stale = entries.keys() != chapters.keys()
+        for name, chapter in chapters.items():
+            key = chapter._key
+            if (entry := entries.get(name)) is not None and entry[0] == key:
+                chapter._items = entry[1]
+            else:
+                entries[name] = (key, chapter.items)
+                stale = True
+        if stale:
+            self._write_cache({name: entries[name] for name in chapters})
+
     def chapters(self, pattern: str = None) -> list[Chapter]:
         if pattern is None:
             return list(self._chapters.values())
@@ -51,3 +115,26 @@ class Document:
 
     def __repr__(self) -> str:
         return f"Doc({self.fullname})"
+
+
+def read_manifest(path) -> list[dict]:
+    """Returns the chapter entries of the manifest in the document folder or None."""
+    try:
+        manifest = json.loads((Path(path) / "chapters.json").read_text())
+    except FileNotFoundError:
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest["chapters"]
+
+
+def write_manifest(path):
+    """
+    Writes a manifest of all chapters in the document folder with their
+    headings and table captions, so that chapters and tables can be found
+    without parsing all chapters.
+    """
+    path = Path(path)
+    chapters = sorted((Chapter(p) for p in path.glob("*.html")), key=lambda c: c.number)
+    manifest = {"version": MANIFEST_VERSION, "chapters": [c.summary() for c in chapters]}
+    (path / "chapters.json").write_text(json.dumps(manifest, indent=2))
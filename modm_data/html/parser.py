@@ -12,11 +12,21 @@ import os.path
 import logging
 from functools import cached_property
 from html.parser import HTMLParser
+import lxml.html
+from lxml import etree
 from .table import Table, Cell
 from .text import Text, Heading
 
 LOGGER = logging.getLogger(__name__)
 
+_HEADINGS = {f"h{level}" for level in range(1, 7)}
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input",
+              "link", "meta", "param", "source", "track", "wbr"}
+# HTMLParser only closes void tags written as self-closing, which lxml drops
+_VOID_TAG = re.compile(r"<!--.*?-->|<(" + "|".join(sorted(_VOID_TAGS)) + r")\b[^>]*?(/?)>",
+                       re.DOTALL | re.IGNORECASE)
+
+
 class Parser(HTMLParser):
     def __init__(self):
         super().__init__(convert_charrefs=True)
@@ -29,21 +39,21 @@ class Parser(HTMLParser):
         self._tx = -1
         self._table = None
         self._cell = None
-        self._data = ""
+        self._data = []
         self._collect_data = False
 
     def _clear_data(self):
         self._collect_data = False
-        data = self._data.replace("\n", "").replace("\r", "")
+        data = "".join(self._data).replace("\n", "").replace("\r", "")
         data = data.strip()
         return data
 
     def handle_starttag(self, tag, attrs):
         if self._collect_data and tag not in self._ignore_tags:
-            self._data += f"<{tag}>"
+            self._data.append(f"<{tag}>")
 
         if tag in ["table", "th", "tr", "td", "caption"]:
-            self._data = ""
+            self._data = []
             self._collect_data = True
             if tag == "table":
                 heading = next((i for i in reversed(self._items) if isinstance(i, Heading)), None)
@@ -59,13 +69,13 @@ class Parser(HTMLParser):
                 txs = next((a[1] for a in  attrs if a[0] == "colspan"), 1)
                 self._cell = Cell(self._tx, self._ty, int(txs), int(tys), tag == "th")
 
-        elif re.match(r"h[1-6]", tag):
-            self._data = ""
+        elif tag in _HEADINGS:
+            self._data = []
             self._collect_data = True
             self._type = "h"
 
         elif self._type is None:
-            self._data = ""
+            self._data = []
             self._collect_data = True
             self._type = (tag, len(self._tags))
 
@@ -73,12 +83,12 @@ class Parser(HTMLParser):
 
     def handle_data(self, data):
         if self._collect_data:
-            self._data += data
+            self._data.append(data)
 
     def handle_endtag(self, tag):
         self._tags.pop()
 
-        if re.match(r"h[1-6]", tag):
+        if tag in _HEADINGS:
             self._items.append(Heading(self._clear_data()))
             self._type = None
 
@@ -103,7 +113,31 @@ class Parser(HTMLParser):
             self._items.append(Text(self._clear_data()))
 
         if self._collect_data and tag not in self._ignore_tags:
-            self._data += f"</{tag}>"
-
-
-
+            self._data.append(f"</{tag}>")
+
+    def feed_lxml(self, html: str):
+        """
+        Parses the HTML with lxml instead of the pure Python tokenizer and
+        calls the same handlers with the same sequence of tags and data.
+        """
+        root = lxml.html.document_fromstring(html)
+        self_closing = (m.group(2) == "/" for m in _VOID_TAG.finditer(html) if m.group(1))
+        closed = True
+        for event, element in etree.iterwalk(root, events=("start", "end")):
+            if not isinstance(element.tag, str):
+                # Comments and processing instructions only contribute their tail
+                if event == "end" and element.tail:
+                    self.handle_data(element.tail)
+                continue
+            if event == "start":
+                # Void elements have no children, so their end event follows
+                if element.tag in _VOID_TAGS:
+                    closed = next(self_closing, True)
+                self.handle_starttag(element.tag, element.items())
+                if element.text:
+                    self.handle_data(element.text)
+            else:
+                if element.tag not in _VOID_TAGS or closed:
+                    self.handle_endtag(element.tag)
+                if element.tail:
+                    self.handle_data(element.tail)
@@ -10,7 +10,7 @@
 import re
 from functools import cached_property
 from collections import defaultdict
-from .text import replace as html_replace, ReDict, Text
+from .text import replace as html_replace, ReDict, Text, Heading
 
 
 class Cell(Text):
@@ -51,11 +51,13 @@ class Domains:
     def cells(self, pattern_x: str, pattern_y: str = None, **subs) -> list[Cell]:
         domains_y = self.domains_y(pattern_y, **subs)
         domains_x = self._table.domains_x(pattern_x, **subs)
+        index_x = self._table._domains_x(**subs)
+        index_y = self._table._domains_y(self._columns, **subs)
         cells = defaultdict(lambda: defaultdict(set))
         for dom_y in domains_y:
             for dom_x in domains_x:
-                for x in self._table._domains_x(**subs)[dom_x]:
-                    for y in self._table._domains_y(self._columns, **subs)[dom_y]:
+                for x in index_x[dom_x]:
+                    for y in index_y[dom_y]:
                         # print(x, y, dom_x, dom_y)
                         cells[dom_y][dom_x].add(self._table.cell(x, y))
 
@@ -73,6 +75,8 @@ class Table:
         self._grid = None
         self._hrows = 0
         self._caption = Text("")
+        # Domain indexes per substitution set, valid after normalization
+        self._domain_cache = {}
 
     def heading(self, **filters):
         return self._heading.text(**filters)
@@ -81,6 +85,12 @@ class Table:
         return self._caption.text(**filters)
 
     def _domains_x(self, **subs) -> dict[str, list[int]]:
+        key = ("x", tuple(subs.items()))
+        if (domains := self._domain_cache.get(key)) is None:
+            domains = self._domain_cache[key] = self._build_domains_x(subs)
+        return domains
+
+    def _build_domains_x(self, subs) -> dict[str, list[int]]:
         domains = defaultdict(list)
         for x in range(self.columns):
             cell = None
@@ -94,6 +104,12 @@ class Table:
         return dict(domains)
 
     def _domains_y(self, columns: list[int], **subs) -> dict[str, list[int]]:
+        key = ("y", tuple(columns), tuple(subs.items()))
+        if (domains := self._domain_cache.get(key)) is None:
+            domains = self._domain_cache[key] = self._build_domains_y(columns, subs)
+        return domains
+
+    def _build_domains_y(self, columns: list[int], subs) -> dict[str, list[int]]:
         domains = defaultdict(list)
         for y in range(self._hrows, self.rows):
             cell = None
@@ -107,26 +123,28 @@ class Table:
                 domains[domain].append(y)
         return dict(domains)
 
+    def _columns_x(self, pattern, **subs) -> list[tuple[str, list[int]]]:
+        # The (domain, columns) matching the pattern in column order
+        key = ("match", pattern, tuple(subs.items()))
+        if (columns := self._domain_cache.get(key)) is None:
+            columns = self._domain_cache[key] = [
+                (domain, cols) for domain, cols in self._domains_x(**subs).items()
+                if pattern is None or re.search(pattern, domain, re.IGNORECASE)]
+        return columns
+
     def domains_x(self, pattern=None, **subs) -> list[str]:
-        domains = sorted(self._domains_x(**subs).keys())
-        if pattern is not None:
-            domains = [d for d in domains if re.search(pattern, d, re.IGNORECASE)]
-        return domains
+        return sorted(domain for domain, _ in self._columns_x(pattern, **subs))
 
     def domains(self, pattern: str, **subs) -> Domains:
         domains = []
         columns = []
-        for domain, cols in self._domains_x(**subs).items():
-            if re.search(pattern, domain, re.IGNORECASE):
-                domains.append(domain)
-                columns.extend(cols)
+        for domain, cols in self._columns_x(pattern, **subs):
+            domains.append(domain)
+            columns.extend(cols)
         return Domains(self, domains, columns, pattern)
 
     def cell_rows(self, pattern: str = None, **subs) -> dict[str, list[Cell]]:
-        columns = []
-        for domain, cols in self._domains_x(**subs).items():
-            if pattern is None or re.search(pattern, domain, re.IGNORECASE):
-                columns.append((domain, cols))
+        columns = self._columns_x(pattern, **subs)
         for y in range(self._hrows, self.rows):
             values = defaultdict(list)
             for domain, cols in columns:
@@ -154,6 +172,7 @@ class Table:
         return self._grid[y][x]
 
     def _normalize(self):
+        self._domain_cache = {}
         xsize = sum(c._span[0] for c in self._cells if c._pos[0][1] == 0)
         ysize = max(c._pos[0][1] + c._span[1] for c in self._cells)
         self._size = (xsize, ysize)
@@ -175,6 +194,12 @@ class Table:
                     cell._pos.append((x, y))
             xpos += cell._span[0]
 
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # The domain indexes are rebuilt on demand
+        state["_domain_cache"] = {}
+        return state
+
     def render(self):
         for y in range(self._size[1]):
             for x in range(self._size[0]):
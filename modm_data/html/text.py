@@ -8,30 +8,45 @@
 # -----------------------------------------------------------------------------
 
 import re
+from functools import cache, lru_cache
 
+# The formatting tags that are stripped by default
+_TAGS = ("u", "i", "b", "sub", "sup", "br", "p")
 
-def replace(html, **substitutions) -> str:
-    subs = {
-        "u": "*", "i": "*", "b": "*",
-        "sub": "*", "sup": "*",
-        "br": "*", "p": "*"
-    }
+
+@cache
+def _plan(substitutions: tuple) -> list:
+    # Compiles the substitutions once into (pattern, replacement) steps, which
+    # are applied one after the other, so that nested tags are stripped too.
+    subs = dict.fromkeys(_TAGS, "*")
     subs.update(substitutions)
+    plan = []
     for tag, replacement in subs.items():
-        if tag in {"u", "i", "b", "p", "br", "sup", "sub"}:
+        if tag in _TAGS:
             if replacement == "*":
-                try:
-                    html = re.sub(f"</?{tag}>", "", html)
-                except:
-                    print(html)
-                    raise
+                plan.append((re.compile(f"</?{tag}>"), ""))
             else:
-                html = re.sub(f"<{tag}>(.*?)</{tag}>", replacement, html)
+                plan.append((re.compile(f"<{tag}>(.*?)</{tag}>"), replacement))
         else:
-            html = re.sub(tag, replacement, html)
+            plan.append((re.compile(tag), replacement))
+    return plan
+
+
+@lru_cache(maxsize=2**16)
+def _replace(html, substitutions: tuple) -> str:
+    try:
+        for pattern, replacement in _plan(substitutions):
+            html = pattern.sub(replacement, html)
+    except:
+        print(html)
+        raise
     return html
 
 
+def replace(html, **substitutions) -> str:
+    return _replace(html, tuple(substitutions.items()))
+
+
 def listify(text, pattern=None, strip=True) -> list[str]:
     if pattern is None: pattern = " |,|/|<br>"
     text = re.split(pattern, text)
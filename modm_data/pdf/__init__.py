@@ -8,8 +8,9 @@
 # -----------------------------------------------------------------------------
 
 from .document import Document
+from .search import SearchIndex, SearchResult
 from .page import Page
-from .character import Character
+from .character import Character, FontStyle
 from .link import ObjLink, WebLink
 from .path import Path
 from .image import Image
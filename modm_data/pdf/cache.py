@@ -0,0 +1,219 @@
+# Copyright (c) 2022, Niklas Hauser
+#
+# This file is part of the modm-data project.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# -----------------------------------------------------------------------------
+
+import os
+import json
+import fcntl
+import hashlib
+import logging
+import tempfile
+import numpy
+from pathlib import Path as _FsPath
+from ..utils import Rectangle, cache_path, PROFILER
+from .character import localize_fonts, intern_fonts
+from .path import Path
+from .image import Image
+from .link import ObjLink, WebLink
+
+LOGGER = logging.getLogger(__name__)
+
+# Increment whenever the extraction or the stored layout changes, so that
+# stale cache entries are ignored instead of being loaded.
+EXTRACTOR_VERSION = 2
+
+_PATH_DTYPE = numpy.dtype([
+    ("bbox", numpy.float64, (4,)),
+    ("count", numpy.int32),
+    ("fill", numpy.uint32),
+    ("stroke", numpy.uint32),
+    ("width", numpy.float64),
+    ("cap", numpy.int8),
+    ("join", numpy.int8),
+])
+
+_OBJLINK_DTYPE = numpy.dtype([
+    ("bbox", numpy.float64, (4,)),
+    ("page", numpy.int32),
+])
+
+_WEBLINK_DTYPE = numpy.dtype([
+    ("link", numpy.int32),
+    ("bbox", numpy.float64, (4,)),
+])
+
+
+def _bbox(rect: Rectangle) -> tuple[float, float, float, float]:
+    return (rect.left, rect.bottom, rect.right, rect.top)
+
+
+def document_key(document) -> str:
+    """Identifies the document version by its file identifiers or its content."""
+    key = (document.identifier_permanent + document.identifier_changing).hex()
+    if not key.strip("0"):
+        # Documents without file identifier are keyed by their content
+        with open(document._path, "rb") as file:
+            key = hashlib.sha256(file.read()).hexdigest()
+    return key[:32]
+
+
+def _prefilled(cls, page, **values):
+    # The cached properties of the pdfium backed objects are simply preset,
+    # so that the handle is never accessed
+    obj = cls.__new__(cls)
+    obj._page = page
+    obj.__dict__.update(values)
+    return obj
+
+
+class PageCache:
+    """
+    Persistent on-disk cache of the raw page extraction.
+
+    Each page is stored as one uncompressed `.npz` file containing the
+    character table, the path geometry, the image bounding boxes and the links
+    of the page. The entries are keyed by the PDF file identifiers and the
+    `EXTRACTOR_VERSION`, so a changed document or extractor never reuses them.
+    """
+
+    def __init__(self, document, path=None):
+        path = cache_path("pdf-pages") if path is None else _FsPath(path)
+        self.path = path / f"{document.name}-{document_key(document)}-v{EXTRACTOR_VERSION}"
+
+    def _file(self, index: int) -> _FsPath:
+        return self.path / f"page_{index}.npz"
+
+    def load(self, page) -> bool:
+        """Fills the page from the cache and returns whether it was found."""
+        file = self._file(page.index)
+        if not file.exists():
+            return False
+        try:
+            with numpy.load(file, allow_pickle=False) as data:
+                data = dict(data)
+        except (OSError, ValueError) as error:
+            LOGGER.warning(f"Ignoring corrupt cache entry {file}: {error}")
+            return False
+        LOGGER.debug(f"Cached: {page.index}")
+
+        width, height, rotation, *bbox = data["geometry"].tolist()
+        page.__dict__.update(width=width, height=height, rotation=int(rotation),
+                             bbox=Rectangle(*bbox), label=data["label"].tobytes().decode("utf-8"))
+
+        page._chars = intern_fonts(data["chars"], data["fonts"].tolist(), page._doc._font_id)
+
+        # The paths are views into the segment table
+        page.__dict__["_path_segments"] = data["segments"]
+        paths = [_prefilled(Path, page, _path=None, _index=ii, bbox=Rectangle(*path["bbox"].tolist()),
+                           count=int(path["count"]), fill=int(path["fill"]),
+                           stroke=int(path["stroke"]), width=float(path["width"]),
+                           cap=Path.Cap(int(path["cap"])), join=Path.Join(int(path["join"])))
+                 for ii, path in enumerate(data["paths"])]
+        page._paths = paths
+        PROFILER.count("paths", len(paths))
+        page._images = [_prefilled(Image, page, _image=None, bbox=Rectangle(*bbox))
+                        for bbox in data["images"].tolist()]
+
+        page.__dict__["objlinks"] = [
+            _prefilled(ObjLink, page, _dest=None, bbox=Rectangle(*link["bbox"].tolist()),
+                       page_index=int(link["page"])) for link in data["objlinks"]]
+        bboxes = data["weblink_bboxes"]
+        page.__dict__["weblinks"] = [
+            _prefilled(WebLink, page, _link=None, _index=ii, url=url, range=tuple(rng),
+                       bboxes=[Rectangle(*b) for b in bboxes["bbox"][bboxes["link"] == ii].tolist()],
+                       bbox_count=int((bboxes["link"] == ii).sum()))
+            for ii, (url, rng) in enumerate(zip(data["weblink_urls"].tolist(),
+                                                data["weblink_ranges"].tolist()))]
+        return True
+
+    def store(self, page, chars: numpy.ndarray):
+        """Writes the raw character table and all page objects to the cache."""
+        chars, fonts = localize_fonts(chars, page._doc._fonts)
+
+        paths = numpy.array([(_bbox(path.bbox), path.count, path.fill, path.stroke,
+                              path.width, path.cap.value, path.join.value)
+                             for path in page.paths], dtype=_PATH_DTYPE)
+
+        weblinks = page.weblinks
+        weblink_bboxes = numpy.array([(ii, _bbox(b)) for ii, link in enumerate(weblinks)
+                                      for b in link.bboxes], dtype=_WEBLINK_DTYPE)
+        data = {
+            "geometry": numpy.array([page.width, page.height, page.rotation, *_bbox(page.bbox)]),
+            # Labels may contain NUL chars, which numpy strings strip
+            "label": numpy.frombuffer(page.label.encode("utf-8"), dtype=numpy.uint8),
+            "chars": chars,
+            "fonts": numpy.array(fonts, dtype=str),
+            "paths": paths,
+            "segments": page._path_segments,
+            "images": numpy.array([_bbox(i.bbox) for i in page.images],
+                                  dtype=numpy.float64).reshape(-1, 4),
+            "objlinks": numpy.array([(_bbox(l.bbox), l.page_index) for l in page.objlinks],
+                                    dtype=_OBJLINK_DTYPE),
+            "weblink_urls": numpy.array([l.url for l in weblinks], dtype=str),
+            "weblink_ranges": numpy.array([l.range for l in weblinks],
+                                          dtype=numpy.int32).reshape(-1, 2),
+            "weblink_bboxes": weblink_bboxes,
+        }
+
+        # Write atomically, multiple processes may convert the same document
+        self.path.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.path, suffix=".npz", delete=False) as file:
+            numpy.savez(file, **data)
+        os.replace(file.name, self._file(page.index))
+
+    def __repr__(self) -> str:
+        return f"PageCache({self.path})"
+
+
+class GlyphCache:
+    """
+    Persistent glyph bbox cache shared by all documents.
+
+    `Page._fix_bboxes()` learns the loose bbox of each glyph by font, unicode
+    and size to repair empty char bboxes. The document cache is seeded from a
+    single JSON file for the whole corpus and the newly learned glyphs are
+    merged back, so that the repair does not depend on which pages of which
+    document were extracted before.
+    """
+
+    def __init__(self, path=None):
+        path = cache_path("pdf-glyphs") if path is None else _FsPath(path)
+        self.file = path / f"glyphs-v{EXTRACTOR_VERSION}.json"
+
+    def _read(self) -> dict:
+        if not self.file.exists():
+            return {}
+        try:
+            return json.loads(self.file.read_text())
+        except (OSError, ValueError) as error:
+            LOGGER.warning(f"Ignoring corrupt glyph cache {self.file}: {error}")
+            return {}
+
+    def load(self) -> dict[str, Rectangle]:
+        return {key: Rectangle(*bbox) for key, bbox in self._read().items()}
+
+    def merge(self, bboxes: dict[str, Rectangle]) -> int:
+        """Adds all unknown glyphs to the file and returns their count."""
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        # Multiple processes may merge at the same time
+        with open(self.file.with_suffix(".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            glyphs = self._read()
+            count = len(glyphs)
+            for key, bbox in bboxes.items():
+                glyphs.setdefault(key, _bbox(bbox))
+            if len(glyphs) == count:
+                return 0
+            with tempfile.NamedTemporaryFile("w", dir=self.file.parent,
+                                             suffix=".json", delete=False) as file:
+                json.dump(glyphs, file)
+            os.replace(file.name, self.file)
+        return len(glyphs) - count
+
+    def __repr__(self) -> str:
+        return f"GlyphCache({self.file})"
@@ -9,13 +9,179 @@
 
 import math
 import ctypes
-from functools import cached_property
-from enum import Enum
+import numpy
+from enum import Enum, IntFlag
 import pypdfium2 as pp
 from ..utils import Rectangle, Point
 
 
+# Columnar layout of all characters on a page, one row per character.
+# All geometry is already corrected for the page rotation.
+CHAR_DTYPE = numpy.dtype([
+    ("unicode", numpy.uint32),
+    ("bbox", numpy.float64, (4,)),      # loose bbox: left, bottom, right, top
+    ("tbbox", numpy.float64, (4,)),     # tight bbox: left, bottom, right, top
+    ("origin", numpy.float64, (2,)),
+    ("angle", numpy.int32),             # char angle in degrees, not page rotated
+    ("font", numpy.int32),              # index into the document font table
+    ("flags", numpy.int32),
+    ("size", numpy.float64),
+    ("weight", numpy.int32),
+    ("fill", numpy.uint32),
+    ("stroke", numpy.uint32),
+    ("render_mode", numpy.int8),
+])
+
+
+class FontStyle(IntFlag):
+    """Style flags of a font, derived once per font name of a document."""
+    BOLD = 0x1
+    ITALIC = 0x2
+    MONO = 0x4
+    SYMBOL = 0x8
+
+
+def font_style(font: str) -> FontStyle:
+    """Returns the `FontStyle` flags of the font name."""
+    style = FontStyle(0)
+    if "Bold" in font:
+        style |= FontStyle.BOLD
+    if "Italic" in font or "Oblique" in font:
+        style |= FontStyle.ITALIC
+    if any(fragment in font for fragment in ("Mono", "Courier", "Consolas")):
+        style |= FontStyle.MONO
+    if any(fragment in font for fragment in ("Symbol", "Wingdings", "Dingbats")):
+        style |= FontStyle.SYMBOL
+    return style
+
+
+def _rotate_bboxes(bboxes: numpy.ndarray, height: float) -> numpy.ndarray:
+    # Same transform as Rectangle(p0.y, height - p1.x, p1.y, height - p0.x)
+    rotated = numpy.empty_like(bboxes)
+    rotated[:, 0] = bboxes[:, 1]
+    rotated[:, 1] = height - bboxes[:, 2]
+    rotated[:, 2] = bboxes[:, 3]
+    rotated[:, 3] = height - bboxes[:, 0]
+    return rotated
+
+
+def _normalize_bboxes(bboxes: numpy.ndarray) -> numpy.ndarray:
+    # Ensure the correct ordering of point values like Rectangle does
+    return numpy.column_stack([numpy.minimum(bboxes[:, 0], bboxes[:, 2]),
+                               numpy.minimum(bboxes[:, 1], bboxes[:, 3]),
+                               numpy.maximum(bboxes[:, 0], bboxes[:, 2]),
+                               numpy.maximum(bboxes[:, 1], bboxes[:, 3])])
+
+
+def _char_unicodes(text, count: int) -> numpy.ndarray:
+    # The page text maps to the char indices only if pdfium did not skip any
+    # chars without unicode, and has no surrogate pairs for chars above U+FFFF
+    buffer = (ctypes.c_ushort * (2 * count + 1))()
+    length = pp.FPDFText_GetText(text, 0, count, buffer)
+    units = numpy.frombuffer(buffer, dtype=numpy.uint16, count=max(length - 1, 0))
+    if len(units) == count and not ((0xd800 <= units) & (units < 0xe000)).any():
+        return units
+    return numpy.array([pp.FPDFText_GetUnicode(text, ii) for ii in range(count)],
+                       dtype=numpy.uint32)
+
+
+def char_table(page) -> numpy.ndarray:
+    """
+    Extracts all characters of a page in one pass into a structured array of
+    `CHAR_DTYPE`. The unicode of all characters is read with one call, the
+    ctypes buffers are reused for every character and the rotation correction
+    is applied to all rows at once.
+    """
+    count = pp.FPDFText_CountChars(page._text)
+    chars = numpy.zeros(count, dtype=CHAR_DTYPE)
+    if not count:
+        return chars
+    text = page._text
+    crect = pp.FS_RECTF()
+    x0, y0 = ctypes.c_double(), ctypes.c_double()
+    x1, y1 = ctypes.c_double(), ctypes.c_double()
+    r, g, b, a = ctypes.c_uint(), ctypes.c_uint(), ctypes.c_uint(), ctypes.c_uint()
+    font = ctypes.create_string_buffer(255)
+    flags = ctypes.c_int()
+
+    chars["unicode"] = _char_unicodes(text, count)
+    bboxes = chars["bbox"]
+    tbboxes = chars["tbbox"]
+    origins = chars["origin"]
+    angles = chars["angle"]
+    fonts = chars["font"]
+    fflags = chars["flags"]
+    sizes = chars["size"]
+    weights = chars["weight"]
+    fills = chars["fill"]
+    strokes = chars["stroke"]
+    modes = chars["render_mode"]
+    font_id = page._doc._font_id
+
+    for ii in range(count):
+        angles[ii] = int(math.degrees(pp.FPDFText_GetCharAngle(text, ii)))
+
+        assert pp.FPDFText_GetLooseCharBox(text, ii, crect)
+        bboxes[ii] = (crect.left, crect.bottom, crect.right, crect.top)
+        assert pp.FPDFText_GetCharBox(text, ii, x0, x1, y0, y1)
+        tbboxes[ii] = (x0.value, y0.value, x1.value, y1.value)
+        assert pp.FPDFText_GetCharOrigin(text, ii, x0, y0)
+        origins[ii] = (x0.value, y0.value)
+
+        # The buffers are reused, so only read them back on success
+        if pp.FPDFText_GetFontInfo(text, ii, font, 255, flags):
+            fonts[ii] = font_id(font.value.decode("utf-8"))
+            fflags[ii] = flags.value
+        else:
+            fonts[ii] = font_id("")
+        sizes[ii] = pp.FPDFText_GetFontSize(text, ii)
+        weights[ii] = pp.FPDFText_GetFontWeight(text, ii)
+
+        if pp.FPDFText_GetFillColor(text, ii, r, g, b, a):
+            fills[ii] = r.value << 24 | g.value << 16 | b.value << 8 | a.value
+        if pp.FPDFText_GetStrokeColor(text, ii, r, g, b, a):
+            strokes[ii] = r.value << 24 | g.value << 16 | b.value << 8 | a.value
+        modes[ii] = pp.FPDFText_GetTextRenderMode(text, ii)
+
+    bboxes = _normalize_bboxes(bboxes)
+    tbboxes = _normalize_bboxes(tbboxes)
+    if page.rotation:
+        bboxes = _normalize_bboxes(_rotate_bboxes(bboxes, page.height))
+        tbboxes = _normalize_bboxes(_rotate_bboxes(tbboxes, page.height))
+        origins[:] = numpy.column_stack([origins[:, 1], page.height - origins[:, 0]])
+    chars["bbox"] = bboxes
+    chars["tbbox"] = tbboxes
+    return chars
+
+
+def localize_fonts(chars: numpy.ndarray, fonts: list[str]) -> tuple[numpy.ndarray, list[str]]:
+    """
+    Copies the char table with the document font ids replaced by indices into
+    the returned list of only the font names used on this page.
+    """
+    ids, local = numpy.unique(chars["font"], return_inverse=True)
+    chars = chars.copy()
+    chars["font"] = local
+    return chars, [fonts[ii] for ii in ids.tolist()]
+
+
+def intern_fonts(chars: numpy.ndarray, fonts: list[str], font_id) -> numpy.ndarray:
+    """Reverse of `localize_fonts()` for the font table of another document."""
+    if fonts:
+        ids = numpy.array([font_id(font) for font in fonts], dtype=numpy.int32)
+        chars["font"] = ids[chars["font"]]
+    return chars
+
+
 class Character:
+    """
+    A lightweight view onto one row of the page character table.
+    Only the link associations, a corrected unicode and the geometry once it
+    is used are stored on the object itself.
+    """
+    __slots__ = ("_page", "_index", "_unicode", "objlink", "weblink",
+                 "_cached_bbox", "_cached_tbbox", "_cached_origin")
+
     class RenderMode(Enum):
         UNKNOWN = -1
         FILL = 0
@@ -29,120 +195,128 @@ class Character:
 
     def __init__(self, page, index: int):
         self._page = page
-        self._text = page._text
         self._index = index
-        self._font = None
-        self.unicode = pp.FPDFText_GetUnicode(self._text, self._index)
-        self._rotation = int(math.degrees(pp.FPDFText_GetCharAngle(self._text, self._index)))
+        self._unicode = None
         self.objlink = None
         self.weblink = None
+        self._cached_bbox = None
+        self._cached_tbbox = None
+        self._cached_origin = None
+
+    def _field(self, name: str):
+        return self._page._chars[name][self._index]
+
+    @property
+    def unicode(self) -> int:
+        if self._unicode is not None:
+            return self._unicode
+        return int(self._field("unicode"))
+
+    @unicode.setter
+    def unicode(self, value: int):
+        # Only this object is corrected, the page text remains unchanged
+        self._unicode = value
+
+    @property
+    def _rotation(self) -> int:
+        return int(self._field("angle"))
 
-        crect = pp.FS_RECTF()
-        assert pp.FPDFText_GetLooseCharBox(self._text, self._index, crect)
-        bbox = Rectangle(crect)
-        if self._page.rotation:
-            bbox = Rectangle(bbox.p0.y, self._page.height - bbox.p1.x,
-                             bbox.p1.y, self._page.height - bbox.p0.x)
-        self._bbox = bbox
+    @property
+    def _bbox(self) -> Rectangle:
+        return Rectangle(*self._field("bbox").tolist())
 
-    def _font_flags(self) -> tuple[str, int]:
-        if self._font is None:
-            font = ctypes.create_string_buffer(255)
-            flags = ctypes.c_int()
-            pp.FPDFText_GetFontInfo(self._text, self._index, font, 255, flags)
-            self._font = (font.value.decode("utf-8"), flags.value)
-        return self._font
+    @_bbox.setter
+    def _bbox(self, bbox: Rectangle):
+        self._page._chars["bbox"][self._index] = (bbox.left, bbox.bottom, bbox.right, bbox.top)
+        self._cached_bbox = None
 
     @property
     def char(self) -> str:
         char = chr(self.unicode)
         return char if char.isprintable() else ""
 
-    @cached_property
+    @property
     def origin(self) -> Point:
-        x, y = ctypes.c_double(), ctypes.c_double()
-        assert pp.FPDFText_GetCharOrigin(self._text, self._index, x, y)
-        if self._page.rotation:
-            return Point(y.value, self._page.height - x.value)
-        return Point(x.value, y.value)
+        if self._cached_origin is None:
+            self._cached_origin = Point(*self._field("origin").tolist())
+        return self._cached_origin
 
-    @cached_property
+    @property
     def width(self) -> float:
         if self.rotation:
             return self.bbox.height
         return self.bbox.width
 
-    @cached_property
+    @property
     def height(self) -> float:
         if self.rotation:
             return self.bbox.width
         return self.bbox.height
 
-    @cached_property
+    @property
     def tbbox(self) -> Rectangle:
-        x0, y0 = ctypes.c_double(), ctypes.c_double()
-        x1, y1 = ctypes.c_double(), ctypes.c_double()
-        assert pp.FPDFText_GetCharBox(self._text, self._index, x0, x1, y0, y1)
-        tbbox = Rectangle(x0.value, y0.value, x1.value, y1.value)
-        if self._page.rotation:
-            tbbox = Rectangle(tbbox.p0.y, self._page.height - tbbox.p1.x,
-                              tbbox.p1.y, self._page.height - tbbox.p0.x)
-        return tbbox
+        if self._cached_tbbox is None:
+            self._cached_tbbox = Rectangle(*self._field("tbbox").tolist())
+        return self._cached_tbbox
 
     @property
     def bbox(self) -> Rectangle:
-        if not self._bbox.width or not self._bbox.height:
-            return self.tbbox
-        return self._bbox
+        if self._cached_bbox is None:
+            bbox = self._bbox
+            if not bbox.width or not bbox.height:
+                bbox = self.tbbox
+            self._cached_bbox = bbox
+        return self._cached_bbox
 
-    @cached_property
+    @property
     def twidth(self) -> float:
         return self.tbbox.twidth
 
-    @cached_property
+    @property
     def theight(self) -> float:
         return self.tbbox.theight
 
-    @cached_property
+    @property
     def render_mode(self) -> RenderMode:
-        return Character.RenderMode(pp.FPDFText_GetTextRenderMode(self._text, self._index))
+        return Character.RenderMode(int(self._field("render_mode")))
 
-    @cached_property
+    @property
     def rotation(self) -> int:
+        rotation = self._rotation
         # Special case for vertical text in rotated pages
-        if self._page.rotation == 90 and self._rotation == 0 and self.unicode not in {0x20, 0xa, 0xd}:
+        if self._page.rotation == 90 and rotation == 0 and self.unicode not in {0x20, 0xa, 0xd}:
             return 90
-        if self._page.rotation and self._rotation:
-            return (self._page.rotation + self._rotation) % 360
-        return self._rotation
+        if self._page.rotation and rotation:
+            return (self._page.rotation + rotation) % 360
+        return rotation
 
-    @cached_property
+    @property
     def size(self) -> float:
-        return pp.FPDFText_GetFontSize(self._text, self._index)
+        return float(self._field("size"))
 
-    @cached_property
+    @property
     def weight(self) -> int:
-        return pp.FPDFText_GetFontWeight(self._text, self._index)
+        return int(self._field("weight"))
 
-    @cached_property
-    def fill(self) -> tuple[int, int, int, int]:
-        r, g, b, a = ctypes.c_uint(), ctypes.c_uint(), ctypes.c_uint(), ctypes.c_uint()
-        pp.FPDFText_GetFillColor(self._text, self._index, r, g, b, a)
-        return r.value << 24 | g.value << 16 | b.value << 8 | a.value
+    @property
+    def fill(self) -> int:
+        return int(self._field("fill"))
 
-    @cached_property
+    @property
     def stroke(self) -> int:
-        r, g, b, a = ctypes.c_uint(), ctypes.c_uint(), ctypes.c_uint(), ctypes.c_uint()
-        pp.FPDFText_GetStrokeColor(self._text, self._index, r, g, b, a)
-        return r.value << 24 | g.value << 16 | b.value << 8 | a.value
+        return int(self._field("stroke"))
 
-    @cached_property
+    @property
     def font(self) -> str:
-        return self._font_flags()[0]
+        return self._page._doc._fonts[self._field("font")]
 
-    @cached_property
+    @property
+    def style(self) -> FontStyle:
+        return self._page._doc._font_styles[self._field("font")]
+
+    @property
     def flags(self) -> int:
-        return self._font_flags()[1]
+        return int(self._field("flags"))
 
     def descr(self) -> str:
         char = chr(self.unicode)
@@ -12,9 +12,13 @@ import logging
 import weakref
 import ctypes
 from functools import cached_property
-from collections import defaultdict
+from itertools import islice
+from collections import OrderedDict
 import pypdfium2 as pp
 from .page import Page
+from .character import font_style
+from .cache import PageCache, GlyphCache
+from .search import SearchIndex
 
 LOGGER = logging.getLogger(__name__)
 
@@ -37,16 +41,44 @@ class OutlineItem:
 
 
 class Document:
-    def __init__(self, path: str):
+    def __init__(self, path: str, cache: bool = False, max_pages: int = 16,
+                 glyphs: bool = False):
         self._path = str(path)
         self._name = os.path.basename(str(path))
-        self._bbox_cache = defaultdict(dict)
+        self._bbox_cache = {}
+        # Interned font names shared by all pages with their style flags
+        self._fonts = []
+        self._font_ids = {}
+        self._font_styles = []
 
         # open the PDF document
         self._doc = pp.FPDF_LoadDocument(str(path), None)
         LOGGER.debug(f"Loading: {path}")
         # defer closing the PDF document
         weakref.finalize(self, pp.FPDF_CloseDocument, self._doc)
+        # Optionally reuse the page extraction of previous runs
+        self._page_cache = PageCache(self) if cache else None
+        # Optionally share the learned glyph bboxes with all other documents
+        self._glyph_cache = GlyphCache() if glyphs else None
+        if self._glyph_cache is not None:
+            self._bbox_cache = self._glyph_cache.load()
+            # merge the new glyphs back when the document is closed
+            weakref.finalize(self, self._glyph_cache.merge, self._bbox_cache)
+        # The most recently used pages are kept open, zero disables reuse
+        self._max_pages = max_pages
+        self._pages = OrderedDict()
+        self._search_index = None
+
+    def _glyphs_since(self, count: int) -> dict:
+        # The glyph bboxes are only added, so the newest are at the end
+        return dict(islice(self._bbox_cache.items(), count, None))
+
+    def _font_id(self, font: str) -> int:
+        if (index := self._font_ids.get(font)) is None:
+            index = self._font_ids[font] = len(self._fonts)
+            self._fonts.append(font)
+            self._font_styles.append(font_style(font))
+        return index
 
     @property
     def name(self) -> str:
@@ -108,9 +140,34 @@ class Document:
     def page_count(self) -> str:
         return pp.FPDF_GetPageCount(self._doc)
 
-    def page(self, index: int) -> Page:
+    def search_index(self, path=None) -> SearchIndex:
+        """
+        Returns the full-text index of all pages, which is built on first use
+        and then loaded from the cache for the same document version.
+        """
+        if self._search_index is None:
+            self._search_index = SearchIndex.cached(self, path)
+        return self._search_index
+
+    def page(self, index: int, extract: bool = True) -> Page:
+        """
+        Returns the page with all chars extracted. Otherwise the page only
+        provides its geometry and the pdfium text queries until it is
+        requested again with extraction, which reuses its open handles.
+        """
         assert index < self.page_count
-        return Page(self, index)
+        if (page := self._pages.get(index)) is not None:
+            self._pages.move_to_end(index)
+            if extract and not page.extracted:
+                page._extract()
+            return page
+        page = Page(self, index, extract)
+        if self._max_pages > 0:
+            self._pages[index] = page
+            if len(self._pages) > self._max_pages:
+                # Pages still in use remain valid and reopen their handles
+                self._pages.popitem(last=False)[1].close()
+        return page
 
     def pages(self, numbers=None) -> list[Page]:
         if numbers is None:
@@ -66,5 +66,10 @@ class Image:
                 Line(p[2], p[3], p[3].type, 0),
                 Line(p[3], p[0], p[0].type, 0)]
 
+    def __getstate__(self) -> dict:
+        # Resolve all properties, since the object handle cannot be pickled
+        self.bbox
+        return self.__dict__ | {"_image": None}
+
     def __repr__(self) -> str:
         return f"I{self.bbox}"
@@ -31,6 +31,11 @@ class ObjLink:
     def page_index(self) -> int:
         return pp.FPDFDest_GetDestPageIndex(self._page._doc._doc, self._dest)
 
+    def __getstate__(self) -> dict:
+        # Resolve all properties, since the destination handle cannot be pickled
+        self.page_index
+        return self.__dict__ | {"_dest": None}
+
     def __repr__(self) -> str:
         return f"Obj({self.page_index})"
 
@@ -75,5 +80,11 @@ class WebLink:
         assert retlen < length
         return bytes(cbuffer).decode("utf-16-le").strip("\x00")
 
+    def __getstate__(self) -> dict:
+        # Resolve all properties, since the link page handle cannot be pickled
+        for name in ("bbox_count", "bboxes", "range", "url"):
+            getattr(self, name)
+        return self.__dict__ | {"_link": None}
+
     def __repr__(self) -> str:
         return f"Url({self.url})"
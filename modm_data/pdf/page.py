@@ -7,74 +7,206 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # -----------------------------------------------------------------------------
 
+import re
 import ctypes
+import hashlib
 import logging
 import weakref
-from functools import cached_property, cache
+import numpy
+from functools import cached_property
 from collections import defaultdict, OrderedDict
 import pypdfium2 as pp
 
-from ..utils import Rectangle, Region
-from .character import Character
+from ..utils import Rectangle, Region, SpatialGrid, PROFILER, profiled
+from .character import Character, char_table
 from .link import ObjLink, WebLink
-from .path import Path
+from .path import Path, path_segments
 from .image import Image
 from .structure import Structure
 
 LOGGER = logging.getLogger(__name__)
 
 
+def _close_handles(page, text, linkpage, structtree):
+    # close them in reverse order
+    pp.FPDF_StructTree_Close(structtree)
+    pp.FPDFLink_CloseWebLinks(linkpage)
+    pp.FPDFText_ClosePage(text)
+    pp.FPDF_ClosePage(page)
+
+
 class Page:
-    def __init__(self, document, index: int):
+    def __init__(self, document, index: int, extract: bool = True):
         self._doc = document
         self._paths = None
         self._images = None
         self._links = None
         self._weblinks = None
         self._charlines = defaultdict(list)
+        self._char_cache = {}
         self._linked = False
 
         self.index = index
         self.number = index + 1
         LOGGER.debug(f"Loading: {index}")
 
-        self._page = pp.FPDF_LoadPage(document._doc, index)
-        self._text = pp.FPDFText_LoadPage(self._page)
-        self._linkpage = pp.FPDFLink_LoadWebLinks(self._text)
-        self._structtree = pp.FPDF_StructTree_GetForPage(self._page)
-        # close them in reverse order
-        weakref.finalize(self, pp.FPDF_StructTree_Close, self._structtree)
-        weakref.finalize(self, pp.FPDFLink_CloseWebLinks, self._linkpage)
-        weakref.finalize(self, pp.FPDFText_ClosePage, self._text)
-        weakref.finalize(self, pp.FPDF_ClosePage, self._page)
+        # Pages restored from the cache may never load their pdfium handles
+        self._restored = False
+        # Without extraction only the page geometry and pdfium text are available
+        if extract:
+            self._extract()
 
+    @property
+    def extracted(self) -> bool:
+        return "_chars" in self.__dict__
+
+    def _extract(self):
+        cache = self._doc._page_cache
+        with PROFILER.stage("extract"):
+            if cache is not None and cache.load(self):
+                self._restored = True
+            else:
+                self._chars = char_table(self)
+                if cache is not None:
+                    cache.store(self, self._chars)
+        PROFILER.count("chars", len(self._chars))
         self._fix_bboxes()
 
-    def text_in_area(self, area: Rectangle, max_length: int = 100) -> str:
-        clength = ctypes.c_int(max_length)
-        cbuffer = (ctypes.c_ushort * max_length)()
-        length = pp.FPDFText_GetBoundedText(self._text, area.left, area.top, area.right,
-                                            area.bottom, cbuffer, clength)
-        return bytes(cbuffer).decode("utf-16-le", errors="ignore")[:length - 1]
+    @cached_property
+    def _handles(self) -> tuple:
+        # The pdfium handles are only loaded on first use, which for pages
+        # restored from the page cache may be never
+        page = pp.FPDF_LoadPage(self._doc._doc, self.index)
+        text = pp.FPDFText_LoadPage(page)
+        linkpage = pp.FPDFLink_LoadWebLinks(text)
+        structtree = pp.FPDF_StructTree_GetForPage(page)
+        # defer closing them, unless the page is closed explicitly
+        self._finalizer = weakref.finalize(self, _close_handles, page, text, linkpage, structtree)
+        return page, text, linkpage, structtree
+
+    def close(self):
+        """
+        Closes the pdfium page handles. All objects of this page that hold a
+        handle are resolved first, so that they remain usable. The handles are
+        loaded again when they are used afterwards.
+        """
+        if "_handles" not in self.__dict__:
+            return
+        objects = ((self._paths or []) + (self._images or []) +
+                   self.__dict__.get("objlinks", []) + self.__dict__.get("weblinks", []))
+        for obj in objects:
+            obj.__dict__.update(obj.__getstate__())
+        self._finalizer()
+        del self.__dict__["_handles"]
 
-    def chars_in_area(self, area: Rectangle) -> list[Character]:
-        found = []
-        # lines are ordered by ypos
-        for ypos, chars in self.charlines.items():
-            # We can stop the search if the ypos is above the area
-            if ypos > area.top:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @property
+    def _page(self):
+        return self._handles[0]
+
+    @property
+    def _text(self):
+        return self._handles[1]
+
+    @property
+    def _linkpage(self):
+        return self._handles[2]
+
+    @property
+    def _structtree(self):
+        return self._handles[3]
+
+    @cached_property
+    def text(self) -> str:
+        """The page text with one character per char index."""
+        return "".join(map(chr, self._chars["unicode"].tolist()))
+
+    def text_in_area(self, area: Rectangle, max_length: int = None) -> str:
+        """
+        Returns the text inside the area, which is only truncated to
+        `max_length - 1` characters if a maximum length is given.
+        """
+        if self._restored:
+            text = self._bounded_text(area)
+        else:
+            args = (self._text, area.left, area.top, area.right, area.bottom)
+            # The first pass returns the length in chars without the terminator
+            if length := pp.FPDFText_GetBoundedText(*args, None, 0):
+                # Surrogate pairs need two UTF-16 units per char
+                cbuffer = (ctypes.c_ushort * (2 * length + 1))()
+                length = pp.FPDFText_GetBoundedText(*args, cbuffer, len(cbuffer))
+                text = bytes(cbuffer)[:2 * (length - 1)].decode("utf-16-le", errors="ignore")
+            else:
+                text = ""
+        return text if max_length is None else text[:max_length - 1]
+
+    def _bounded_text(self, area: Rectangle) -> str:
+        # Same algorithm as FPDFText_GetBoundedText on the raw character table
+        # for pages restored from the cache without loading the pdfium page
+        unicodes = self._chars["unicode"]
+        tbbox, origin = self._chars["tbbox"], self._chars["origin"]
+        if self.rotation:
+            # pdfium intersects with the unrotated char boxes
+            tbbox = numpy.column_stack([self.height - tbbox[:, 3], tbbox[:, 0],
+                                        self.height - tbbox[:, 1], tbbox[:, 2]])
+            ypos = origin[:, 0].tolist()
+        else:
+            ypos = origin[:, 1].tolist()
+        inside = ((numpy.maximum(area.left, tbbox[:, 0]) < numpy.minimum(area.right, tbbox[:, 2])) &
+                  (numpy.maximum(area.bottom, tbbox[:, 1]) < numpy.minimum(area.top, tbbox[:, 3])))
+        # Count of non-space chars outside the area before each char
+        others = numpy.zeros(len(unicodes) + 1, dtype=numpy.intp)
+        numpy.cumsum(~inside & (unicodes != 0x20), out=others[1:])
+        others = others.tolist()
+        unicodes = unicodes.tolist()
+
+        text = []
+        posy, previous, linefeed = 0, False, False
+        last = -1
+        for ii in numpy.flatnonzero(inside).tolist() + [len(unicodes)]:
+            if ii > last + 1:
+                # Skipped chars: a leading space is kept and any other char
+                # allows a line break before the next char inside the area
+                if previous and unicodes[last + 1] == 0x20:
+                    text.append(" ")
+                    linefeed = False
+                if others[ii] != others[last + 1]:
+                    linefeed = True
+                previous = False
+            if ii == len(unicodes):
                 break
-            # otherwise we check if it's inside the area
-            if area.bottom <= ypos:
-                # chars are ordered by xpos
-                for char in chars:
-                    # we can stop looking into this line
-                    if char.bbox.midpoint.x > area.right:
-                        break
-                    # otherwise we check if it's inside the area
-                    if area.left <= char.bbox.midpoint.x:
-                        found.append(char)
-        return found
+            if linefeed and not previous and posy != ypos[ii]:
+                posy = ypos[ii]
+                if text:
+                    text.append("\r\n")
+            previous, linefeed = True, False
+            if unicodes[ii]:
+                text.append(chr(unicodes[ii]))
+            last = ii
+        return "".join(text)
+
+    def _char_indices_in_area(self, area: Rectangle) -> numpy.ndarray:
+        # Chars are matched by their bbox midpoint with the y position rounded
+        # the same way as charlines and ordered by ypos then xpos
+        found = self._char_index.contained(area.left, area.bottom, area.right, area.top)
+        points = self._char_points[found]
+        return found[numpy.lexsort((found, points[:, 0], points[:, 1]))]
+
+    def chars_in_area(self, area: Rectangle) -> list[Character]:
+        return [self.char(ii) for ii in self._char_indices_in_area(area).tolist()]
+
+    def graphics_in_area(self, area: Rectangle) -> list:
+        # Paths and images fully contained in the area in the same order as
+        # self.paths + self.images
+        graphics = self._graphics
+        found = self._graphics_index.contained(area.left, area.bottom, area.right, area.top)
+        return [graphics[ii] for ii in found.tolist()]
 
     @property
     def structures(self) -> list:
@@ -109,12 +241,50 @@ class Page:
         return Rectangle(bbox)
 
     @cached_property
+    def fingerprint(self) -> str:
+        """
+        Hash of the raw page content independent of the document: the page
+        geometry, all chars with their font names and extracted bboxes, the
+        path geometry, image bboxes and the link areas.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        def _update(*values):
+            digest.update(numpy.array(values, dtype=numpy.float64).tobytes())
+
+        _update(self.width, self.height, self.rotation)
+        chars = self._chars.copy()
+        indices, bboxes = self._raw_bboxes
+        chars["bbox"][indices] = bboxes
+        # Font ids are document specific, so replace them with sorted names
+        used = numpy.unique(chars["font"])
+        names = sorted(self._doc._fonts[ii] for ii in used.tolist())
+        ids = numpy.zeros(len(self._doc._fonts), dtype=numpy.int32)
+        ids[used] = [names.index(self._doc._fonts[ii]) for ii in used.tolist()]
+        chars["font"] = ids[chars["font"]]
+        digest.update(chars.tobytes())
+        digest.update("\0".join(names).encode("utf-8"))
+
+        for path in self.paths:
+            bbox = path.bbox
+            _update(bbox.left, bbox.bottom, bbox.right, bbox.top, path.fill,
+                    path.stroke, path.width, path.cap.value, path.join.value)
+        digest.update(self._path_segments.tobytes())
+        for image in self.images:
+            _update(image.bbox.left, image.bbox.bottom, image.bbox.right, image.bbox.top)
+        for link in self.objlinks:
+            _update(link.bbox.left, link.bbox.bottom, link.bbox.right, link.bbox.top)
+        for link in self.weblinks:
+            _update(*link.range)
+        return digest.hexdigest()
+
+    @property
     def char_count(self) -> int:
-        return pp.FPDFText_CountChars(self._text)
+        return len(self._chars)
 
-    @cache
     def char(self, index) -> Character:
-        return Character(self, index)
+        if (char := self._char_cache.get(index)) is None:
+            char = self._char_cache[index] = Character(self, index)
+        return char
 
     @property
     def chars(self) -> list[Character]:
@@ -138,24 +308,20 @@ class Page:
         return links
 
     def find(self, string, case_sensitive=True) -> list[Character]:
-        flags = pp.FPDF_MATCHWHOLEWORD | pp.FPDF_CONSECUTIVE
-        if case_sensitive:
-            flags |= pp.FPDF_MATCHCASE
-
-        wstring = (ctypes.c_ushort * (len(string) + 1))()
-        for ii in range(len(string)):
-            wstring[ii] = ord(string[ii])
-        wstring[-1] = 0
-        handle = pp.FPDFText_FindStart(self._text, wstring, flags, 0)
-
-        while pp.FPDFText_FindNext(handle):
-            start = pp.FPDFText_GetSchResultIndex(handle)
-            count = pp.FPDFText_GetSchCount(handle)
-            chars = [self.char(ii) for ii in range(start, start + count)]
-            yield chars
-
-        pp.FPDFText_FindClose(handle)
+        # Same matches as the consecutive whole word search of pdfium in the
+        # page text, whose offsets are char indices: The words of the string
+        # may be separated by any whitespace including line breaks, and the
+        # match must not be preceded or followed by a digit, an ASCII letter,
+        # one of the chars between them or a ligature.
+        words = "[ \r\n\xa0]+".join(re.escape(word) for word in string.split(" ") if word)
+        if not words:
+            return
+        word = "0-9A-`a-zﬁ-ﬅ"
+        pattern = rf"(?-i:(?<![{word}])){words}(?-i:(?![{word}]))"
+        for match in re.finditer(pattern, self.text, 0 if case_sensitive else re.IGNORECASE):
+            yield [self.char(ii) for ii in range(*match.span())]
 
+    @profiled("link_characters")
     def link_characters(self):
         if self._linked:
             return
@@ -170,42 +336,100 @@ class Page:
                 self.char(ii).weblink = link
         self._linked = True
 
+    @profiled("fix_bboxes")
     def _fix_bboxes(self):
-        def _key(char):
-            height = round(char.tbbox.height, 1)
-            width = round(char.tbbox.width, 1)
-            return f"{char.font} {char.unicode} {height} {width}"
+        # Work on the columns directly, only the chars to fix become objects
+        bbox, tbbox = self._chars["bbox"], self._chars["tbbox"]
+        empty = ((bbox[:, 2] == bbox[:, 0]) | (bbox[:, 3] == bbox[:, 1])).tolist()
+        unicodes = self._chars["unicode"].tolist()
+        rotations = self._chars["angle"].tolist()
+        fonts = self._chars["font"].tolist()
+        heights = (tbbox[:, 3] - tbbox[:, 1]).tolist()
+        widths = (tbbox[:, 2] - tbbox[:, 0]).tolist()
+
+        def _key(index):
+            height = round(heights[index], 1)
+            width = round(widths[index], 1)
+            return f"{self._doc._fonts[fonts[index]]} {unicodes[index]} {height} {width}"
         fix_chars = []
-        for char in self.chars:
-            if not char._bbox.width or not char._bbox.height:
-                if char._rotation:
-                    fix_chars.append(char)
-                elif char.unicode not in {0xa, 0xd}:
-                    fix_chars.append(char)
-            elif (char.unicode not in {0xa, 0xd} and not char._rotation and
-                  _key(char) not in self._doc._bbox_cache):
+        for index, unicode in enumerate(unicodes):
+            if empty[index]:
+                if rotations[index]:
+                    fix_chars.append(index)
+                elif unicode not in {0xa, 0xd}:
+                    fix_chars.append(index)
+            elif (unicode not in {0xa, 0xd} and not rotations[index] and
+                  (key := _key(index)) not in self._doc._bbox_cache):
+                char = self.char(index)
                 bbox = char._bbox.translated(-char.origin).rotated(self.rotation + char._rotation)
-                self._doc._bbox_cache[_key(char)] = (char, bbox)
-                # print("->", _key(char), char.descr(), char.height, char.rotation, char._rotation, self.rotation)
-        for char in fix_chars:
-            bbox = self._doc._bbox_cache.get(_key(char))
+                # Only store the bbox, the char would keep this page alive
+                self._doc._bbox_cache[key] = bbox
+                # print("->", key, char.descr(), char.height, char.rotation, char._rotation, self.rotation)
+        # The fingerprint must not depend on the glyphs learned from other pages
+        self._raw_bboxes = (numpy.array(fix_chars, dtype=numpy.intp), self._chars["bbox"][fix_chars])
+        for index in fix_chars:
+            char = self.char(index)
+            bbox = self._doc._bbox_cache.get(_key(index))
             if bbox is not None:
                 # print("<-", char.descr(), char._rotation, char.rotation, char.height)
-                _, bbox = bbox
                 bbox = bbox.rotated(-self.rotation - char._rotation).translated(char.origin)
                 char._bbox = bbox
             elif char.unicode not in {0x20, 0xa, 0xd}:
                 LOGGER.debug(f"Unable to fix bbox for {char.descr()}!")
 
+    @property
+    def _char_bboxes(self) -> numpy.ndarray:
+        # Same as Character.bbox: fall back to the tight bbox for empty boxes
+        bbox = self._chars["bbox"]
+        empty = (bbox[:, 2] == bbox[:, 0]) | (bbox[:, 3] == bbox[:, 1])
+        return numpy.where(empty[:, None], self._chars["tbbox"], bbox)
+
+    @cached_property
+    def _char_styles(self) -> numpy.ndarray:
+        # Same as Character.style for all chars, the fonts of a page are fixed
+        styles = numpy.array(self._doc._font_styles, dtype=numpy.uint8)
+        return styles[self._chars["font"]]
+
+    def _char_rotations(self, indices: numpy.ndarray) -> numpy.ndarray:
+        # Same as Character.rotation for many chars at once
+        angles = self._chars["angle"][indices]
+        if not self.rotation:
+            return angles
+        rotations = numpy.where(angles != 0, (self.rotation + angles) % 360, angles)
+        if self.rotation == 90:
+            # Special case for vertical text in rotated pages
+            unicodes = self._chars["unicode"][indices]
+            rotations[(angles == 0) & ~numpy.isin(unicodes, (0x20, 0xa, 0xd))] = 90
+        return rotations
+
+    @cached_property
+    def _char_points(self) -> numpy.ndarray:
+        # Midpoints of the char bboxes with the y position rounded to one digit
+        bbox = self._char_bboxes
+        xmid = (bbox[:, 2] + bbox[:, 0]) / 2
+        ymid = [round(ypos, 1) for ypos in ((bbox[:, 3] + bbox[:, 1]) / 2).tolist()]
+        return numpy.column_stack([xmid, numpy.array(ymid, dtype=numpy.float64)])
+
+    @cached_property
+    def _char_index(self) -> SpatialGrid:
+        points = self._char_points
+        return SpatialGrid(numpy.hstack([points, points]), self._grid_size)
+
+    @cached_property
+    def _grid_size(self) -> float:
+        return max(self.width, self.height, 1) / 64
+
     @cached_property
     def charlines(self):
+        points = self._char_points
+        xmid = points[:, 0].tolist()
         charlines = defaultdict(list)
-        for char in self.chars:
-            charlines[round(char.bbox.midpoint.y, 1)].append(char)
+        for index, ypos in enumerate(points[:, 1].tolist()):
+            charlines[ypos].append(index)
 
         orderedchars = OrderedDict.fromkeys(sorted(charlines))
-        for ypos, chars in charlines.items():
-            orderedchars[ypos] = sorted(chars, key=lambda c: c.bbox.midpoint.x)
+        for ypos, indices in charlines.items():
+            orderedchars[ypos] = [self.char(ii) for ii in sorted(indices, key=xmid.__getitem__)]
 
         return orderedchars
 
@@ -217,7 +441,7 @@ class Page:
             typ = pp.FPDFPageObj_GetType(obj)
             if typ == ftyp:
                 if typ == pp.FPDF_PAGEOBJ_PATH:
-                    objs.append(Path(self, obj))
+                    objs.append(Path(self, obj, len(objs)))
                 elif typ == pp.FPDF_PAGEOBJ_IMAGE:
                     objs.append(Image(self, obj))
         return objs
@@ -226,26 +450,107 @@ class Page:
     def paths(self) -> list[Path]:
         if self._paths is None:
             self._paths = self._objects(pp.FPDF_PAGEOBJ_PATH)
+            PROFILER.count("paths", len(self._paths))
         return self._paths
 
+    @cached_property
+    def _path_segments(self) -> numpy.ndarray:
+        with PROFILER.stage("path_segments"):
+            return path_segments(self, self.paths)
+
     @property
     def images(self):
         if self._images is None:
             self._images = self._objects(pp.FPDF_PAGEOBJ_IMAGE)
         return self._images
 
-    def graphic_clusters(self, predicate=None, atol=None) -> list:
+    @cached_property
+    def _graphics(self) -> list:
+        return self.paths + self.images
+
+    @cached_property
+    def _graphics_bboxes(self) -> numpy.ndarray:
+        bboxes = [(g.bbox.left, g.bbox.bottom, g.bbox.right, g.bbox.top) for g in self._graphics]
+        return numpy.array(bboxes, dtype=numpy.float64).reshape(-1, 4)
+
+    @cached_property
+    def _graphics_index(self) -> SpatialGrid:
+        return SpatialGrid(self._graphics_bboxes, self._grid_size)
+
+    @profiled("graphic_clusters")
+    def graphic_clusters(self, predicate=None, atol=None, area=None) -> list:
+        """
+        Clusters the graphics into rectangular regions, first vertically, then
+        horizontally inside each vertical region.
+
+        Both passes are a sort-and-sweep over the bbox intervals: Sorted by
+        their lower bound, an interval starts a new region exactly when it does
+        not overlap the running maximum of all previous upper bounds.
+        This gives the same clusters as `_graphic_clusters_reference()`.
+        """
         if atol is None:
             atol = min(self.width, self.height) * 0.01
+        if not atol > 0:
+            # The greedy merge is not equivalent to a sweep without tolerance
+            return self._graphic_clusters_reference(predicate, atol, area)
+
+        graphics = self._graphics
+        if area is None:
+            indices = numpy.arange(len(graphics))
+        else:
+            indices = self._graphics_index.contained(area.left, area.bottom, area.right, area.top)
+        if predicate is not None:
+            indices = numpy.array([ii for ii in indices.tolist() if predicate(graphics[ii])],
+                                  dtype=numpy.intp)
+        if not len(indices):
+            return []
+        left, bottom, right, top = self._graphics_bboxes[indices].T
+
+        def _sweep(lower, upper):
+            starts = numpy.ones(len(lower), dtype=bool)
+            starts[1:] = numpy.maximum.accumulate(upper)[:-1] + atol <= lower[1:]
+            return numpy.flatnonzero(starts)
 
         # First collect all vertical regions
-        filtered_paths = []
-        for path in self.paths:
-            if predicate is None or predicate(path):
-                filtered_paths.append(path)
-        for image in self.images:
-            if predicate is None or predicate(image):
-                filtered_paths.append(image)
+        yorder = numpy.argsort(bottom, kind="stable")
+        ybottom, ytop = bottom[yorder], top[yorder]
+        ystarts = _sweep(ybottom, ytop)
+        yv0 = ybottom[ystarts]
+        yv1 = numpy.maximum.reduceat(ytop, ystarts)
+        # All paths with their bottom inside the region, also from other regions
+        ylower = numpy.searchsorted(ybottom, yv0 - atol, side="left")
+        yupper = numpy.searchsorted(ybottom, yv1 + atol, side="right")
+
+        clusters = []
+        for y0, y1, lower, upper in zip(yv0.tolist(), yv1.tolist(),
+                                        ylower.tolist(), yupper.tolist()):
+            # Now collect horizontal regions sorted by left and page order
+            members = yorder[lower:upper]
+            members = members[numpy.lexsort((members, left[members]))]
+            xleft, xright = left[members], right[members]
+            xstarts = _sweep(xleft, xright)
+            xv0 = xleft[xstarts].tolist()
+            xv1 = numpy.maximum.reduceat(xright, xstarts).tolist()
+            if len(xstarts) > 1:
+                # Strip down the height again for subregions
+                sy0 = numpy.minimum(numpy.minimum.reduceat(bottom[members], xstarts), 1e9).tolist()
+                sy1 = numpy.maximum(numpy.maximum.reduceat(top[members], xstarts), 0).tolist()
+            else:
+                sy0, sy1 = [y0], [y1]
+            xobjs = numpy.split(indices[members], xstarts[1:])
+            for x0, x1, cy0, cy1, objs in zip(xv0, xv1, sy0, sy1, xobjs):
+                clusters.append((Rectangle(x0, cy0, x1, cy1), [graphics[ii] for ii in objs.tolist()]))
+
+        return sorted(clusters, key=lambda c: (-c[0].y, c[0].x))
+
+    def _graphic_clusters_reference(self, predicate=None, atol=None, area=None) -> list:
+        # Original greedy implementation, kept for equivalence testing
+        if atol is None:
+            atol = min(self.width, self.height) * 0.01
+
+        # First collect all vertical regions
+        graphics = self._graphics if area is None else self.graphics_in_area(area)
+        filtered_paths = [g for g in graphics if predicate is None or predicate(g)]
 
         regions = []
         for path in sorted(filtered_paths, key=lambda l: l.bbox.y):
@@ -8,11 +8,61 @@
 # -----------------------------------------------------------------------------
 
 import ctypes
+import numpy
 from functools import cached_property
 from enum import Enum
 import pypdfium2 as pp
 from ..utils import Point as uPoint, Rectangle, Line as uLine, Transform
 
+SEGMENT_DTYPE = numpy.dtype([
+    ("path", numpy.int32),
+    ("type", numpy.int8),
+    ("x", numpy.float64),
+    ("y", numpy.float64),
+    ("close", numpy.bool_),
+])
+
+
+def path_segments(page, paths: list) -> numpy.ndarray:
+    """
+    Extracts the segments of all paths into one table of `SEGMENT_DTYPE`
+    sorted by path index. The path transforms and the page rotation are
+    applied to all points at once.
+    """
+    counts = [path.count for path in paths]
+    segments = numpy.zeros(sum(counts), dtype=SEGMENT_DTYPE)
+    segments["path"] = numpy.repeat(numpy.arange(len(paths), dtype=numpy.int32), counts)
+    types, coords, closes, matrices = [], [], [], []
+    x, y = ctypes.c_float(), ctypes.c_float()
+    mm = pp.FS_MATRIX()
+    for path, count in zip(paths, counts):
+        assert pp.FPDFPageObj_GetMatrix(path._path, mm)
+        matrices.append((mm.a, mm.b, mm.e, mm.c, mm.d, mm.f))
+        for ii in range(count):
+            seg = pp.FPDFPath_GetPathSegment(path._path, ii)
+            ptype = pp.FPDFPathSegment_GetType(seg)
+            if ii == 0:
+                # The first point should always be MOVETO
+                assert ptype == Path.Type.MOVE.value
+            types.append(ptype)
+            assert pp.FPDFPathSegment_GetPoint(seg, x, y)
+            coords.append((x.value, y.value))
+            closes.append(pp.FPDFPathSegment_GetClose(seg))
+    segments["type"] = types
+    segments["close"] = closes
+    raw = numpy.array(coords, dtype=numpy.float64).reshape(-1, 2)
+    matrices = numpy.array(matrices, dtype=numpy.float64).reshape(-1, 6)
+
+    # Same evaluation order as Transform.map() for identical results
+    m = matrices[segments["path"]]
+    px = m[:, 0] * raw[:, 0] + m[:, 1] * raw[:, 1] + m[:, 2]
+    py = m[:, 3] * raw[:, 0] + m[:, 4] * raw[:, 1] + m[:, 5]
+    if page.rotation:
+        px, py = py, page.height - px
+    segments["x"] = px
+    segments["y"] = py
+    return segments
+
 
 class Path:
     class Type(Enum):
@@ -31,26 +81,31 @@ class Path:
         BEVEL = 2
 
     class Point(uPoint):
+        __slots__ = ("type",)
+
         def __init__(self, x: float, y: float, ptype):
             super().__init__(x, y)
-            self.type = ptype
+            object.__setattr__(self, "type", ptype)
 
         def __repr__(self) -> str:
             fmt = super().__repr__()
             return f"{fmt[:-1]},{self.type.name})"
 
     class Line(uLine):
+        __slots__ = ("type",)
+
         def __init__(self, p0, p1, ltype, width):
             super().__init__(p0, p1, width=width)
-            self.type = ltype
+            object.__setattr__(self, "type", ltype)
 
         def __repr__(self) -> str:
             fmt = super().__repr__()
             return f"{fmt[:-1]},{self.type.name})>"
 
-    def __init__(self, page, path):
+    def __init__(self, page, path, index: int):
         self._page = page
         self._path = path
+        self._index = index
 
     @cached_property
     def count(self) -> int:
@@ -99,27 +154,22 @@ class Path:
         assert pp.FPDFPageObj_GetMatrix(self._path, mm)
         return Transform(mm)
 
+    @cached_property
+    def _segments(self) -> numpy.ndarray:
+        # View into the segment table of the page
+        segments = self._page._path_segments
+        start, stop = numpy.searchsorted(segments["path"], (self._index, self._index + 1))
+        return segments[start:stop]
+
     @cached_property
     def points(self) -> list[Point]:
+        segments = self._segments
         points = []
-
-        for ii in range(self.count):
-            seg = pp.FPDFPath_GetPathSegment(self._path, ii)
-            ptype = Path.Type(pp.FPDFPathSegment_GetType(seg))
-            if ii == 0:
-                # The first point should always be MOVETO
-                assert ptype == Path.Type.MOVE
-
-            x, y = ctypes.c_float(), ctypes.c_float()
-            assert pp.FPDFPathSegment_GetPoint(seg, x, y)
-            p = self.matrix.map(uPoint(x.value, y.value))
-            points.append(Path.Point(p.x, p.y, ptype))
-
-            if pp.FPDFPathSegment_GetClose(seg):
+        for ptype, x, y, close in zip(segments["type"].tolist(), segments["x"].tolist(),
+                                      segments["y"].tolist(), segments["close"].tolist()):
+            points.append(Path.Point(x, y, Path.Type(ptype)))
+            if close:
                 points.append(Path.Point(points[0].x, points[0].y, Path.Type.LINE))
-
-        if self._page.rotation:
-            points = [Path.Point(p.y, self._page.height - p.x, p.type) for p in points]
         return points
 
     @cached_property
@@ -128,6 +178,12 @@ class Path:
         return [Path.Line(points[ii], points[ii + 1], points[ii + 1].type, self.width)
                 for ii in range(len(points) - 1)]
 
+    def __getstate__(self) -> dict:
+        # Resolve all properties, since the object handle cannot be pickled
+        for name in ("count", "fill", "stroke", "width", "cap", "join", "bbox", "_segments"):
+            getattr(self, name)
+        return self.__dict__ | {"_path": None}
+
     def __repr__(self) -> str:
         points = ",".join(repr(p) for p in self.points)
         return f"P{self.count}{points}"
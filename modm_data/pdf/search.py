@@ -0,0 +1,187 @@
+# Copyright (c) 2022, Niklas Hauser
+#
+# This file is part of the modm-data project.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# -----------------------------------------------------------------------------
+
+"""
+Document-wide full-text search.
+
+The text of all pages is split into words, which are stored in an inverted
+index together with their page, char range and bounding box. The index is
+built once per document version and stored on disk, so that queries never
+need to load the pages again.
+"""
+
+import os
+import re
+import bisect
+import logging
+import tempfile
+import numpy
+from pathlib import Path as _FsPath
+from collections import namedtuple
+from ..utils import Rectangle, cache_path, profiled
+from .cache import document_key, EXTRACTOR_VERSION
+
+LOGGER = logging.getLogger(__name__)
+
+# Increment whenever the tokenization or the stored layout changes
+INDEX_VERSION = 1
+
+_TOKEN = re.compile(r"\w+")
+
+_POSTING_DTYPE = numpy.dtype([
+    ("token", numpy.int32),
+    ("page", numpy.int32),
+    ("position", numpy.int32),          # word index on the page
+    ("start", numpy.int32),             # char index range on the page
+    ("end", numpy.int32),
+    ("bbox", numpy.float64, (4,)),
+])
+
+SearchResult = namedtuple("SearchResult", ["page", "start", "end", "bbox"])
+
+
+def _page_postings(page) -> tuple[list[str], numpy.ndarray]:
+    matches = list(_TOKEN.finditer(page.text))
+    postings = numpy.zeros(len(matches), dtype=_POSTING_DTYPE)
+    if not matches:
+        return [], postings
+    spans = numpy.array([m.span() for m in matches], dtype=numpy.intp)
+    postings["page"] = page.index
+    postings["position"] = numpy.arange(len(matches))
+    postings["start"] = spans[:, 0]
+    postings["end"] = spans[:, 1]
+    # Reduce the char bboxes over all [start, end) ranges at once
+    bboxes = numpy.vstack([page._char_bboxes, numpy.zeros((1, 4))])
+    bounds = spans.reshape(-1)
+    postings["bbox"][:, :2] = numpy.minimum.reduceat(bboxes[:, :2], bounds)[::2]
+    postings["bbox"][:, 2:] = numpy.maximum.reduceat(bboxes[:, 2:], bounds)[::2]
+    return [m.group(0) for m in matches], postings
+
+
+class SearchIndex:
+    """
+    Inverted index of all words of a document.
+
+    The postings are sorted by word, page and position, so that the postings
+    of a word are one contiguous range. Queries with multiple words only
+    match the words in consecutive order on the same page.
+    """
+
+    def __init__(self, tokens: list[str], postings: numpy.ndarray, offsets: numpy.ndarray):
+        self._tokens = tokens
+        self._postings = postings
+        self._offsets = offsets.tolist()
+        # Lower case words for case-insensitive queries, sorted the same way
+        lower = sorted((token.lower(), ii) for ii, token in enumerate(tokens))
+        self._lower_tokens = [token for token, _ in lower]
+        self._lower_ids = [ii for _, ii in lower]
+
+    @classmethod
+    @profiled("search_index")
+    def build(cls, document):
+        """Extracts the words of all pages of the document."""
+        words, postings = [], []
+        for page in document.pages():
+            page_words, page_postings = _page_postings(page)
+            words.extend(page_words)
+            postings.append(page_postings)
+        postings = numpy.concatenate(postings) if postings else numpy.zeros(0, dtype=_POSTING_DTYPE)
+        tokens, ids = numpy.unique(numpy.array(words, dtype=str), return_inverse=True)
+        postings["token"] = ids.reshape(-1)
+        postings = postings[numpy.lexsort((postings["position"], postings["page"], postings["token"]))]
+        offsets = numpy.searchsorted(postings["token"], numpy.arange(len(tokens) + 1))
+        return cls(tokens.tolist(), postings, offsets)
+
+    @classmethod
+    def load(cls, file):
+        with numpy.load(file, allow_pickle=False) as data:
+            return cls(data["tokens"].tolist(), data["postings"], data["offsets"])
+
+    def store(self, file):
+        # Write atomically, multiple processes may index the same document
+        file = _FsPath(file)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=file.parent, suffix=".npz", delete=False) as tmp:
+            numpy.savez(tmp, tokens=numpy.array(self._tokens, dtype=str),
+                        postings=self._postings, offsets=numpy.array(self._offsets))
+        os.replace(tmp.name, file)
+
+    @classmethod
+    def cached(cls, document, path=None):
+        """Loads the index of the document from disk or builds and stores it."""
+        path = cache_path("pdf-search") if path is None else _FsPath(path)
+        file = path / f"{document.name}-{document_key(document)}-" \
+                      f"v{EXTRACTOR_VERSION}.{INDEX_VERSION}.npz"
+        if file.exists():
+            try:
+                return cls.load(file)
+            except (OSError, ValueError, KeyError) as error:
+                LOGGER.warning(f"Ignoring corrupt search index {file}: {error}")
+        index = cls.build(document)
+        index.store(file)
+        return index
+
+    def _token_ids(self, word: str, case_sensitive: bool, prefix: bool) -> list[int]:
+        if case_sensitive:
+            tokens, ids = self._tokens, None
+        else:
+            tokens, ids = self._lower_tokens, self._lower_ids
+            word = word.lower()
+        start = bisect.bisect_left(tokens, word)
+        if prefix:
+            end = start
+            while end < len(tokens) and tokens[end].startswith(word):
+                end += 1
+        else:
+            end = bisect.bisect_right(tokens, word, lo=start)
+        return list(range(start, end)) if ids is None else ids[start:end]
+
+    def _word_postings(self, word: str, case_sensitive: bool, prefix: bool) -> numpy.ndarray:
+        ranges = [self._postings[self._offsets[ii]:self._offsets[ii + 1]]
+                  for ii in self._token_ids(word, case_sensitive, prefix)]
+        return numpy.concatenate(ranges) if ranges else self._postings[:0]
+
+    def find(self, query: str, case_sensitive: bool = True, prefix: bool = False) -> list[SearchResult]:
+        """
+        Finds all occurrences of the words of the query, for example
+        "Table 123" or "GPIOx_MODER". With `prefix` the last word of the query
+        only needs to be the start of a word. The results are sorted by page
+        and char index.
+        """
+        words = _TOKEN.findall(query)
+        if not words:
+            return []
+        postings = [self._word_postings(word, case_sensitive, prefix and ii == len(words) - 1)
+                    for ii, word in enumerate(words)]
+        # The following words must be at the next positions of the same page
+        ends = {}
+        for offset, following in enumerate(postings[1:], start=1):
+            ends[offset] = {(page, position - offset): (end, bbox) for page, position, end, bbox in
+                            zip(following["page"].tolist(), following["position"].tolist(),
+                                following["end"].tolist(), following["bbox"].tolist())}
+        results = []
+        for page, position, start, end, bbox in zip(
+                postings[0]["page"].tolist(), postings[0]["position"].tolist(),
+                postings[0]["start"].tolist(), postings[0]["end"].tolist(),
+                postings[0]["bbox"].tolist()):
+            for offset in range(1, len(words)):
+                if (following := ends[offset].get((page, position))) is None:
+                    break
+                end, other = following
+                bbox = [min(bbox[0], other[0]), min(bbox[1], other[1]),
+                        max(bbox[2], other[2]), max(bbox[3], other[3])]
+            else:
+                results.append(SearchResult(page, start, end, Rectangle(*bbox)))
+        return sorted(results, key=lambda r: (r.page, r.start))
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def __repr__(self) -> str:
+        return f"SearchIndex({len(self._tokens)} words, {len(self._postings)} postings)"
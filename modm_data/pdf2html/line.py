@@ -64,6 +64,16 @@ class CharLine:
     def fonts(self) -> set:
         return set(c.font for c in self.chars if c.font)
 
+    @cached_property
+    def styles(self) -> int:
+        styles = 0
+        for char in self.chars:
+            styles |= char.style
+        return styles
+
+    def contains_style(self, style: int) -> bool:
+        return bool(self.styles & style)
+
     def contains_font(self, *fragments) -> bool:
         for fragment in fragments:
             if any(fragment in font for font in self.fonts):
@@ -7,6 +7,7 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # -----------------------------------------------------------------------------
 
-from .page import Page, is_compatible
-from .ast import normalize_document, merge_area, format_document, write_html
-from .convert import convert, patch
+from .page import Page, is_compatible, classify_page
+from .ast import normalize_document, merge_area, format_document, write_html, write_html_stream
+from .serialize import dumps_ast, loads_ast, AstCache
+from .convert import convert, convert_pages, convert_chapters, convert_documents, patch
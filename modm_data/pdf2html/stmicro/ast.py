@@ -8,11 +8,13 @@
 # -----------------------------------------------------------------------------
 
 import logging
+import itertools
 from lxml import etree
 import anytree
 from anytree import RenderTree
 from collections import defaultdict
-from ...utils import list_strip, Rectangle, ReversePreOrderIter
+from ...utils import list_strip, Rectangle, ReversePreOrderIter, PROFILER, profiled
+from ...pdf import FontStyle
 from .table import VirtualTable, TableCell
 
 LOGGER = logging.getLogger(__name__)
@@ -30,6 +32,7 @@ def _normalize_area(area):
     return area
 
 
+@profiled("merge")
 def merge_area(document, area, debug=False):
     if document is None:
         document = anytree.Node("document", xpos=0, _page=area.page, _doc=area.page._page._doc, _end=None)
@@ -65,7 +68,7 @@ def merge_area(document, area, debug=False):
             host = _find_ancestor(lambda c: -4 * x_em < (c.xpos - child.xpos) < -x_em or
                                             c.name.startswith("head"))
         elif (child.name == "para" and document._end.name == "note" and
-              child.children[0].obj.contains_font("Italic", "Oblique")):
+              child.children[0].obj.contains_style(FontStyle.ITALIC)):
             host = document._end
         else:
             # Insert underneath the next heading
@@ -191,6 +194,24 @@ def _normalize_headings(document):
     return document
 
 
+def _bit_cells(bit, ypos: int) -> list[TableCell]:
+    if (cells := getattr(bit, "_cells", None)) is not None:
+        # Serialized ASTs already contain the cells with their content
+        for xpos, cell in enumerate(cells):
+            cell.positions = [(ypos, xpos)]
+        return cells
+    # The top is the first line, the bottom by the last line
+    top = next(c.obj.bbox.top for c in bit.descendants if c.name == "line")
+    bottom = next(c.obj.bbox.bottom for c in reversed(bit.descendants) if c.name == "line")
+    # Left table cell contains Bits
+    left_bbox = Rectangle(bit._left, bottom, bit._middle, top)
+    # Right cell contains description
+    right_bbox = Rectangle(bit._middle, bottom, bit._right, top)
+    borders = TableCell.Borders(1, 1, 1, 1)
+    return [TableCell(None, (ypos, 0), left_bbox, borders, is_simple=True),
+            TableCell(None, (ypos, 1), right_bbox, borders)]
+
+
 def _normalize_registers(document):
     bits_list = []
     sections = anytree.search.findall(document, filter_=lambda n: n.name == "section")
@@ -217,15 +238,7 @@ def _normalize_registers(document):
         cells = []
         for ypos, bit in enumerate(bits.children):
             bit.parent = None
-            # The top is the first line, the bottom by the last line
-            top = next(c.obj.bbox.top for c in bit.descendants if c.name == "line")
-            bottom = next(c.obj.bbox.bottom for c in reversed(bit.descendants) if c.name == "line")
-            # Left table cell contains Bits
-            left_bbox = Rectangle(bit._left, bottom, bit._middle, top)
-            cells.append(TableCell(None, (ypos, 0), left_bbox, (1,1,1,1), is_simple=True))
-            # Right cell contains description
-            right_bbox = Rectangle(bit._middle, bottom, bit._right, top)
-            cells.append(TableCell(None, (ypos, 1), right_bbox, (1,1,1,1)))
+            cells.extend(_bit_cells(bit, ypos))
         tbbox = Rectangle(min(c.bbox.left for c in cells),
                           min(c.bbox.bottom for c in cells),
                           max(c.bbox.right for c in cells),
@@ -334,6 +347,7 @@ def _normalize_chapters(document) -> list:
     return document
 
 
+@profiled("normalize")
 def normalize_document(document):
     def _debug(func, indata, debug=0):
         print(func.__name__[1:])
@@ -601,16 +615,19 @@ def _format_html(xmlnode, treenode, ignore_formatting=None,
         _format_html(current, child, ignore_formatting, with_newlines, with_start)
 
 
-def format_document(document):
-    html = etree.Element("html")
-
+def _format_html_head():
     head = etree.Element("head")
-    html.append(head)
-
     link = etree.Element("link")
     link.set("rel", "stylesheet")
     link.set("href", "../style.css")
     head.append(link)
+    return head
+
+
+@profiled("format")
+def format_document(document):
+    html = etree.Element("html")
+    html.append(_format_html_head())
 
     body = etree.Element("body")
     html.append(body)
@@ -621,6 +638,86 @@ def format_document(document):
     return html
 
 
+@profiled("write")
 def write_html(html, path, pretty=True):
     with open(path, "wb") as f:
         html.write(f, pretty_print=pretty, doctype="<!DOCTYPE html>")
+
+
+def _indent_html(element, level):
+    # Same indentation as libxml2, which does not format mixed content
+    children = list(element)
+    if not children or element.text or any(c.tail for c in children):
+        return
+    element.text = "\n" + "  " * (level + 1)
+    for child in children:
+        _indent_html(child, level + 1)
+        child.tail = element.text
+    children[-1].tail = "\n" + "  " * level
+
+
+def _write_html_element(xf, element, level, pretty):
+    if pretty:
+        _indent_html(element, level)
+        xf.write("\n" + "  " * level)
+    xf.write(element)
+
+
+def _normalized_sections(areas):
+    # Areas are only merged below the last top-level node, so all nodes before
+    # it are finished and can be normalized on their own. The nodes preceding
+    # the first heading stay with it, since they are normalized together.
+    document = None
+    written = False
+    for area in areas:
+        document = merge_area(document, area)
+        while sum(1 for c in document.children if c.name.startswith("head")) > 1:
+            section = anytree.Node("document", xpos=0, _page=document._page, _doc=document._doc)
+            for child in list(document.children):
+                child.parent = section
+                if child.name.startswith("head"):
+                    break
+            yield normalize_document(section)
+            written = True
+    if document is not None and (document.children or not written):
+        yield normalize_document(document)
+
+
+@profiled("write")
+def write_html_stream(areas, path, pretty=True) -> bool:
+    """
+    Merges the areas into a document and formats and writes each top-level
+    section as soon as it is finished, so that neither the AST nor the element
+    tree of the whole document is kept in memory. The output is the same as
+    `write_html(format_document(normalize_document(document)))`.
+
+    :return: `False` if there were no areas to write.
+    """
+    sections = _normalized_sections(areas)
+    if (first := next(sections, None)) is None:
+        return False
+    if any(c.name in {"text", "page"} for c in first.children):
+        # These modify the body itself, so the document is written at once
+        for section in sections:
+            for child in list(section.children):
+                child.parent = first
+        write_html(format_document(first), path, pretty)
+        return True
+    with open(path, "wb") as f:
+        with etree.xmlfile(f, encoding="ASCII") as xf:
+            xf.write_doctype("<!DOCTYPE html>")
+            with xf.element("html"):
+                _write_html_element(xf, _format_html_head(), 1, pretty)
+                if pretty: xf.write("\n  ")
+                with xf.element("body"):
+                    for section in itertools.chain([first], sections):
+                        body = etree.Element("body")
+                        with PROFILER.stage("format"):
+                            _format_html(body, section, with_newlines=True)
+                        for element in body:
+                            _write_html_element(xf, element, 2, pretty)
+                    if pretty: xf.write("\n  ")
+                if pretty: xf.write("\n")
+        # The xmlfile does not write anything after the root element
+        if pretty: f.write(b"\n")
+    return True
@@ -7,60 +7,286 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # -----------------------------------------------------------------------------
 
+import os
+import sys
+import time
+import threading
+import traceback
+import contextlib
+import multiprocessing
+from datetime import timedelta
+from itertools import groupby
+from pathlib import Path
+from collections import OrderedDict
 from anytree import RenderTree
 
-from .page import Page
+from .page import Page, classify_page, page_template
 from .ast import merge_area, normalize_document
-from .ast import format_document, write_html
+from .ast import format_document, write_html, write_html_stream
+from .serialize import PageData, dumps_ast, loads_ast, relocate_ast, AstCache
 from ..render import render_page_png, render_page_pdf
-from ...utils import patch_path
+from ...pdf import Document
+from ...pdf.cache import GlyphCache
+from ...utils import patch_path, PROFILER, profiled
 import pypdfium2 as pp
 # import subprocess
 import patch_ng
 
 
+def _is_skipped(page, render_all) -> bool:
+    return not render_all and any(c in page.top for c in {"Contents", "List of ", "Index"})
+
+
+def _page(doc, index, render_all):
+    # Skipped pages are recognized before their chars and paths are extracted
+    if not render_all:
+        category, top = classify_page(doc, index)
+        if category == "skip":
+            PROFILER.count("skipped_pages")
+            return PageData(index, top, page_template(doc), {})
+    return Page(doc.page(index))
+
+
+def _page_ast(page, render_all, with_ast, ast_cache) -> bytes:
+    if not with_ast or _is_skipped(page, render_all):
+        return dumps_ast(page, None)
+    if ast_cache is None:
+        return dumps_ast(page, page.content_ast)
+    if (data := ast_cache.load(page)) is None:
+        data = dumps_ast(page, page.content_ast)
+        ast_cache.store(page, data)
+    else:
+        PROFILER.count("ast_cache_hits")
+    return data
+
+
+def _load_page_ast(data, page_index, top) -> tuple:
+    page, areas = loads_ast(data)
+    # Cached ASTs may come from another page with identical content
+    relocate_ast(page, areas, page_index, top)
+    return page, areas
+
+
+# Pages converted ahead of the consumer per worker of the pool
+_PAGES_IN_FLIGHT = 4
+
+_WORKER_DOCUMENTS = OrderedDict()
+_WORKER_AST_CACHE = None
+
+
+def _init_worker(incremental, profile):
+    global _WORKER_AST_CACHE
+    if profile:
+        PROFILER.enable()
+    _WORKER_AST_CACHE = AstCache() if incremental else None
+
+
+def _worker_document(path, cache, glyphs) -> list:
+    # The documents are converted one after the other, so only keep the last
+    # two open with the number of glyphs already returned
+    if (entry := _WORKER_DOCUMENTS.get(path)) is None:
+        document = Document(path, cache=cache, glyphs=glyphs)
+        entry = _WORKER_DOCUMENTS[path] = [document, len(document._bbox_cache)]
+        if len(_WORKER_DOCUMENTS) > 2:
+            _WORKER_DOCUMENTS.popitem(last=False)
+    return entry
+
+
+def _convert_page(args) -> tuple:
+    path, cache, glyphs, index, render_all, with_ast = args
+    entry = _worker_document(path, cache, glyphs)
+    document = entry[0]
+    # The page record is returned to the main process
+    with PROFILER.page(index, document.name) as record:
+        page = _page(document, index, render_all)
+        data = _page_ast(page, render_all, with_ast, _WORKER_AST_CACHE)
+    # The main process merges the record, so do not accumulate it here too
+    if record is not None:
+        PROFILER.pages.clear()
+    # The workers are terminated, so the main process merges the new glyphs
+    glyphs = None
+    if document._glyph_cache is not None:
+        glyphs = document._glyphs_since(entry[1])
+        entry[1] = len(document._bbox_cache)
+    return data, page.top, record, glyphs
+
+
+def _convert_batch_page(args) -> tuple:
+    # A failing page must not abort the conversion of all other documents
+    try:
+        return _convert_page(args)
+    except Exception:
+        # The output of all documents is interleaved, so name it on every line
+        name = Path(args[0]).stem
+        print(f"{name}: Converting page {args[3] + 1} of '{args[0]}' failed!", file=sys.stderr)
+        for line in traceback.format_exc().splitlines():
+            print(f"{name}: {line}", file=sys.stderr)
+        return None
+
+
+def _pool_pages(documents, tasks, render_all, with_ast, jobs, incremental, batch=False):
+    """
+    Converts the (document index, page index) tasks in a pool of workers and
+    yields (document index, page index, result, new glyphs) in order, where
+    `documents` is a list of (path, cache, glyphs) to open the documents with
+    in the workers. In batch mode, the result of failed pages is None instead
+    of raising the exception.
+    """
+    # The pool feeds all tasks to the workers at once and queues the results,
+    # so only a few pages per worker are converted ahead of the consumer
+    slots = threading.Semaphore(_PAGES_IN_FLIGHT * (jobs or os.cpu_count()))
+    closed = threading.Event()
+
+    def _args():
+        for ii, index in tasks:
+            slots.acquire()
+            if closed.is_set():
+                return
+            yield (*documents[ii], index, render_all, with_ast)
+
+    func = _convert_batch_page if batch else _convert_page
+    initargs = (incremental, PROFILER.enabled)
+    with multiprocessing.Pool(jobs, initializer=_init_worker, initargs=initargs) as pool:
+        try:
+            for (ii, index), result in zip(tasks, pool.imap(func, _args())):
+                slots.release()
+                if result is None:
+                    yield ii, index, None, None
+                    continue
+                data, top, record, glyphs = result
+                if record is not None:
+                    PROFILER.add_page(record)
+                yield ii, index, _load_page_ast(data, index, top), glyphs
+        finally:
+            # Unblock the task feeder, otherwise terminating the pool hangs
+            closed.set()
+            slots.release(len(tasks) + 1)
+
+
+def convert_pages(doc, page_range, render_all=False, with_ast=True, jobs=1, incremental=False):
+    """
+    Yields the pages in order together with their content AST, which is None
+    for skipped pages or if not requested. Unless all pages are rendered, the
+    skipped pages are classified up front and yielded as `PageData` objects.
+
+    With more than one job, the pages are distributed one by one to a pool
+    of worker processes that each keep the document open. The workers return
+    the serialized page ASTs, so the yielded pages are `PageData` objects.
+
+    In incremental mode the serialized page ASTs are stored in an `AstCache`
+    keyed by the page fingerprint, and unchanged pages are not converted
+    again. All yielded pages are then `PageData` objects.
+    """
+    if jobs is not None and jobs <= 1:
+        ast_cache = AstCache() if incremental else None
+        for index in page_range:
+            if not 0 <= index < doc.page_count:
+                continue
+            with PROFILER.page(index, doc.name):
+                page = _page(doc, index, render_all)
+                if incremental:
+                    data = _page_ast(page, render_all, with_ast, ast_cache)
+                    result = _load_page_ast(data, index, page.top)
+                else:
+                    areas = None
+                    if with_ast and not _is_skipped(page, render_all):
+                        areas = page.content_ast
+                    result = (page, areas)
+            yield result
+        return
+
+    tasks = [(0, ii) for ii in page_range if 0 <= ii < doc.page_count]
+    documents = [(doc._path, doc._page_cache is not None, doc._glyph_cache is not None)]
+    for _, _, result, glyphs in _pool_pages(documents, tasks, render_all, with_ast, jobs, incremental):
+        for key, bbox in (glyphs or {}).items():
+            doc._bbox_cache.setdefault(key, bbox)
+        yield result
+
+
+def _write_document(document, output_path, format_chapters=False, pretty=True):
+    if format_chapters:
+        for chapter in document.children:
+            if chapter.name == "chapter":
+                output_file = f"{output_path}/chapter_{chapter._filename}.html"
+                print(f"\nFormatting HTML for '{chapter.title}'")
+                html = format_document(chapter)
+                print(f"\nWriting HTML '{output_file}'")
+                write_html(html, output_file, pretty=pretty)
+    else:
+        print("\nFormatting HTML")
+        html = format_document(document)
+        print(f"\nWriting HTML '{str(output_path)}'")
+        write_html(html, str(output_path), pretty=pretty)
+
+
+@profiled("convert")
 def convert(doc, page_range, output_path, format_chapters=False, pretty=True,
             render_html=True, render_png=False, render_pdf=False, render_all=False,
-            show_ascii=False, show_ast=False, show_tree=False, show_tags=False) -> bool:
+            show_ascii=False, show_ast=False, show_tree=False, show_tags=False,
+            jobs=1, incremental=False, stream=False) -> bool:
 
     document = None
     debug_doc = None
     debug_index = 0
-    for dpage in doc.pages(page_range):
-        page = Page(dpage)
-        if not render_all and any(c in page.top for c in {"Contents", "List of ", "Index"}):
-            continue
-        print(f"\n\n=== {page.top} #{dpage.number} ===\n")
-
-        if show_ascii:
-            print(page.format_ascii())
-
-        if show_tags:
-            for struct in dpage.structures:
-                print(struct.descr())
-
-        if show_tree or render_html or show_ast:
-            areas = page.content_ast
-            if show_ast:
-                print()
-                for area in areas:
-                    print(RenderTree(area))
-            if show_tree or render_html:
-                for area in areas:
-                    document = merge_area(document, area)
-
-        if render_png:
-            img = render_page(page, scale=3, frames=True, spacing=True)
-            img.save(f"debug_{output_path.stem}_{dpage.number}.png")
-        if render_pdf:
-            debug_doc = render_page_pdf(doc, page, debug_doc, debug_index)
-            debug_index += 1
+    with_ast = show_tree or render_html or show_ast
+    # The debug output requires the full page
+    if show_ascii or show_tags or render_png or render_pdf:
+        jobs = 1
+        incremental = False
+    # Only compute the AST up front when it is done by the worker processes
+    # or when it may be loaded from the cache, or to profile it per page
+    ahead = jobs is None or jobs > 1 or incremental or PROFILER.enabled
+    pages = convert_pages(doc, page_range, render_all, with_ast and ahead, jobs, incremental)
+
+    def _areas():
+        nonlocal debug_doc, debug_index
+        for page, areas in pages:
+            dpage = page._page
+            if _is_skipped(page, render_all):
+                continue
+            print(f"\n\n=== {page.top} #{dpage.number} ===\n")
+
+            if show_ascii:
+                print(page.format_ascii())
+
+            if show_tags:
+                for struct in dpage.structures:
+                    print(struct.descr())
+
+            if with_ast:
+                if areas is None:
+                    areas = page.content_ast
+                if show_ast:
+                    print()
+                    for area in areas:
+                        print(RenderTree(area))
+                if show_tree or render_html:
+                    yield from areas
+
+            if render_png:
+                img = render_page(page, scale=3, frames=True, spacing=True)
+                img.save(f"debug_{output_path.stem}_{dpage.number}.png")
+            if render_pdf:
+                debug_doc = render_page_pdf(doc, page, debug_doc, debug_index)
+                debug_index += 1
+
+    # The tree and the chapters require the whole document
+    stream = stream and render_html and not show_tree and not format_chapters
+    if stream:
+        print(f"\nStreaming HTML to '{str(output_path)}'")
+        streamed = write_html_stream(_areas(), str(output_path), pretty=pretty)
+    else:
+        for area in _areas():
+            document = merge_area(document, area)
 
     if render_pdf:
         with open(f"debug_{output_path.stem}.pdf", 'wb') as file_handle:
             pp.save_pdf(debug_doc, file_handle)
 
-    if show_tree or render_html:
+    if stream:
+        if not streamed:
+            print("No pages parsed, empty document!")
+    elif show_tree or render_html:
         if document is None:
             print("No pages parsed, empty document!")
             return True
@@ -70,23 +296,137 @@ def convert(doc, page_range, output_path, format_chapters=False, pretty=True,
             print(RenderTree(document))
 
         if render_html:
-            if format_chapters:
-                for chapter in document.children:
-                    if chapter.name == "chapter":
-                        print(f"\nFormatting HTML for '{chapter.title}'")
-                        html = format_document(chapter)
-                        output_file = f"{output_path}/chapter_{chapter._filename}.html"
-                        print(f"\nWriting HTML '{output_file}'")
-                        write_html(html, output_file, pretty=pretty)
-            else:
-                print("\nFormatting HTML")
-                html = format_document(document)
-                print(f"\nWriting HTML '{str(output_path)}'")
-                write_html(html, str(output_path), pretty=pretty)
+            _write_document(document, output_path, format_chapters, pretty)
 
     return True
 
 
+def _chapter_index(chapters) -> dict:
+    return {ii: index for index, (pages, _) in enumerate(chapters) for ii in pages}
+
+
+def _chapter_areas(pages):
+    for page, areas in pages:
+        if areas is None:
+            continue
+        print(f"\n\n=== {page.top} #{page._page.number} ===\n")
+        yield from areas
+
+
+def _write_chapters(pages, chapters, pretty, stream):
+    chapter_index = _chapter_index(chapters)
+    for index, chapter_pages in groupby(pages, key=lambda p: chapter_index[p[0]._page.index]):
+        output_path = chapters[index][1]
+        areas = _chapter_areas(chapter_pages)
+        if stream:
+            # Each section is written as soon as its last page has been converted
+            print(f"\nStreaming HTML to '{str(output_path)}'")
+            if write_html_stream(areas, output_path, pretty=pretty):
+                continue
+        else:
+            document = None
+            for area in areas:
+                document = merge_area(document, area)
+            if document is not None:
+                _write_document(normalize_document(document), output_path, pretty=pretty)
+                continue
+        print(f"No pages parsed, empty document '{output_path}'!")
+
+
+@profiled("convert")
+def convert_chapters(doc, chapters, pretty=True, jobs=None, incremental=False,
+                     stream=False) -> bool:
+    """
+    Converts consecutive page ranges into separate HTML files in one pass over
+    the document, where `chapters` is a list of (page range, output path).
+    Each chapter is written as soon as its last page has been converted.
+    """
+    pages = convert_pages(doc, sorted(_chapter_index(chapters)), jobs=jobs, incremental=incremental)
+    _write_chapters(pages, chapters, pretty, stream)
+    return True
+
+
+class _PageFailed(Exception):
+    pass
+
+
+def _progress(pages, total: int):
+    start = time.perf_counter()
+    step = max(1, total // 100)
+    for done, page in enumerate(pages, start=1):
+        yield page
+        if done % step == 0 or done == total:
+            elapsed = time.perf_counter() - start
+            eta = elapsed / done * (total - done)
+            print(f"\nProgress: {done}/{total} pages ({done / total:.0%}), "
+                  f"{done / elapsed:.1f} pages/s, elapsed {timedelta(seconds=round(elapsed))}, "
+                  f"ETA {timedelta(seconds=round(eta))}", file=sys.stderr, flush=True)
+
+
+@contextlib.contextmanager
+def _document_log(log_path, name: str):
+    if log_path is None:
+        yield
+        return
+    Path(log_path).mkdir(parents=True, exist_ok=True)
+    with open(Path(log_path) / f"{name}.txt", "w") as file:
+        with contextlib.redirect_stdout(file):
+            yield
+
+
+@profiled("convert")
+def convert_documents(documents, pretty=True, jobs=None, incremental=False,
+                      stream=False, log_path=None, cache=False, glyphs=False) -> list:
+    """
+    Converts the chapters of multiple documents with one shared pool of
+    workers, where `documents` is a list of (path, chapters) with the
+    chapters as in `convert_chapters()`. The documents are only opened by
+    the workers with the `cache` and `glyphs` options of `Document`.
+
+    The pages are scheduled longest processing time first by the number of
+    pages per document, so that the small documents fill up the idle workers
+    at the end. The progress and remaining time is reported on stderr. A
+    document with a failing page is skipped, and the paths of the documents
+    that were converted successfully are returned. If a log path is given,
+    the output of each document is written to its own log file there.
+    """
+    documents = [(path, chapters, sorted(_chapter_index(chapters)))
+                 for path, chapters in documents]
+    documents.sort(key=lambda d: len(d[2]), reverse=True)
+    tasks = [(ii, index) for ii, (_, _, indices) in enumerate(documents) for index in indices]
+    pages = _pool_pages([(str(path), cache, glyphs) for path, _, _ in documents], tasks,
+                        False, True, jobs, incremental, batch=True)
+    glyph_cache = GlyphCache() if glyphs else None
+    converted = []
+
+    def _pages(results, new_glyphs):
+        for _, index, result, page_glyphs in results:
+            if result is None:
+                raise _PageFailed(index)
+            new_glyphs.update(page_glyphs or {})
+            yield result
+
+    for ii, results in groupby(_progress(pages, len(tasks)), key=lambda p: p[0]):
+        path, chapters, indices = documents[ii]
+        name = Path(path).stem
+        new_glyphs = {}
+        with _document_log(log_path, name):
+            print(f"\nConverting {name} with {len(indices)} pages")
+            try:
+                _write_chapters(_pages(results, new_glyphs), chapters, pretty, stream)
+            except _PageFailed as error:
+                message = f"Skipping {name}, page {error.args[0] + 1} failed!"
+                print(message)
+                print(message, file=sys.stderr)
+                continue
+            finally:
+                # The workers are terminated, so the glyphs are merged here
+                if glyph_cache is not None and new_glyphs:
+                    glyph_cache.merge(new_glyphs)
+        converted.append(path)
+    return converted
+
+
 def patch(doc, output_path, patch_file=None) -> bool:
     if patch_file is None:
         # First try the patch file for the specific version
@@ -9,16 +9,18 @@
 
 import re
 import math
+import hashlib
 import logging
 import textwrap
 import statistics
-from functools import cached_property, cache, reduce
+import numpy
+from functools import cached_property, cache
 from collections import defaultdict
 from .table import Table
 from ..figure import Figure
 from ..line import CharLine
-from ...utils import HLine, VLine, Rectangle, Region
-from ...pdf import Path, Image
+from ...utils import HLine, VLine, Rectangle, RectArray, Region, PROFILER, profiled
+from ...pdf import Path, Image, FontStyle
 from anytree import Node
 
 
@@ -34,18 +36,72 @@ def is_compatible(document) -> bool:
     return False
 
 
+def _scale_black_white(page, r) -> Rectangle:
+    if page.rotation:
+        return Rectangle(r.bottom * page.width, (1 - r.right) * page.height,
+                         r.top * page.width, (1 - r.left) * page.height)
+    return Rectangle(r.left * page.width, r.bottom * page.height,
+                     r.right * page.width, r.top * page.height)
+
+
+def _scale_blue_gray(page, r) -> Rectangle:
+    return Rectangle(r.left * page.width, r.bottom * page.height,
+                     r.right * page.width, r.top * page.height)
+
+
+def _top_blue_gray(page) -> Rectangle:
+    if page.width > page.height:
+        return Rectangle(0.9025, 0.05, 0.9175, 0.7)
+    return Rectangle(0.3, 0.9025, 0.95, 0.9175)
+
+
+_TOP_BLACK_WHITE = Rectangle(0.1, 0.9125, 0.9, 0.9375)
+
+
+def page_template(document) -> str:
+    producer = document.metadata.get("Producer", "").lower()
+    return "blue_gray" if "antenna" in producer else "black_white"
+
+
+def top_area(page, template: str) -> Rectangle:
+    """Returns the scaled area of the chapter name on top of the page."""
+    if template == "blue_gray":
+        return _scale_blue_gray(page, _top_blue_gray(page))
+    return _scale_black_white(page, _TOP_BLACK_WHITE)
+
+
+def is_datasheet_front(page, template: str) -> bool:
+    """The first pages of a datasheet have their own layout heuristics."""
+    if template == "blue_gray":
+        return page.index < 10
+    return page.index < 3 and "DS" in page._doc._name
+
+
+def classify_page(document, index: int) -> tuple[str, str]:
+    """
+    Classifies a page before any chars or paths are extracted into "skip" for
+    the contents, the lists of tables and figures and the index, and
+    "content" otherwise. Only the page geometry and the text on top of the
+    page are read from pdfium.
+
+    :return: the class and the text on top of the page.
+    """
+    template = page_template(document)
+    page = document.page(index, extract=False)
+    top = "Cover" if index == 0 else page.text_in_area(top_area(page, template))
+    if any(c in top for c in {"Contents", "List of ", "Index"}):
+        return "skip", top
+    return "content", top
+
+
 def areas_black_white(page) -> dict:
     def _scale(r):
-        if page.rotation:
-            return Rectangle(r.bottom * page.width, (1 - r.right) * page.height,
-                             r.top * page.width, (1 - r.left) * page.height)
-        return Rectangle(r.left * page.width, r.bottom * page.height,
-                         r.right * page.width, r.top * page.height)
+        return _scale_black_white(page, r)
 
     bottom_left = Rectangle(0.1, 0.1, 0.3, 0.12)
     bottom_middle = Rectangle(0.3, 0.1, 0.7, 0.12)
     bottom_right = Rectangle(0.7, 0.1, 0.9, 0.12)
-    top = Rectangle(0.1, 0.9125, 0.9, 0.9375)
+    top = _TOP_BLACK_WHITE
     content = Rectangle(0.025, 0.12, 0.975, 0.905 if page.index else 0.79)
     all_content = [content]
     areas = {
@@ -67,10 +123,10 @@ def areas_black_white(page) -> dict:
         areas["top"] = top
 
     # Recognize the two column design of the Datasheets with a big table underneath
-    if page.index < 3 and "DS" in page._doc._name:
+    if is_datasheet_front(page, "black_white"):
         # Find a wide path that would denote the beginning of a table
-        top_rect = [p.bbox.top / page.height for p in page.paths
-                    if _scale(content).contains(p.bbox) and p.bbox.width > page.width * 0.75]
+        top_rect = [p.bbox.top / page.height for p in page.graphics_in_area(_scale(content))
+                    if isinstance(p, Path) and p.bbox.width > page.width * 0.75]
         if top_rect:
             # offset for table label just above it
             ybottom = max(*top_rect) + 0.0175
@@ -106,19 +162,18 @@ def areas_black_white(page) -> dict:
 
 def areas_blue_gray(page) -> dict:
     def _scale(r):
-        return Rectangle(r.left * page.width, r.bottom * page.height,
-                         r.right * page.width, r.top * page.height)
+        return _scale_blue_gray(page, r)
 
     # This template doesn't use rotated pages, instead uses
     # hardcoded rotated page dimensions
     if page.width > page.height:
         content = Rectangle(0.05, 0.025, 0.89, 0.975)
         bottom_left = Rectangle(0, 0.6, 0.05, 1)
-        top_right = Rectangle(0.9025, 0.05, 0.9175, 0.7)
+        top_right = _top_blue_gray(page)
     else:
         content = Rectangle(0.025, 0.05, 0.975, 0.89 if page.index else 0.81)
         bottom_left = Rectangle(0, 0, 0.4, 0.05)
-        top_right = Rectangle(0.3, 0.9025, 0.95, 0.9175)
+        top_right = _top_blue_gray(page)
     areas = {
         "id": bottom_left,
         "top": top_right,
@@ -132,7 +187,7 @@ def areas_blue_gray(page) -> dict:
             # Document description string
             Rectangle(0.05, 0.81, 0.95, 0.86)
         ]
-    if page.index < 10:
+    if is_datasheet_front(page, "blue_gray"):
         # Contains only a table with product summary
         br = Rectangle(0.35, content.bottom, 0.37, content.top)
         text_bullets = page.text_in_area(_scale(br))
@@ -272,13 +327,9 @@ class Page:
     def __init__(self, page):
         self._doc = page._doc
         self._page = page
-        self._template = "black_white"
+        self._template = page_template(page._doc)
         producer = page._doc.metadata.get("Producer", "").lower()
-        if "acrobat" in producer:
-            pass # default
-        elif "antenna" in producer:
-            self._template = "blue_gray"
-        else:
+        if not any(p in producer for p in ("acrobat", "antenna")):
             LOGGER.error(f"Unknown page template! Defaulting to Black/White template. '{producer}'")
 
         if "blue_gray" in self._template:
@@ -304,7 +355,7 @@ class Page:
         if ((self._doc.name == "RM0456-v2" and self._page.index in [3005])):
             self._spacing["th"] = 0.52
 
-    def _text_in_area(self, name, max_length=100, check_length=True) -> str:
+    def _text_in_area(self, name, max_length=None, check_length=True) -> str:
         if name not in self._areas: return ""
         text = ""
         areas = self._areas[name]
@@ -329,7 +380,140 @@ class Page:
             return False
         return True
 
-    def _charlines_filtered(self, area, predicate = None, rtol = None) -> list[CharLine]:
+    @profiled("charlines")
+    def _charlines_filtered(self, area, predicate = None, rtol = None,
+                            style: int = None) -> list[CharLine]:
+        """
+        Splits the chars in the area into lines based on their rounded origin
+        and merges overlapping lines, typically super- and subscripts.
+        Only chars with any of the `FontStyle` flags in `style` are used.
+
+        The chars are filtered and grouped on the columns of the page char
+        table, so that only the predicate runs per char and the merging per
+        line. This gives the same lines as `_charlines_filtered_reference()`.
+        """
+        if rtol is None: rtol = self._spacing["sc"]
+        page = self._page
+        table = page._chars
+        indices = page._char_indices_in_area(area)
+        # Ignore all characters we don't want
+        if style is not None:
+            indices = indices[(page._char_styles[indices] & style) != 0]
+        if predicate is not None:
+            keep = [bool(predicate(page.char(ii))) for ii in indices.tolist()]
+            indices = indices[numpy.array(keep, dtype=bool)]
+        # Ignore Carriage Return characters and ® (superscript issues)
+        indices = indices[~numpy.isin(table["unicode"][indices], (0xd, ord("®")))]
+        # Correct some weird unicode stuffing choices only on the char objects
+        unicode = table["unicode"][indices]
+        unicode = numpy.where(unicode == 2, ord("-"), unicode)
+        unicode = numpy.where(numpy.isin(unicode, (61623, 61664)), ord("•"), unicode)
+        for ii in numpy.flatnonzero(unicode != table["unicode"][indices]).tolist():
+            page.char(int(indices[ii])).unicode = int(unicode[ii])
+        keep = (unicode >= 32) | (unicode == 0xa)
+        indices, unicode = indices[keep], unicode[keep]
+        if not len(indices):
+            return []
+
+        # Same as Character.bbox, which falls back to the tight bbox
+        bbox = table["bbox"][indices]
+        empty = (bbox[:, 2] == bbox[:, 0]) | (bbox[:, 3] == bbox[:, 1])
+        bbox = numpy.where(empty[:, None], table["tbbox"][indices], bbox)
+        rotation = page._char_rotations(indices)
+        widths = numpy.where(rotation != 0, bbox[:, 3] - bbox[:, 1], bbox[:, 2] - bbox[:, 0])
+        heights = numpy.where(rotation != 0, bbox[:, 2] - bbox[:, 0], bbox[:, 3] - bbox[:, 1])
+        whitespace = numpy.isin(unicode, (0xa, 0xd, 0x20))
+        # Ignore characters without width that are not spaces
+        for ii in indices[(widths == 0) & ~whitespace].tolist():
+            char = page.char(ii)
+            LOGGER.error(f"Unknown char width for {char}: {char.bbox}")
+
+        def _lines(members, axis: int, lower: int, upper: int, sizes) -> list:
+            if not len(members):
+                return []
+            # Group the chars by rounded origin in the order of their first char
+            origins = table["origin"][indices[members], axis]
+            keys = numpy.array([round(o, 1) for o in origins.tolist()])
+            _, first, inverse = numpy.unique(keys, return_index=True, return_inverse=True)
+            rank = numpy.empty(len(first), dtype=numpy.intp)
+            rank[numpy.argsort(first, kind="stable")] = numpy.arange(len(first))
+            group = rank[inverse.reshape(-1)]
+            order = numpy.argsort(group, kind="stable")
+            members, origins = members[order], origins[order].tolist()
+            ends = numpy.cumsum(numpy.bincount(group))
+            starts = numpy.concatenate(([0], ends[:-1]))
+            # Remove lines with whitespace only
+            valid = ~numpy.logical_and.reduceat(whitespace[members], starts)
+            bottoms = numpy.minimum.reduceat(bbox[members, lower], starts)[valid].tolist()
+            tops = numpy.maximum.reduceat(bbox[members, upper], starts)[valid].tolist()
+            sizes = numpy.maximum.reduceat(sizes[members], starts)[valid].tolist()
+            angles = numpy.add.reduceat(rotation[members], starts)[valid].tolist()
+            lines = []
+            for start, end, bottom, top, size, angle in zip(
+                    starts[valid].tolist(), ends[valid].tolist(), bottoms, tops, sizes, angles):
+                # Same as statistics.fmean()
+                origin = math.fsum(origins[start:end]) / (end - start)
+                if axis:
+                    line = [bottom, origin, top, size, 0, page.height - origin]
+                else:
+                    line = [bottom, origin, top, size,
+                            270 if angle <= 135 * (end - start) else 90, origin]
+                # Same as CharLine.height
+                line[3] = line[3] or (top - bottom)
+                lines.append(line + [[members[start:end]]])
+            return sorted(lines, key=lambda l: l[5])
+
+        # Split up the chars depending on the orientation
+        vertical = ((45 < rotation) & (rotation <= 135)) | ((225 < rotation) & (rotation <= 315))
+        bbox_lines = _lines(numpy.flatnonzero(~vertical), 1, 1, 3, heights)
+        bbox_lines += _lines(numpy.flatnonzero(vertical), 0, 0, 2, widths)
+        if not bbox_lines:
+            return []
+
+        # Merge lines that have overlapping bbox_lines
+        # FIXME: This merges lines that "collide" vertically like in formulas
+        merged_lines = []
+        current_line = bbox_lines[0]
+        for next_line in bbox_lines[1:]:
+            height = max(current_line[3], next_line[3])
+            # Calculate overlap via normalize origin (increasing with line index)
+            if (current_line[5] + rtol * height) > (next_line[5] - rtol * height):
+                line = current_line if current_line[3] >= next_line[3] else next_line
+                current_line = line[:3] + [height or (line[2] - line[0])] + line[4:6] + \
+                               [current_line[6] + next_line[6]]
+            else:
+                # The next line does not overlap the current line
+                merged_lines.append(current_line)
+                current_line = next_line
+        # append last line
+        merged_lines.append(current_line)
+
+        # Sort all lines horizontally based on character origin
+        sorted_lines = []
+        for bottom, origin, top, height, line_rotation, sort_origin, members in merged_lines:
+            members = numpy.concatenate(members)
+            chars = indices[members]
+            linefeed = unicode[members] == 0xa
+            if line_rotation == 90:
+                tbbox = table["tbbox"][chars]
+                keys = (tbbox[:, 3] + tbbox[:, 1]) / 2
+                keys = numpy.where(linefeed, keys - 1e9, keys)
+            elif line_rotation == 270:
+                tbbox = table["tbbox"][chars]
+                keys = -((tbbox[:, 3] + tbbox[:, 1]) / 2)
+                keys = numpy.where(linefeed, keys + 1e9, keys)
+            else:
+                keys = table["origin"][chars, 0]
+                keys = numpy.where(linefeed, keys + 1e9, keys)
+            chars = chars[numpy.argsort(keys, kind="stable")]
+            sorted_lines.append(CharLine(self, [page.char(ii) for ii in chars.tolist()],
+                                         bottom, origin, top, height, line_rotation,
+                                         area.left, sort_origin=sort_origin))
+
+        return sorted_lines
+
+    def _charlines_filtered_reference(self, area, predicate = None, rtol = None) -> list[CharLine]:
+        # Original implementation on the char objects, kept for equivalence testing
         if rtol is None: rtol = self._spacing["sc"]
         # Split all chars into lines based on rounded origin
         origin_lines_y = defaultdict(list)
@@ -477,6 +661,7 @@ class Page:
             areas = [(area, None)]
         return areas
 
+    @profiled("objects")
     def _objects_filtered(self, area: Rectangle, with_graphics: bool = True) -> list:
         self._page.link_characters()
         areas = self._content_areas(area, with_graphics)
@@ -492,28 +677,41 @@ class Page:
                 objects += list(sorted(lines + [obj], key=lambda o: (-o.bbox.y, o.bbox.x)))
         return objects
 
-    @property
-    def content_ast(self) -> list:
-        ast = []
-        with_graphics = True
+    @cached_property
+    def _with_graphics(self) -> bool:
         if "DS" in self._doc._name:
             # FIXME: Terrible hack to get the ordering information table fixed
             # Should be done in the AST as a rewrite similar to bit table rewrite with VirtualTable
             order_page = next((item.page for item in self._doc.toc if item.level == 0 and
                                re.search("ordering +information|part +numbering", item.title, re.IGNORECASE)), -1)
-            with_graphics = (order_page != self._page.index)
+            return order_page != self._page.index
+        return True
+
+    @cached_property
+    def fingerprint(self) -> str:
+        # All inputs of the content AST apart from the page number
+        settings = (self._template, sorted(self._spacing.items()),
+                    self._areas["content"], self._with_graphics)
+        settings = hashlib.blake2b(repr(settings).encode("utf-8"), digest_size=8)
+        return f"{self._page.fingerprint}-{settings.hexdigest()}"
+
+    @property
+    @profiled("content_ast")
+    def content_ast(self) -> list:
+        ast = []
         for area in self._areas["content"]:
-            ast.append(self._ast_filtered(area, with_graphics=with_graphics))
+            ast.append(self._ast_filtered(area, with_graphics=self._with_graphics))
         # Add a page node to the first leaf to keep track of where a page starts
         first_leaf = next((n for n in iter(ast[0].descendants) if n.is_leaf), ast[0])
         Node("page", parent=first_leaf, xpos=first_leaf.xpos, number=self._page.number)
         return ast
 
+    @profiled("find_tables")
     def _graphics_filtered(self, area) -> list:
         # Find all graphic clusters in this area
         em = self._spacing["y_em"]
         large_area = area.offset_x(em/2)
-        graphic_clusters = self._page.graphic_clusters(lambda p: large_area.contains(p.bbox), em/2)
+        graphic_clusters = self._page.graphic_clusters(atol=em/2, area=large_area)
         # for bbox, paths in raw_graphic_clusters:
         #     # Some docs have large DRAFT chars in the background
         #     if any(path.fill == 0xe6e6e6ff and path.stroke == 0xff for path in paths):
@@ -522,7 +720,7 @@ class Page:
 
         # Find the captions and group them by y origin to catch side-by-side figures
         ycaptions = defaultdict(list)
-        for line in self._charlines_filtered(area, lambda c: "Bold" in c.font):
+        for line in self._charlines_filtered(area, style=FontStyle.BOLD):
             for cluster in line.clusters():
                 for phrase in [r"Figure \d+\.", r"Table \d+\."]:
                     if re.match(phrase, cluster.content):
@@ -563,14 +761,12 @@ class Page:
                 if "Figure" in phrase:
                     # Find all other graphics in the bounding box
                     gbbox = Rectangle(left, graphic[0].bottom, right, cbbox.bottom)
-                    graphics = []
-                    for b, p in graphic_clusters:
-                        if gbbox.overlaps(b):
-                            graphics.append((b,p))
+                    bboxes = RectArray.from_rects(b for b, _ in graphic_clusters)
+                    graphics = [graphic_clusters[ii] for ii in
+                                numpy.flatnonzero(bboxes.overlapped_by(gbbox)).tolist()]
                     for g in graphics:
                         graphic_clusters.remove(g)
-                    gbbox = [cluster[0] for cluster in graphics]
-                    gbbox = reduce(lambda r0, r1: r0.joined(r1), gbbox)
+                    gbbox = RectArray.from_rects(b for b, _ in graphics).union()
                     paths = [p for cluster in graphics for p in cluster[1]]
 
                     if self._template == "blue_gray":
@@ -687,6 +883,7 @@ class Page:
                     continue
                 table = Table(self, graphics_bbox, xlines, ylines, caption_bbox,
                               is_register="register" in otype)
+                PROFILER.count("tables")
                 objects.append(table)
 
         return objects
@@ -721,8 +918,8 @@ class Page:
         cp = {
             "superscript": False,
             "subscript": False,
-            "bold": any(frag in char.font for frag in {"Bold"}),
-            "italic": any(frag in char.font for frag in {"Italic", "Oblique"}),
+            "bold": bool(char.style & FontStyle.BOLD),
+            "italic": bool(char.style & FontStyle.ITALIC),
             "underline": (char.objlink or char.weblink) is not None,
             "size": round(line.height),
             "relsize": self._line_size(line),
@@ -790,6 +987,7 @@ class Page:
             lines.extend(self._format_ascii_area(area, with_ansi))
         return "\n".join(lines)
 
+    @profiled("ast")
     def _ast_filtered(self, area: Rectangle, with_graphics=True,
                       ignore_xpos=False, with_bits=True, with_notes=True) -> list:
         x_em = self._spacing["x_em"]
@@ -846,7 +1044,7 @@ class Page:
                 # be careful not to nest them, but group them properly
                 # Headings are always inserted into the root note!
                 if linesize.startswith("h1") or (linesize.startswith("h") and
-                        xpos < (spacing_content + 2 * x_em) and "Bold" in obj.chars[0].font):
+                        xpos < (spacing_content + 2 * x_em) and obj.chars[0].style & FontStyle.BOLD):
                     if (match := re.match(r"^ *(\d+(\.\d+)?(\.\d+)?) *", content)) is not None:
                         start = min(len(match.group(0)), len(obj.chars) - 1)
                         marker = match.group(1)
@@ -881,7 +1079,7 @@ class Page:
 
                 # Check if line is Table or Figure caption
                 elif with_graphics and ((match := re.match(r" *([Tt]able|[Ff]igure) ?(\d+)\.? ?", content)) is not None
-                      and "Bold" in obj.chars[0].font):
+                      and obj.chars[0].style & FontStyle.BOLD):
                     content_start = min(len(match.group(0)), len(obj.chars) - 1)
                     current = next((c for c in current.iter_path_reverse()
                                 if c.name.startswith("head")), root)
@@ -906,9 +1104,9 @@ class Page:
 
                 # Check if line is a register bit definition
                 elif with_bits and re.match(r" *([Bb]ytes? *.+? *)?B[uio]ts? *\d+", content) is not None:
-                    if obj.contains_font("Bold"):
+                    if obj.contains_style(FontStyle.BOLD):
                         # Use the bold character as delimiter
-                        content_start = next(xi for xi, c in enumerate(obj.chars) if "Bold" in c.font)
+                        content_start = next(xi for xi, c in enumerate(obj.chars) if c.style & FontStyle.BOLD)
                     else:
                         # Default back to the regex
                         if "Reserved" not in content:
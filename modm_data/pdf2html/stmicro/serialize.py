@@ -0,0 +1,302 @@
+# Copyright (c) 2022, Niklas Hauser
+#
+# This file is part of the modm-data project.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# -----------------------------------------------------------------------------
+
+"""
+Pointer-free page ASTs.
+
+The content AST of a page references the live `CharLine`, `Table` and
+`Figure` objects, which in turn reference the pdfium backed page. Here the AST
+is flattened into plain tuples with all information that the later stages
+`merge_area()`, `normalize_document()` and `format_document()` need:
+
+- lines become a text string with one formatting flag byte per character,
+- tables become their cell grid with the cell content and cell ASTs,
+- figures become their bounding boxes.
+
+Objects shared by multiple nodes are stored once and referenced by index.
+`loads_ast()` rebuilds the anytree nodes on top of small data objects with
+the same interface as the live objects.
+"""
+
+import os
+import pickle
+import numbers
+import tempfile
+from pathlib import Path as _FsPath
+from collections import namedtuple
+from anytree import Node, PreOrderIter
+from .page import Page
+from .table import Table, TableCell, VirtualTable
+from .ast import _bit_cells
+from ..figure import Figure
+from ..line import CharLine
+from ...utils import Rectangle, cache_path, profiled
+from ...pdf.character import FontStyle, font_style
+
+# Increment whenever the serialized layout or the AST construction changes
+AST_VERSION = 1
+
+_FLAGS = {"superscript": 1, "subscript": 2, "italic": 4, "bold": 8, "underline": 16}
+
+
+def _bbox(rect: Rectangle) -> tuple[float, float, float, float]:
+    return (rect.left, rect.bottom, rect.right, rect.top)
+
+
+CharData = namedtuple("CharData", ["unicode", "flags"])
+
+
+class LineData:
+    def __init__(self, bbox, rotation: int, fonts: tuple, text: str, flags: bytes):
+        self.bbox = Rectangle(*bbox)
+        self.rotation = rotation
+        self.fonts = set(fonts)
+        self.chars = [CharData(ord(char), flag) for char, flag in zip(text, flags)]
+        # The style only depends on the font name
+        self.styles = FontStyle(0)
+        for font in self.fonts:
+            self.styles |= font_style(font)
+
+    contains_font = CharLine.contains_font
+    contains_style = CharLine.contains_style
+
+    @property
+    def content(self) -> str:
+        return "".join(chr(c.unicode) for c in self.chars)
+
+    def __repr__(self) -> str:
+        return f"Line({len(self.chars)})"
+
+
+class CellData(TableCell):
+    def __init__(self, positions, bbox, borders, is_header: bool, is_simple: bool,
+                 rotation: int, left_aligned: bool, content: str, ast):
+        super().__init__(None, tuple(positions[0]), Rectangle(*bbox),
+                         TableCell.Borders(*borders), is_simple)
+        self.positions = [tuple(p) for p in positions]
+        self.is_header = is_header
+        self._rotation = rotation
+        self._left_aligned = left_aligned
+        self._content = content
+        self._ast = ast
+
+    @property
+    def rotation(self) -> int:
+        return self._rotation
+
+    @property
+    def left_aligned(self) -> bool:
+        return self._left_aligned
+
+    @property
+    def content(self) -> str:
+        return self._content
+
+    @property
+    def ast(self):
+        return self._ast
+
+
+class PageData:
+    def __init__(self, index: int, top: str, template: str, spacing: dict):
+        self.index = index
+        self.number = index + 1
+        self.top = top
+        self._template = template
+        self._spacing = spacing
+        # The AST functions access the pdf page and document through the page
+        self._page = self
+        self._doc = None
+
+    def _char_properties(self, line, char) -> dict:
+        properties = {key: bool(char.flags & flag) for key, flag in _FLAGS.items()}
+        properties["char"] = chr(char.unicode)
+        return properties
+
+    def __repr__(self) -> str:
+        return f"StPage({self.number})"
+
+
+class _Encoder:
+    def __init__(self, page):
+        self._page = page
+        self._ids = {}
+        self.objects = []
+
+    def _object(self, obj) -> int:
+        if (entry := self._ids.get(id(obj))) is None:
+            # Keep the object alive, cell ASTs are temporary and ids get reused.
+            # Reserve the index first, since tables recurse into their cells.
+            entry = self._ids[id(obj)] = (len(self.objects), obj)
+            self.objects.append(None)
+            self.objects[entry[0]] = self._record(obj)
+        return entry[0]
+
+    def _record(self, obj) -> tuple:
+        if isinstance(obj, CharLine):
+            text = "".join(chr(c.unicode) for c in obj.chars)
+            flags = bytes(sum(flag for key, flag in _FLAGS.items() if props[key])
+                          for props in (self._page._char_properties(obj, c) for c in obj.chars))
+            return ("line", _bbox(obj.bbox), obj.rotation, tuple(sorted(obj.fonts)), text, flags)
+        if isinstance(obj, Table):
+            # The cells may change the grid size of register tables
+            cells = tuple(self._cell(cell) for cell in obj.cells)
+            return ("table", obj._type, _bbox(obj.bbox), obj.grid, cells)
+        if isinstance(obj, Figure):
+            return ("figure", _bbox(obj.bbox), _bbox(obj.cbbox) if obj.cbbox else None)
+        raise TypeError(f"Cannot serialize {obj!r}!")
+
+    def _cell(self, cell) -> tuple:
+        return (tuple(cell.positions), _bbox(cell.bbox),
+                (cell.b.l, cell.b.b, cell.b.r, cell.b.t), cell.is_header, cell._is_simple,
+                cell.rotation, cell.left_aligned, cell.content,
+                None if cell._is_simple else self.tree(cell.ast))
+
+    def _value(self, value):
+        if isinstance(value, (CharLine, Table, Figure)):
+            return ("obj", self._object(value))
+        if isinstance(value, Rectangle):
+            return ("rect", _bbox(value))
+        if isinstance(value, Page):
+            return ("page",)
+        # Tuples are reserved for the encoded values above
+        if value is not None and not isinstance(value, (str, numbers.Number)):
+            raise TypeError(f"Cannot serialize {value!r}!")
+        return value
+
+    def tree(self, node) -> tuple:
+        attrs = [(key, self._value(value)) for key, value in node.__dict__.items()
+                 if not key.startswith("_NodeMixin__") and key != "name"]
+        if node.name == "bit":
+            # Only the page can provide the cell content of the bit tables
+            cells = _bit_cells(node, 0)
+            VirtualTable(node._page, Rectangle(0, 0, 0, 0), cells)
+            attrs.append(("_cells", ("cells", tuple(self._cell(c) for c in cells))))
+        children = tuple(self.tree(child) for child in node.children)
+        return (node.name, tuple(attrs), children)
+
+
+class _Decoder:
+    def __init__(self, page: PageData, objects: tuple):
+        self._page = page
+        self._records = objects
+        self._objects = {}
+
+    def _object(self, index: int):
+        if (obj := self._objects.get(index)) is None:
+            obj = self._objects[index] = self._build(self._records[index])
+        return obj
+
+    def _build(self, record):
+        kind, *data = record
+        if kind == "line":
+            return LineData(*data)
+        if kind == "table":
+            table_type, bbox, grid, cells = data
+            cells = [self._cell(cell) for cell in cells]
+            table = VirtualTable(self._page, Rectangle(*bbox), cells, table_type)
+            # Spanning cells do not necessarily cover the last grid position
+            table.grid = tuple(grid)
+            return table
+        if kind == "figure":
+            bbox, cbbox = data
+            return Figure(self._page, Rectangle(*bbox), Rectangle(*cbbox) if cbbox else None)
+        raise ValueError(f"Unknown AST object '{kind}'!")
+
+    def _cell(self, cell) -> CellData:
+        *data, ast = cell
+        return CellData(*data, None if ast is None else self.tree(ast))
+
+    def _value(self, value):
+        if not isinstance(value, tuple):
+            return value
+        kind, *data = value
+        if kind == "obj":
+            return self._object(data[0])
+        if kind == "rect":
+            return Rectangle(*data[0])
+        if kind == "page":
+            return self._page
+        if kind == "cells":
+            return [self._cell(cell) for cell in data[0]]
+        raise ValueError(f"Unknown AST value '{kind}'!")
+
+    def tree(self, tree) -> Node:
+        name, attrs, children = tree
+        node = Node(name, **{key: self._value(value) for key, value in attrs})
+        node.children = [self.tree(child) for child in children]
+        return node
+
+
+@profiled("dumps_ast")
+def dumps_ast(page, areas: list = None) -> bytes:
+    """
+    Serializes the content AST of a stmicro page into bytes. The areas may be
+    None, in which case only the page information is stored.
+    """
+    encoder = _Encoder(page)
+    trees = None if areas is None else tuple(encoder.tree(area) for area in areas)
+    info = (page._page.index, page.top, page._template, page._spacing)
+    return pickle.dumps((AST_VERSION, info, tuple(encoder.objects), trees),
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+
+@profiled("loads_ast")
+def loads_ast(data: bytes) -> tuple[PageData, list]:
+    """
+    Deserializes the page AST into the page information and a list of area
+    nodes that can be passed to `merge_area()`.
+    """
+    version, info, objects, trees = pickle.loads(data)
+    if version != AST_VERSION:
+        raise ValueError(f"Unsupported AST version {version}!")
+    page = PageData(*info)
+    decoder = _Decoder(page, objects)
+    areas = None if trees is None else [decoder.tree(tree) for tree in trees]
+    return page, areas
+
+
+def relocate_ast(page: PageData, areas: list, index: int, top: str):
+    """Moves a deserialized page AST to another page of the same content."""
+    page.index = index
+    page.number = index + 1
+    page.top = top
+    for area in areas or []:
+        for node in PreOrderIter(area, filter_=lambda n: n.name == "page"):
+            node.number = page.number
+
+
+class AstCache:
+    """
+    Content addressed on-disk store of serialized page ASTs.
+
+    The entries are keyed by the page fingerprint only, so that unchanged
+    pages of any other document or document version are reused.
+    """
+
+    def __init__(self, path=None):
+        path = cache_path("stmicro-ast") if path is None else _FsPath(path)
+        self.path = path / f"v{AST_VERSION}"
+
+    def _file(self, page):
+        return self.path / f"{page.fingerprint}.ast"
+
+    def load(self, page) -> bytes:
+        file = self._file(page)
+        return file.read_bytes() if file.exists() else None
+
+    def store(self, page, data: bytes):
+        # Write atomically, multiple processes may convert the same page
+        self.path.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.path, suffix=".ast", delete=False) as file:
+            file.write(data)
+        os.replace(file.name, self._file(page))
+
+    def __repr__(self) -> str:
+        return f"AstCache({self.path})"
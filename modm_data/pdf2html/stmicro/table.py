@@ -7,11 +7,13 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # -----------------------------------------------------------------------------
 
+import numpy
 import logging
 import statistics
 from functools import cached_property
 from collections import defaultdict
-from ...utils import HLine, VLine, Rectangle
+from ...utils import HLine, VLine, Rectangle, PROFILER
+from ...pdf import FontStyle
 
 LOGGER = logging.getLogger(__name__)
 
@@ -344,8 +346,8 @@ class Table:
                             else:
                                 bbox = bbox.joined(cell.bbox)
                     if bbox is None: continue
-                    chars = self._page._page.chars_in_area(bbox)
-                    is_bold_pct = sum(1 if "Bold" in c.font else 0 for c in chars) / len(chars) if chars else 1
+                    styles = self._page._page._char_styles[self._page._page._char_indices_in_area(bbox)]
+                    is_bold_pct = numpy.count_nonzero(styles & FontStyle.BOLD) / len(styles) if len(styles) else 1
                     is_bold.append((yi, is_bold_pct > self._spacing["th"]))
 
                 # Some tables have no bold cells at all
@@ -381,6 +383,7 @@ class Table:
                 self.grid = (32, 4)
 
             self._cells = list(sorted(cells, key=lambda c: c.positions[0]))
+            PROFILER.count("cells", len(self._cells))
 
         return self._cells
 
@@ -565,7 +568,8 @@ class VirtualTable(Table):
         self._type = table_type or "virtual"
         self.bbox = bbox
         self._cells = cells
-        self.grid = (max(c.x for c in cells) + 1, max(c.y for c in cells) + 1)
+        self.grid = (max((c.x for c in cells), default=-1) + 1,
+                     max((c.y for c in cells), default=-1) + 1)
         for cell in cells:
             cell._table = self
 
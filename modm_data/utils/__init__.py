@@ -7,7 +7,9 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # -----------------------------------------------------------------------------
 
-from .math import Point, Line, VLine, HLine, Rectangle, Transform, Region
+from .math import Point, Line, VLine, HLine, Rectangle, RectArray, Transform, Region
+from .spatial import SpatialGrid
 from .helper import list_lstrip, list_strip, list_rstrip
 from .anytree import ReversePreOrderIter
 from .path import *
+from .profile import Profiler, PROFILER, profiled
@@ -10,20 +10,41 @@
 import math
 import numpy
 from enum import Enum
-from functools import cached_property
 
 import pypdfium2 as pp
 # PDF User Cordinate System is mathematical: x *right*, y *upwards*
 
 
-class Point:
+def _fmt(value) -> str:
+    return f"{value:.1f}" if isinstance(value, float) else value
+
+
+class _Immutable:
+    # The slots are only written once in the constructor
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"'{type(self).__name__}' object is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"'{type(self).__name__}' object is immutable")
+
+    def __setstate__(self, state):
+        for name, value in state[1].items():
+            object.__setattr__(self, name, value)
+
+
+_set = object.__setattr__
+
+
+class Point(_Immutable):
+    __slots__ = ("x", "y")
+
     def __init__(self, *xy):
         if isinstance(xy[0], tuple):
-            self.x = xy[0][0]
-            self.y = xy[0][1]
-        else:
-            self.x = xy[0]
-            self.y = xy[1]
+            xy = xy[0]
+        _set(self, "x", xy[0])
+        _set(self, "y", xy[1])
 
     @property
     def np(self) -> numpy.array:
@@ -46,12 +67,12 @@ class Point:
         return hash(f"{self.x} {self.y}")
 
     def __repr__(self) -> str:
-        x = f"{self.x:.1f}" if isinstance(self.x, float) else self.x
-        y = f"{self.y:.1f}" if isinstance(self.y, float) else self.y
-        return f"({x},{y})"
+        return f"({_fmt(self.x)},{_fmt(self.y)})"
 
 
-class Line:
+class Line(_Immutable):
+    __slots__ = ("p0", "p1", "width")
+
     class Direction(Enum):
         ANGLE = 0
         VERTICAL = 1
@@ -59,21 +80,18 @@ class Line:
 
     def __init__(self, *r, width: float = None):
         if isinstance(r[0], Rectangle):
-            self.p0 = r[0].p0
-            self.p1 = r[0].p1
+            p0, p1 = r[0].p0, r[0].p1
         elif isinstance(r[0], Point):
-            self.p0 = r[0]
-            self.p1 = r[1]
+            p0, p1 = r[0], r[1]
         elif isinstance(r[0], tuple):
-            self.p0 = Point(r[0][0], r[0][1])
-            self.p1 = Point(r[1][0], r[1][1])
+            p0, p1 = Point(r[0][0], r[0][1]), Point(r[1][0], r[1][1])
         else:
-            self.p0 = Point(r[0], r[1])
-            self.p1 = Point(r[2], r[3])
-
-        self.width = 0.1 if width is None else width
+            p0, p1 = Point(r[0], r[1]), Point(r[2], r[3])
+        _set(self, "p0", p0)
+        _set(self, "p1", p1)
+        _set(self, "width", 0.1 if width is None else width)
 
-    @cached_property
+    @property
     def bbox(self):
         return Rectangle(min(self.p0.x, self.p1.x),
                          min(self.p0.y, self.p1.y),
@@ -117,79 +135,89 @@ class Line:
 
 
 class VLine(Line):
+    __slots__ = ("length",)
+
     def __init__(self, x: float, y0: float, y1: float, width: float = None):
         if y0 > y1: y0, y1 = y1, y0
         super().__init__(Point(x, y0), Point(x, y1), width=width)
-        self.length = y1 - y0
+        _set(self, "length", y1 - y0)
 
     @property
     def direction(self):
         return Line.Direction.VERTICAL
 
     def __repr__(self) -> str:
-        x = f"{self.p0.x:.1f}" if isinstance(self.p0.x, float) else self.p0.x
-        y0 = f"{self.p0.y:.1f}" if isinstance(self.p0.y, float) else self.p0.y
-        y1 = f"{self.p1.y:.1f}" if isinstance(self.p1.y, float) else self.p1.y
+        x, y0, y1 = _fmt(self.p0.x), _fmt(self.p0.y), _fmt(self.p1.y)
         if self.width:
             return f"<X{x}:{y0},{y1}|{self.width:.1f}>"
         return f"<X{x}:{y0},{y1}>"
 
 
 class HLine(Line):
+    __slots__ = ("length",)
+
     def __init__(self, y: float, x0: float, x1: float, width: float = None):
         if x0 > x1: x0, x1 = x1, x0
         super().__init__(Point(x0, y), Point(x1, y), width=width)
-        self.length = x1 - x0
+        _set(self, "length", x1 - x0)
 
     @property
     def direction(self):
         return Line.Direction.HORIZONTAL
 
     def __repr__(self) -> str:
-        y = f"{self.p0.y:.1f}" if isinstance(self.p0.y, float) else self.p0.y
-        x0 = f"{self.p0.x:.1f}" if isinstance(self.p0.x, float) else self.p0.x
-        x1 = f"{self.p1.x:.1f}" if isinstance(self.p1.x, float) else self.p1.x
+        y, x0, x1 = _fmt(self.p0.y), _fmt(self.p0.x), _fmt(self.p1.x)
         if self.width:
             return f"<Y{y}:{x0},{x1}|{self.width:.1f}>"
         return f"<Y{y}:{x0},{x1}>"
 
 
-class Rectangle:
+class Rectangle(_Immutable):
+    __slots__ = ("left", "bottom", "right", "top")
+
     def __init__(self, *r):
-        # P0 is left, bottom
-        # P1 is right, top
-        if isinstance(r[0], pp.FS_RECTF):
-            self.p0 = Point(r[0].left, r[0].bottom)
-            self.p1 = Point(r[0].right, r[0].top)
+        if len(r) == 4:
+            left, bottom, right, top = r
+        elif isinstance(r[0], pp.FS_RECTF):
+            left, bottom, right, top = r[0].left, r[0].bottom, r[0].right, r[0].top
         elif isinstance(r[0], Point):
-            self.p0 = r[0]
-            self.p1 = r[1]
-        elif isinstance(r[0], tuple):
-            self.p0 = Point(r[0][0], r[0][1])
-            self.p1 = Point(r[1][0], r[1][1])
+            left, bottom, right, top = r[0].x, r[0].y, r[1].x, r[1].y
         else:
-            self.p0 = Point(r[0], r[1])
-            self.p1 = Point(r[2], r[3])
+            left, bottom, right, top = r[0][0], r[0][1], r[1][0], r[1][1]
 
         # Ensure the correct ordering of point values
-        if self.p0.x > self.p1.x:
-            self.p0.x, self.p1.x = self.p1.x, self.p0.x
-        if self.p0.y > self.p1.y:
-            self.p0.y, self.p1.y = self.p1.y, self.p0.y
+        if left > right: left, right = right, left
+        if bottom > top: bottom, top = top, bottom
+        _set(self, "left", left)
+        _set(self, "bottom", bottom)
+        _set(self, "right", right)
+        _set(self, "top", top)
+
+    # P0 is left, bottom
+    @property
+    def p0(self) -> Point:
+        return Point(self.left, self.bottom)
 
-        # assert self.p0.x <= self.p1.x
-        # assert self.p0.y <= self.p1.y
+    # P1 is right, top
+    @property
+    def p1(self) -> Point:
+        return Point(self.right, self.top)
 
-        self.x = self.p0.x
-        self.y = self.p0.y
-        self.left = self.p0.x
-        self.bottom = self.p0.y
+    @property
+    def x(self) -> float:
+        return self.left
 
-        self.right = self.p1.x
-        self.top = self.p1.y
+    @property
+    def y(self) -> float:
+        return self.bottom
+
+    @property
+    def width(self) -> float:
+        return self.right - self.left
 
-        self.width = self.p1.x - self.p0.x
-        self.height = self.p1.y - self.p0.y
+    @property
+    def height(self) -> float:
+        return self.top - self.bottom
 
     def contains(self, other) -> bool:
         if isinstance(other, Point):
@@ -201,64 +229,159 @@ class Rectangle:
                 self.left <= other.left and other.right <= self.right)
 
     def overlaps(self, other) -> bool:
-        return self.contains(other.p0) or self.contains(other.p1)
+        # Only checks the bottom left and top right corner of the other rectangle
+        return ((self.bottom <= other.bottom <= self.top and
+                 self.left <= other.left <= self.right) or
+                (self.bottom <= other.top <= self.top and
+                 self.left <= other.right <= self.right))
 
     def isclose(self, other, rtol: float = 1e-09, atol: float = 0.0) -> bool:
         return (self.p0.isclose(other.p0, rtol, atol) and
                 self.p1.isclose(other.p1, rtol, atol))
 
-    @cached_property
+    @property
     def midpoint(self) -> Point:
-        return Point((self.p1.x + self.p0.x) / 2, (self.p1.y + self.p0.y) / 2)
+        return Point((self.right + self.left) / 2, (self.top + self.bottom) / 2)
 
-    @cached_property
+    @property
     def points(self) -> list[Point]:
-        return [self.p0, Point(self.right, self.bottom),
-                self.p1, Point(self.left, self.top)]
+        return [Point(self.left, self.bottom), Point(self.right, self.bottom),
+                Point(self.right, self.top), Point(self.left, self.top)]
 
     def offset(self, offset):
-        return Rectangle(self.p0.x - offset, self.p0.y - offset,
-                         self.p1.x + offset, self.p1.y + offset)
+        return Rectangle(self.left - offset, self.bottom - offset,
+                         self.right + offset, self.top + offset)
 
     def offset_x(self, offset):
-        return Rectangle(self.p0.x - offset, self.p0.y,
-                         self.p1.x + offset, self.p1.y)
+        return Rectangle(self.left - offset, self.bottom,
+                         self.right + offset, self.top)
 
     def offset_y(self, offset):
-        return Rectangle(self.p0.x, self.p0.y - offset,
-                         self.p1.x, self.p1.y + offset)
+        return Rectangle(self.left, self.bottom - offset,
+                         self.right, self.top + offset)
 
     def translated(self, point):
-        return Rectangle(self.p0.x + point.x, self.p0.y + point.y,
-                         self.p1.x + point.x, self.p1.y + point.y)
+        return Rectangle(self.left + point.x, self.bottom + point.y,
+                         self.right + point.x, self.top + point.y)
 
     def rotated(self, rotation):
         cos = math.cos(math.radians(rotation))
         sin = math.sin(math.radians(rotation))
-        return Rectangle(self.p0.x * cos - self.p0.y * sin,
-                         self.p0.x * sin + self.p0.y * cos,
-                         self.p1.x * cos - self.p1.y * sin,
-                         self.p1.x * sin + self.p1.y * cos)
+        return Rectangle(self.left * cos - self.bottom * sin,
+                         self.left * sin + self.bottom * cos,
+                         self.right * cos - self.top * sin,
+                         self.right * sin + self.top * cos)
 
     def joined(self, other):
-        return Rectangle(min(self.p0.x, other.p0.x),
-                         min(self.p0.y, other.p0.y),
-                         max(self.p1.x, other.p1.x),
-                         max(self.p1.y, other.p1.y))
+        return Rectangle(min(self.left, other.left),
+                         min(self.bottom, other.bottom),
+                         max(self.right, other.right),
+                         max(self.top, other.top))
 
     def round(self, accuracy=0):
-        return Rectangle(round(self.p0.x, accuracy), round(self.p0.y, accuracy),
-                         round(self.p1.x, accuracy), round(self.p1.y, accuracy))
+        return Rectangle(round(self.left, accuracy), round(self.bottom, accuracy),
+                         round(self.right, accuracy), round(self.top, accuracy))
 
     @property
     def np(self) -> numpy.array:
-        return numpy.array([(self.p0.x, self.p0.y), (self.p1.x, self.p1.y)])
+        return numpy.array([(self.left, self.bottom), (self.right, self.top)])
 
     def __hash__(self):
-        return hash(self.p0) + hash(self.p1)
+        return hash(f"{self.left} {self.bottom}") + hash(f"{self.right} {self.top}")
+
+    def __repr__(self) -> str:
+        return f"[({_fmt(self.left)},{_fmt(self.bottom)}),({_fmt(self.right)},{_fmt(self.top)})]"
+
+
+class RectArray:
+    """
+    Array of rectangles as a read-only N x 4 array of left, bottom, right,
+    top for operating on many rectangles at once. The masks returned by the
+    predicates have the same semantics as the `Rectangle` methods.
+    """
+    __slots__ = ("_bboxes",)
+
+    def __init__(self, bboxes):
+        bboxes = numpy.array(bboxes, dtype=numpy.float64).reshape(-1, 4)
+        # Ensure the correct ordering of point values
+        bboxes = numpy.hstack([numpy.minimum(bboxes[:, :2], bboxes[:, 2:]),
+                               numpy.maximum(bboxes[:, :2], bboxes[:, 2:])])
+        bboxes.flags.writeable = False
+        self._bboxes = bboxes
+
+    @classmethod
+    def from_rects(cls, rects):
+        return cls([(r.left, r.bottom, r.right, r.top) for r in rects])
+
+    @property
+    def left(self) -> numpy.ndarray:
+        return self._bboxes[:, 0]
+
+    @property
+    def bottom(self) -> numpy.ndarray:
+        return self._bboxes[:, 1]
+
+    @property
+    def right(self) -> numpy.ndarray:
+        return self._bboxes[:, 2]
+
+    @property
+    def top(self) -> numpy.ndarray:
+        return self._bboxes[:, 3]
+
+    @property
+    def np(self) -> numpy.ndarray:
+        return self._bboxes
+
+    def contains(self, other) -> numpy.ndarray:
+        """Mask of all rectangles containing the point or rectangle."""
+        if isinstance(other, Point):
+            return ((self.bottom <= other.y) & (other.y <= self.top) &
+                    (self.left <= other.x) & (other.x <= self.right))
+        return ((self.bottom <= other.bottom) & (other.top <= self.top) &
+                (self.left <= other.left) & (other.right <= self.right))
+
+    def contained_in(self, area: Rectangle) -> numpy.ndarray:
+        """Mask of all rectangles for which `area.contains(rect)` is true."""
+        return ((area.bottom <= self.bottom) & (self.top <= area.top) &
+                (area.left <= self.left) & (self.right <= area.right))
+
+    def overlaps(self, other: Rectangle) -> numpy.ndarray:
+        """Mask of all rectangles for which `rect.overlaps(other)` is true."""
+        return self.contains(other.p0) | self.contains(other.p1)
+
+    def overlapped_by(self, area: Rectangle) -> numpy.ndarray:
+        """Mask of all rectangles for which `area.overlaps(rect)` is true."""
+        return (((area.bottom <= self.bottom) & (self.bottom <= area.top) &
+                 (area.left <= self.left) & (self.left <= area.right)) |
+                ((area.bottom <= self.top) & (self.top <= area.top) &
+                 (area.left <= self.right) & (self.right <= area.right)))
+
+    def union(self) -> Rectangle:
+        """The rectangle joining all rectangles."""
+        return Rectangle(float(self.left.min()), float(self.bottom.min()),
+                         float(self.right.max()), float(self.top.max()))
+
+    def translated(self, point):
+        return RectArray(self._bboxes + (point.x, point.y, point.x, point.y))
+
+    def offset(self, offset):
+        return RectArray(self._bboxes + (-offset, -offset, offset, offset))
+
+    def __len__(self) -> int:
+        return len(self._bboxes)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, numpy.integer)):
+            return Rectangle(*self._bboxes[key].tolist())
+        return RectArray(self._bboxes[key])
+
+    def __iter__(self):
+        for bbox in self._bboxes.tolist():
+            yield Rectangle(*bbox)
 
     def __repr__(self) -> str:
-        return f"[{repr(self.p0)},{repr(self.p1)}]"
+        return f"RectArray({len(self)})"
 
 
 class Transform:
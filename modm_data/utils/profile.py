@@ -0,0 +1,232 @@
+# Copyright (c) 2022, Niklas Hauser
+#
+# This file is part of the modm-data project.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# -----------------------------------------------------------------------------
+
+"""
+Per-page and per-stage timers and counters.
+
+The global `PROFILER` is disabled by default, so that the instrumented code
+only pays for one attribute check. Stages are nested and recorded as folded
+stacks with their self time, which can be fed directly into flamegraph tools.
+While a page is profiled, all stages and counters are attributed to it.
+"""
+
+import csv
+import json
+import time
+import functools
+from pathlib import Path
+from collections import defaultdict
+
+
+class _NullStage:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, profiler, name: str):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._profiler._stack.append([self._name, time.perf_counter(), 0.0])
+
+    def __exit__(self, *exc):
+        profiler = self._profiler
+        name, start, children = profiler._stack.pop()
+        elapsed = time.perf_counter() - start
+        if profiler._stack:
+            profiler._stack[-1][2] += elapsed
+        key = ";".join([s[0] for s in profiler._stack] + [name])
+        profiler._target["stacks"][key] += elapsed - children
+        return False
+
+
+class _PageStage(_Stage):
+    def __init__(self, profiler, index: int, document: str):
+        super().__init__(profiler, "page")
+        self.record = {"document": document, "index": index, "time": 0.0,
+                       "stacks": defaultdict(float), "counters": defaultdict(int)}
+
+    def __enter__(self):
+        # Page stacks are stored relative to the page
+        self._outer = (self._profiler._stack, self._profiler._target)
+        self._profiler._stack = []
+        self._profiler._target = self.record
+        super().__enter__()
+        return self.record
+
+    def __exit__(self, *exc):
+        start = self._profiler._stack[-1][1]
+        super().__exit__(*exc)
+        self.record["time"] = time.perf_counter() - start
+        self._profiler._stack, self._profiler._target = self._outer
+        if self._profiler._stack:
+            self._profiler._stack[-1][2] += self.record["time"]
+        self._profiler.add_page(self.record)
+        return False
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self._pdfium_functions = {}
+        self._stack = []
+        self.pages = []
+        self._target = self.totals = {"stacks": defaultdict(float),
+                                      "counters": defaultdict(int)}
+
+    def enable(self, pdfium_calls: bool = True):
+        """Enables recording, optionally counting all pdfium function calls."""
+        self.enabled = True
+        if pdfium_calls and not self._pdfium_functions:
+            self._pdfium_functions = _count_pdfium_calls(self)
+
+    def disable(self):
+        """Disables recording and restores the original pdfium functions."""
+        self.enabled = False
+        import pypdfium2 as pp
+        for name, func in self._pdfium_functions.items():
+            setattr(pp, name, func)
+        self._pdfium_functions = {}
+
+    def stage(self, name: str):
+        """Context manager timing a nested stage."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def page(self, index: int, document: str = ""):
+        """Context manager attributing all nested stages to a page of a document."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _PageStage(self, index, document)
+
+    def count(self, name: str, value: int = 1):
+        if self.enabled:
+            self._target["counters"][name] += value
+
+    def add_page(self, record: dict):
+        """Adds a page record, for example one returned by a worker process."""
+        # The page is nested into the current stage of this process
+        self.pages.append({"document": record["document"], "index": record["index"],
+                           "time": record["time"],
+                           "prefix": "".join(s[0] + ";" for s in self._stack),
+                           "stacks": dict(record["stacks"]),
+                           "counters": dict(record["counters"])})
+
+    def _stacks(self, documents: bool = False) -> dict:
+        # The document name is the root frame, so that batches can be told apart
+        stacks = defaultdict(float, self.totals["stacks"])
+        for page in self.pages:
+            prefix = page["prefix"]
+            if documents and page["document"]:
+                prefix = page["document"] + ";" + prefix
+            for key, value in page["stacks"].items():
+                stacks[prefix + key] += value
+        return stacks
+
+    def _counters(self) -> dict:
+        counters = defaultdict(int, self.totals["counters"])
+        for page in self.pages:
+            for key, value in page["counters"].items():
+                counters[key] += value
+        return dict(counters)
+
+    @staticmethod
+    def _inclusive(stacks: dict) -> dict:
+        # Recursive stages are only counted once per stack
+        stages = defaultdict(float)
+        for key, value in stacks.items():
+            for name in set(key.split(";")):
+                stages[name] += value
+        return dict(stages)
+
+    def report(self) -> dict:
+        return {
+            "stages": self._inclusive(self._stacks()),
+            "counters": self._counters(),
+            "pages": [{"document": page["document"], "index": page["index"],
+                       "time": page["time"], "stages": self._inclusive(page["stacks"]),
+                       "counters": page["counters"]}
+                      for page in sorted(self.pages, key=lambda p: (p["document"], p["index"]))],
+        }
+
+    def write_json(self, path):
+        with Path(path).open("w") as file:
+            json.dump(self.report(), file, indent=2)
+
+    def write_csv(self, path):
+        """Writes one row per page with the inclusive stage times and counters."""
+        pages = self.report()["pages"]
+        stages = sorted({name for page in pages for name in page["stages"]})
+        counters = sorted({name for page in pages for name in page["counters"]})
+        with Path(path).open("w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["document", "page", "time"] + stages + counters)
+            for page in pages:
+                writer.writerow([page["document"], page["index"] + 1, f"{page['time']:.6f}"] +
+                                [f"{page['stages'].get(s, 0):.6f}" for s in stages] +
+                                [page["counters"].get(c, 0) for c in counters])
+
+    def write_stacks(self, path):
+        """Writes the folded stacks in microseconds for flamegraph tools."""
+        with Path(path).open("w") as file:
+            for key, value in sorted(self._stacks(documents=True).items()):
+                if (value := round(value * 1e6)) > 0:
+                    file.write(f"{key} {value}\n")
+
+    def write(self, path):
+        """Writes the JSON, CSV and folded stack reports next to each other."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.write_json(path.with_suffix(".json"))
+        self.write_csv(path.with_suffix(".csv"))
+        self.write_stacks(path.with_suffix(".folded"))
+
+    def __repr__(self) -> str:
+        return f"Profiler({len(self.pages)} pages)"
+
+
+PROFILER = Profiler()
+
+
+def profiled(name: str):
+    """Decorator timing every call of the function as a stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            with _Stage(PROFILER, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _count_pdfium_calls(profiler) -> dict:
+    import pypdfium2 as pp
+    # All modules call the functions through the module, so wrap them there
+    # and return the original foreign functions to restore them later
+    functions = {}
+    for name in dir(pp):
+        func = getattr(pp, name)
+        if name.startswith("FPDF") and hasattr(func, "argtypes"):
+            def counted(*args, _func=func):
+                profiler.count("pdfium_calls")
+                return _func(*args)
+            functions[name] = func
+            setattr(pp, name, counted)
+    return functions
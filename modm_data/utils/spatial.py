@@ -0,0 +1,105 @@
+# Copyright (c) 2022, Niklas Hauser
+#
+# This file is part of the modm-data project.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# -----------------------------------------------------------------------------
+
+import math
+import numpy
+
+
+class SpatialGrid:
+    """
+    Uniform grid over axis-aligned bounding boxes for range queries.
+    Points are stored as bounding boxes with zero width and height.
+
+    The items are bucketed into cells once and stored in a compressed row
+    layout, so that all cells of one grid row are a contiguous slice.
+    Items with infinite or NaN bounds are not bucketed, but checked by every
+    query, so that the results are the same as comparing all items.
+    """
+
+    def __init__(self, bboxes: numpy.ndarray, cell_size: float):
+        # bboxes: N x 4 array of left, bottom, right, top
+        self._bboxes = numpy.asarray(bboxes, dtype=numpy.float64).reshape(-1, 4)
+        self._cell = float(cell_size)
+        finite = numpy.isfinite(self._bboxes).all(axis=1)
+        self._unbounded = numpy.flatnonzero(~finite)
+        indices = numpy.flatnonzero(finite)
+        bboxes = self._bboxes[indices]
+        if not len(indices):
+            self._origin = (0.0, 0.0)
+            self._shape = (0, 0)
+            self._items = numpy.empty(0, dtype=numpy.intp)
+            self._starts = numpy.zeros(1, dtype=numpy.intp)
+            return
+
+        self._origin = (float(bboxes[:, 0].min()), float(bboxes[:, 1].min()))
+        x0, y0 = self._cells(bboxes[:, 0], bboxes[:, 1])
+        x1, y1 = self._cells(bboxes[:, 2], bboxes[:, 3])
+        nx, ny = int(x1.max()) + 1, int(y1.max()) + 1
+        self._shape = (nx, ny)
+
+        # Enumerate all cells covered by each bbox
+        spans_x = x1 - x0 + 1
+        spans = spans_x * (y1 - y0 + 1)
+        items = numpy.repeat(indices, spans)
+        offsets = numpy.arange(len(items)) - numpy.repeat(numpy.cumsum(spans) - spans, spans)
+        xs = numpy.repeat(x0, spans) + offsets % numpy.repeat(spans_x, spans)
+        ys = numpy.repeat(y0, spans) + offsets // numpy.repeat(spans_x, spans)
+        cell_ids = ys * nx + xs
+
+        order = numpy.argsort(cell_ids, kind="stable")
+        self._items = items[order]
+        self._starts = numpy.zeros(nx * ny + 1, dtype=numpy.intp)
+        numpy.cumsum(numpy.bincount(cell_ids, minlength=nx * ny), out=self._starts[1:])
+
+    def _cells(self, xs, ys) -> tuple[numpy.ndarray, numpy.ndarray]:
+        cx = numpy.floor((xs - self._origin[0]) / self._cell).astype(numpy.intp)
+        cy = numpy.floor((ys - self._origin[1]) / self._cell).astype(numpy.intp)
+        return cx, cy
+
+    def _cell_index(self, value: float, origin: float, count: int) -> int:
+        # Clamped to the grid first, since infinite values cannot be floored
+        return math.floor(min(max((value - origin) / self._cell, -1), count))
+
+    def candidates(self, left: float, bottom: float, right: float, top: float) -> numpy.ndarray:
+        """Sorted indices of all items in the grid cells overlapping the area."""
+        nx, ny = self._shape
+        if any(math.isnan(v) for v in (left, bottom, right, top)):
+            return numpy.empty(0, dtype=numpy.intp)
+        ox, oy = self._origin
+        cx0 = max(0, self._cell_index(left, ox, nx))
+        cy0 = max(0, self._cell_index(bottom, oy, ny))
+        cx1 = min(nx - 1, self._cell_index(right, ox, nx))
+        cy1 = min(ny - 1, self._cell_index(top, oy, ny))
+        if cx0 > cx1 or cy0 > cy1:
+            return self._unbounded
+        slices = [self._items[self._starts[cy * nx + cx0]:self._starts[cy * nx + cx1 + 1]]
+                  for cy in range(cy0, cy1 + 1)]
+        return numpy.unique(numpy.concatenate(slices + [self._unbounded]))
+
+    def overlapping(self, left: float, bottom: float, right: float, top: float) -> numpy.ndarray:
+        """Sorted indices of all items intersecting the area, borders inclusive."""
+        items = self.candidates(left, bottom, right, top)
+        bboxes = self._bboxes[items]
+        mask = ((bboxes[:, 0] <= right) & (left <= bboxes[:, 2]) &
+                (bboxes[:, 1] <= top) & (bottom <= bboxes[:, 3]))
+        return items[mask]
+
+    def contained(self, left: float, bottom: float, right: float, top: float) -> numpy.ndarray:
+        """Sorted indices of all items fully inside the area, borders inclusive."""
+        items = self.candidates(left, bottom, right, top)
+        bboxes = self._bboxes[items]
+        mask = ((bottom <= bboxes[:, 1]) & (bboxes[:, 3] <= top) &
+                (left <= bboxes[:, 0]) & (bboxes[:, 2] <= right))
+        return items[mask]
+
+    def __len__(self) -> int:
+        return len(self._bboxes)
+
+    def __repr__(self) -> str:
+        return f"Grid({len(self)}, {self._shape[0]}x{self._shape[1]})"
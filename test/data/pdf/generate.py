@@ -0,0 +1,365 @@
+# Copyright (c) 2022, Niklas Hauser
+#
+# This file is part of the modm-data project.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# -----------------------------------------------------------------------------
+
+"""
+Generates small synthetic PDFs in the layout of the ST reference manuals and
+datasheets, which are used by the tests and the benchmark instead of the
+downloaded documents. The PDFs are written without compression and with fixed
+file identifiers, so that they are reproducible byte for byte.
+
+    python3 test/data/pdf/generate.py
+"""
+
+from pathlib import Path
+
+WIDTH, HEIGHT = 595, 842
+# Font resource names with their base fonts
+FONTS = {"F1": "Helvetica", "F2": "Helvetica-Bold", "F3": "Helvetica-Oblique",
+         "F4": "Courier"}
+
+
+def _escape(text: str) -> bytes:
+    text = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return text.encode("cp1252")
+
+
+class Content:
+    """Content stream of one page in the coordinates of the displayed page."""
+
+    def __init__(self, rotation: int = 0):
+        self.rotation = rotation
+        self.ops = []
+
+    def _point(self, x: float, y: float) -> tuple[float, float]:
+        # A page rotated clockwise by 90° is displayed with its media box
+        # height as the width
+        if self.rotation == 90:
+            return WIDTH - y, x
+        return x, y
+
+    def text(self, x: float, y: float, text: str, font: str = "F1", size: float = 9,
+             media: bool = False):
+        matrix = "1 0 0 1"
+        if not media:
+            x, y = self._point(x, y)
+            if self.rotation == 90:
+                matrix = "0 1 -1 0"
+        self.ops.append(b"BT /%s %g Tf %s %g %g Tm (%s) Tj ET" %
+                        (font.encode(), size, matrix.encode(), x, y, _escape(text)))
+
+    def line(self, x0: float, y0: float, x1: float, y1: float, width: float = 0.5):
+        (x0, y0), (x1, y1) = self._point(x0, y0), self._point(x1, y1)
+        self.ops.append(b"%g w %g %g m %g %g l S" % (width, x0, y0, x1, y1))
+
+    def rect(self, x0: float, y0: float, x1: float, y1: float, gray: float = 0.8):
+        (x0, y0), (x1, y1) = self._point(x0, y0), self._point(x1, y1)
+        self.ops.append(b"q %g g %g %g %g %g re f Q" % (gray, x0, y0, x1 - x0, y1 - y0))
+
+    def grid(self, xs: list, ys: list):
+        for y in ys:
+            self.line(xs[0], y, xs[-1], y)
+        for x in xs:
+            self.line(x, ys[0], x, ys[-1])
+
+    def frame(self, document: str, number: int, top: str = None):
+        """Chapter name on top, document id and page number on the bottom."""
+        # The frame of rotated pages stays in the portrait orientation
+        if top is not None:
+            self.text(70, 775, top, "F1", 9, media=True)
+        self.text(270, 90, f"{document} Rev 1", "F1", 8, media=True)
+        self.text(70 if number % 2 else 490, 90, f"{number}/10", "F1", 8, media=True)
+
+    @property
+    def stream(self) -> bytes:
+        return b"\n".join(self.ops)
+
+
+def write_pdf(path: Path, pages: list, outline: list):
+    """Writes the (content, rotation) pages with a flat (title, page) outline."""
+    objects = []
+
+    def _add(data: bytes) -> int:
+        objects.append(data)
+        return len(objects)
+
+    fonts = b" ".join(b"/%s %d 0 R" % (name.encode(), _add(
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" %
+        base.encode())) for name, base in FONTS.items())
+    # The page tree and outline objects are referenced before they are added
+    first = len(objects) + 1
+    pages_id = first + 2 * len(pages)
+    kids = []
+    for content, rotation in pages:
+        stream = content.stream
+        contents = _add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        kids.append(_add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Rotate %d "
+                         b"/Resources << /Font << %s >> >> /Contents %d 0 R >>" %
+                         (pages_id, WIDTH, HEIGHT, rotation, fonts, contents)))
+    _add(b"<< /Type /Pages /Kids [%s] /Count %d >>" %
+         (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)))
+    outlines_id = pages_id + 1
+    items = [outlines_id + 1 + ii for ii in range(len(outline))]
+    _add(b"<< /Type /Outlines /First %d 0 R /Last %d 0 R /Count %d >>" %
+         (items[0], items[-1], len(items)))
+    for ii, (title, page) in enumerate(outline):
+        links = b""
+        if ii:
+            links += b" /Prev %d 0 R" % items[ii - 1]
+        if ii + 1 < len(items):
+            links += b" /Next %d 0 R" % items[ii + 1]
+        _add(b"<< /Title (%s) /Parent %d 0 R /Dest [%d 0 R /XYZ 0 %d 0]%s >>" %
+             (_escape(title), outlines_id, kids[page], HEIGHT, links))
+    catalog = _add(b"<< /Type /Catalog /Pages %d 0 R /Outlines %d 0 R >>" % (pages_id, outlines_id))
+    info = _add(b"<< /Author (STMicroelectronics) /Producer (Acrobat Distiller 10.1.10) >>")
+
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for index, obj in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (index, obj)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    identifier = path.stem.encode().hex().ljust(32, "0").encode()
+    data += (b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R /ID [<%s> <%s>] >>\n"
+             b"startxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, info,
+                                            identifier, identifier, xref))
+    path.write_bytes(data)
+
+
+def _cover(name: str, title: str) -> Content:
+    page = Content()
+    page.text(225, 740, name, "F2", 20)
+    page.text(225, 700, title, "F2", 14)
+    page.text(25, 660, "Introduction", "F2", 12)
+    page.text(25, 640, "This document describes the peripherals of the synthetic devices.", "F1", 9)
+    page.text(25, 628, "It is only used to test the conversion and has no other content.", "F1", 9)
+    page.text(70, 90, "October 2023", "F1", 8)
+    page.text(270, 90, f"{name} Rev 1", "F1", 8)
+    page.text(490, 90, "1/10", "F1", 8)
+    return page
+
+
+def _contents(name: str, number: int, chapters: list) -> Content:
+    page = Content()
+    page.frame(name, number, "Contents")
+    page.text(25, 740, "Contents", "F2", 18)
+    for ii, (title, index) in enumerate(chapters):
+        page.text(25, 710 - 14 * ii, title, "F1", 9)
+        page.text(540, 710 - 14 * ii, str(index + 1), "F1", 9)
+    return page
+
+
+def _text(page: Content, x: float, y: float, lines: list, size: float = 9) -> float:
+    for line in lines:
+        page.text(x, y, line, "F1", size)
+        y -= size * 1.4
+    return y
+
+
+def _register(page: Content, top: float, fields: list):
+    """Register table with the bit positions on top and between the halves."""
+    xs = [60 + 30 * ii for ii in range(17)]
+    ys = [top - 95, top - 80, top - 55, top - 40, top - 25, top]
+    for ii in range(16):
+        page.text(xs[ii] + 10, top + 5, str(31 - ii), "F1", 7)
+        page.text(xs[ii] + 12, ys[1] + 4, str(15 - ii), "F1", 7)
+        page.text(xs[ii] + 10, ys[3] + 4, "rw", "F1", 7)
+        page.text(xs[ii] + 10, ys[0] + 4, "rw", "F1", 7)
+    for ii, field in enumerate(fields):
+        page.text(xs[2 * ii] + 4, ys[4] + 8, field.format(15 - ii), "F1", 6)
+        page.text(xs[2 * ii] + 4, ys[2] + 8, field.format(7 - ii), "F1", 6)
+    for y in ys:
+        page.line(xs[0], y, xs[-1], y)
+    # The fields span two bits, so only their own borders are drawn
+    for ii, x in enumerate(xs):
+        for y0, y1 in zip(ys, ys[1:]):
+            if ii % 2 == 0 or y0 not in (ys[2], ys[4]):
+                page.line(x, y0, x, y1)
+
+
+def reference_manual(path: Path):
+    name = path.stem.split("-")[0]
+    pages = []
+    chapters = [("1 Documentation conventions", 2), ("2 General-purpose I/Os (GPIO)", 3),
+                ("3 Timers", 6), ("Index", 8)]
+
+    pages.append((_cover(name, "Reference manual"), 0))
+    pages.append((_contents(name, 2, chapters), 0))
+
+    # Plain text with a bold heading and a list
+    page = Content()
+    page.frame(name, 3, "Documentation conventions")
+    page.text(25, 740, "1 Documentation conventions", "F2", 18)
+    page.text(25, 710, "1.1 General information", "F2", 13)
+    y = _text(page, 70, 690, [
+        "The following abbreviations are used in register descriptions:",
+        "read/write (rw): Software can read and write to this bit.",
+        "read-only (r): Software can only read this bit.",
+        "Reserved (Res.): Reserved bit, must be kept at reset value.",
+    ])
+    page.text(70, y - 10, "1.2 Glossary", "F2", 13)
+    y = _text(page, 70, y - 30, [
+        "Word: data of 32-bit length. Half-word: data of 16-bit length.",
+        "The search for a Text",
+        "Line continues across the line break of this paragraph.",
+        "Text Line appears once on a single line, text line in lowercase.",
+        "GPIOx_MODER, GPIOx_OTYPER and GPIO_x are register names.",
+    ])
+    for ii in range(20):
+        y = _text(page, 70, y, [f"Paragraph {ii} of the glossary with some more words to fill the page."])
+    pages.append((page, 0))
+
+    # Table with a caption and a bold header row
+    page = Content()
+    page.frame(name, 4, "General-purpose I/Os (GPIO)")
+    page.text(25, 740, "2 General-purpose I/Os (GPIO)", "F2", 18)
+    page.text(25, 710, "2.1 GPIO introduction", "F2", 13)
+    _text(page, 70, 690, ["Each general-purpose I/O port has four configuration registers."])
+    page.text(200, 655, "Table 1. Port bit configuration table", "F2", 9)
+    xs, ys = [70, 170, 270, 370, 520], [650 - 20 * ii for ii in range(9)][::-1]
+    page.rect(xs[0], ys[-2], xs[-1], ys[-1])
+    page.grid(xs, ys)
+    for ii, header in enumerate(["MODE(i) [1:0]", "OTYPER(i)", "OSPEED(i) [1:0]", "I/O configuration"]):
+        page.text(xs[ii] + 5, ys[-2] + 6, header, "F2", 8)
+    for row in range(7):
+        values = [f"{row:02b}", str(row % 2), f"{(row * 3) % 4:02b}", f"Configuration {row}"]
+        for ii, value in enumerate(values):
+            page.text(xs[ii] + 5, ys[-3 - row] + 6, value, "F1", 8)
+    _text(page, 70, 440, ["The table above shows the port bit configuration."])
+    pages.append((page, 0))
+
+    # Register descriptions with two and one bit wide fields
+    page = Content()
+    page.frame(name, 5, "General-purpose I/Os (GPIO)")
+    page.text(25, 740, "2.2 GPIO port mode register (GPIOx_MODER)", "F2", 13)
+    page.text(25, 722, "Address offset: 0x00", "F1", 9)
+    page.text(25, 710, "Reset value: 0x0000 0000", "F1", 9)
+    _register(page, 680, ["MODE{}[1:0]"] * 8)
+    y = 560
+    for bits in [(31, 16), (15, 0)]:
+        page.text(25, y, f"Bits {bits[0]}:{bits[1]} MODEy[1:0]: Port x configuration bits", "F2", 9)
+        y = _text(page, 100, y - 13, ["These bits are written by software to configure the I/O.",
+                                      "00: Input mode", "01: General purpose output mode",
+                                      "10: Alternate function mode", "11: Analog mode"])
+    pages.append((page, 0))
+
+    page = Content()
+    page.frame(name, 6, "General-purpose I/Os (GPIO)")
+    page.text(25, 740, "2.3 GPIO port output type register (GPIOx_OTYPER)", "F2", 13)
+    page.text(25, 722, "Address offset: 0x04", "F1", 9)
+    page.text(25, 710, "Reset value: 0x0000 0000", "F1", 9)
+    _register(page, 680, ["Res."] * 8)
+    page.text(25, 560, "Bits 31:16 Reserved, must be kept at reset value.", "F2", 9)
+    y = 540
+    for bit in range(15, -1, -1):
+        page.text(25, y, f"Bit {bit} OT{bit}: Port x configuration bit {bit}", "F2", 9)
+        y = _text(page, 100, y - 12, ["0: Output push-pull (reset state)", "1: Output open-drain"])
+    pages.append((page, 0))
+
+    # Landscape table on a rotated page
+    for number in (7, 8):
+        page = Content(90)
+        page.frame(name, number, "Timers")
+        if number == 7:
+            page.text(120, 540, "3 Timers", "F2", 18)
+        page.text(330, 500, f"Table {number - 5}. Timer register map", "F2", 9)
+        xs = [120 + 75 * ii for ii in range(9)]
+        ys = [480 - 18 * ii for ii in range(12)][::-1]
+        page.grid(xs, ys)
+        for ii in range(8):
+            page.text(xs[ii] + 4, ys[-2] + 5, f"Field {ii}", "F2", 7)
+            for row in range(10):
+                page.text(xs[ii] + 4, ys[-3 - row] + 5, f"0x{ii * row:02X}", "F1", 7)
+        _text(page, 120, 250, ["The timer registers are mapped to the addresses above."])
+        pages.append((page, 90))
+
+    page = Content()
+    page.frame(name, 9, "Index")
+    page.text(25, 740, "Index", "F2", 18)
+    _text(page, 25, 710, ["GPIO . . . . . . . 4", "Timers . . . . . . . 7"])
+    pages.append((page, 0))
+
+    write_pdf(path, pages, [("Contents", 1)] + chapters)
+
+
+def datasheet(path: Path):
+    name = path.stem.split("-")[0]
+    pages = []
+    chapters = [("1 Description", 3), ("2 Pinouts and pin description", 4)]
+
+    # Front page with two columns of features and a table underneath
+    page = Content()
+    page.text(225, 740, "SYNTH32F000", "F2", 20)
+    page.text(25, 690, "Arm Cortex-M0 32-bit MCU, up to 64 KB Flash, 12 timers", "F2", 12)
+    page.text(25, 620, "Features", "F2", 11)
+    y = 600
+    for feature in ["Core: Arm 32-bit Cortex-M0 CPU", "Memories", "Clock management",
+                    "Low-power modes", "Debug mode"]:
+        page.text(25, y, "•", "F1", 9)
+        page.text(40, y, feature, "F1", 9)
+        page.text(306, y, "•", "F1", 9)
+        page.text(325, y, f"{feature} of the second column", "F1", 9)
+        page.text(340, y - 12, "- Sub feature of the item", "F1", 9)
+        y -= 28
+    page.text(70, 90, "October 2023", "F1", 8)
+    page.text(270, 90, f"{name} Rev 1", "F1", 8)
+    page.text(490, 90, "1/6", "F1", 8)
+    pages.append((page, 0))
+
+    page = Content()
+    page.frame(name, 2, "")
+    y = 740
+    for ii in range(6):
+        page.text(25, y, "•", "F1", 9)
+        page.text(40, y, f"Up to {ii + 2} communication interfaces", "F1", 9)
+        page.text(306, y, "•", "F1", 9)
+        page.text(325, y, f"{ii + 8} analog channels with 12-bit resolution", "F1", 9)
+        y -= 14
+    page.text(200, 450, "Table 1. Device summary", "F2", 9)
+    xs, ys = [60, 300, 540], [440, 420, 400, 380]
+    page.grid(xs, ys)
+    page.text(65, 426, "Reference", "F2", 8)
+    page.text(305, 426, "Part number", "F2", 8)
+    page.text(65, 406, "SYNTH32F000", "F1", 8)
+    page.text(305, 406, "SYNTH32F000C6, SYNTH32F000K6", "F1", 8)
+    page.text(65, 386, "SYNTH32F001", "F1", 8)
+    page.text(305, 386, "SYNTH32F001C8", "F1", 8)
+    pages.append((page, 0))
+
+    pages.append((_contents(name, 3, chapters), 0))
+
+    page = Content()
+    page.frame(name, 4, "Description")
+    page.text(25, 740, "1 Description", "F2", 18)
+    _text(page, 70, 710, ["The SYNTH32F000 devices incorporate a high-performance core",
+                          "operating at up to 48 MHz with high-speed embedded memories."])
+    pages.append((page, 0))
+
+    page = Content()
+    page.frame(name, 5, "Pinouts and pin description")
+    page.text(25, 740, "2 Pinouts and pin description", "F2", 18)
+    page.text(200, 700, "Table 2. Pin definitions", "F2", 9)
+    xs, ys = [60, 120, 200, 300, 540], [690 - 18 * ii for ii in range(7)][::-1]
+    page.grid(xs, ys)
+    for ii, header in enumerate(["Pin", "Name", "Type", "Alternate functions"]):
+        page.text(xs[ii] + 4, ys[-2] + 5, header, "F2", 8)
+    for row in range(5):
+        values = [str(row + 1), f"PA{row}", "I/O", f"USART1_TX, TIM{row + 1}_CH1"]
+        for ii, value in enumerate(values):
+            page.text(xs[ii] + 4, ys[-3 - row] + 5, value, "F1", 8)
+    pages.append((page, 0))
+
+    write_pdf(path, pages, chapters)
+
+
+if __name__ == "__main__":
+    folder = Path(__file__).parent
+    reference_manual(folder / "RM0000-v1.pdf")
+    datasheet(folder / "DS0000-v1.pdf")
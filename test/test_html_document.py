@@ -0,0 +1,63 @@
+# Copyright (c) 2022, Niklas Hauser
+#
+# This file is part of the modm-data project.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# -----------------------------------------------------------------------------
+
+from pathlib import Path
+import shutil
+import pytest
+
+from modm_data.html import Document, write_manifest
+
+HTML_FILES = sorted((Path(__file__).parent / "data" / "html").glob("*.html"))[:3]
+
+
+def _document(tmp_path) -> Path:
+    path = tmp_path / "RM0000-v1"
+    path.mkdir()
+    for ii, html in enumerate(HTML_FILES):
+        shutil.copy(html, path / f"chapter_{ii}_{html.stem.lower()}.html")
+    write_manifest(path)
+    return path
+
+
+def _summaries(path) -> dict:
+    return {c.name: ([h.html for h in c.headings()], [t._caption.html for t in c.tables()])
+            for c in Document(path).chapters()}
+
+
+def _added(path):
+    shutil.copy(HTML_FILES[0], path / "chapter_9_added.html")
+
+
+def _renamed(path):
+    (path / f"chapter_1_{HTML_FILES[1].stem.lower()}.html").rename(path / "chapter_1_renamed.html")
+
+
+def _removed(path):
+    (path / f"chapter_2_{HTML_FILES[2].stem.lower()}.html").unlink()
+
+
+@pytest.mark.parametrize("change", [_added, _renamed, _removed], ids=lambda c: c.__name__[1:])
+def test_outdated_manifest(tmp_path, change):
+    path = _document(tmp_path)
+    change(path)
+    summaries = _summaries(path)
+    assert sorted(summaries) == sorted(p.stem.replace("_", " ") for p in path.glob("*.html"))
+    # The summaries must match those of a freshly written manifest
+    write_manifest(path)
+    assert _summaries(path) == summaries
+
+
+def test_preload_backends(tmp_path):
+    path = _document(tmp_path)
+    # Each backend parses the chapters once and then loads its own cache
+    for backend in ["lxml", "html", "lxml", "html"]:
+        document = Document(path, backend)
+        parsed = not (path / f"chapters-{backend}.pickle").exists()
+        document.preload()
+        assert all(("_parser" in c.__dict__) == parsed for c in document.chapters())
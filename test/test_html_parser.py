@@ -0,0 +1,54 @@
+# Copyright (c) 2022, Niklas Hauser
+#
+# This file is part of the modm-data project.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# -----------------------------------------------------------------------------
+
+from pathlib import Path
+import pytest
+
+from modm_data.html.parser import Parser
+from modm_data.html.table import Table, Cell
+from modm_data.html.text import Text, Heading
+
+HTML_FILES = sorted((Path(__file__).parent / "data" / "html").glob("*.html"))
+
+
+def _item(item) -> tuple:
+    if isinstance(item, Table):
+        return ("table", item._heading.html, item._caption.html, item._size,
+                [_item(cell) for cell in item._cells])
+    if isinstance(item, Cell):
+        return ("cell", item._pos, item._span, item._head, item.html)
+    if isinstance(item, Heading):
+        return ("heading", item.html)
+    assert isinstance(item, Text)
+    return ("text", item.html)
+
+
+def _items(html: str, lxml: bool) -> list:
+    parser = Parser()
+    if lxml:
+        parser.feed_lxml(html)
+    else:
+        parser.feed(html)
+    return [_item(item) for item in parser._items]
+
+
+@pytest.mark.parametrize("path", HTML_FILES, ids=lambda p: p.stem)
+def test_lxml_parity(path):
+    html = path.read_text()
+    assert _items(html, lxml=True) == _items(html, lxml=False)
+
+
+@pytest.mark.parametrize("html", [
+    "<table><tr><td>a<br>b</td></tr></table><p>text</p>",
+    "<table><tr><td>a<br/>b</td></tr></table><p>text</p>",
+    "<table><tr><td>a<br />b<!-- <br> --></td><td>c</td></tr></table><p>text</p>",
+    "<h1>Title</h1><p>a<img src='a/b.png'>b</p><p>text</p>",
+])
+def test_lxml_void_tags(html):
+    assert _items(html, lxml=True) == _items(html, lxml=False)
@@ -0,0 +1,175 @@
+# Copyright (c) 2022, Niklas Hauser
+#
+# This file is part of the modm-data project.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# -----------------------------------------------------------------------------
+
+import math
+import ctypes
+import random
+from types import SimpleNamespace
+from pathlib import Path
+import pytest
+import pypdfium2 as pp
+
+from modm_data.pdf import Document, Page
+from modm_data.utils import Rectangle
+
+PDF_FILES = sorted((Path(__file__).parent / "data" / "pdf").glob("*.pdf"))
+PAGES = [(path, index) for path in PDF_FILES
+         for index in range(Document(path).page_count)]
+
+
+def _id(param) -> str:
+    return f"{param[0].stem}-{param[1]}"
+
+
+def _pdfium_find(page, string: str, case_sensitive: bool) -> list:
+    flags = pp.FPDF_MATCHWHOLEWORD | pp.FPDF_CONSECUTIVE
+    if case_sensitive:
+        flags |= pp.FPDF_MATCHCASE
+    wstring = (ctypes.c_ushort * (len(string) + 1))(*map(ord, string), 0)
+    handle = pp.FPDFText_FindStart(page._text, wstring, flags, 0)
+    matches = []
+    while pp.FPDFText_FindNext(handle):
+        start = pp.FPDFText_GetSchResultIndex(handle)
+        matches.append(list(range(start, start + pp.FPDFText_GetSchCount(handle))))
+    pp.FPDFText_FindClose(handle)
+    return matches
+
+
+@pytest.mark.parametrize("param", PAGES, ids=_id)
+@pytest.mark.parametrize("case_sensitive", [True, False])
+def test_find(param, case_sensitive):
+    page = Document(param[0]).page(param[1])
+    for string in ["Text Line", "text  line", "Line", "GPIO", "GPIOx_MODER", "x_MODER",
+                   "1:0", "[1:0]", "Res.", "0x00", "I/O", "of the", "•", "- Sub"]:
+        matches = [[c._index for c in chars] for chars in page.find(string, case_sensitive)]
+        assert matches == _pdfium_find(page, string, case_sensitive), string
+
+
+def _clusters(clusters) -> list:
+    return [((b.left, b.bottom, b.right, b.top), [id(o) for o in objs]) for b, objs in clusters]
+
+
+def _random_page(rng) -> Page:
+    # Only the graphics and the page size are used for clustering
+    page = Page.__new__(Page)
+    page.width, page.height = 595, 842
+    graphics = []
+    for _ in range(rng.randrange(60)):
+        # Integer positions to also hit the exact tolerance boundaries
+        left, bottom = rng.randrange(0, 580), rng.randrange(0, 820)
+        if rng.random() < 0.5:
+            # Thin table lines
+            right, top = (left, bottom + rng.randrange(1, 80)) if rng.random() < 0.5 else \
+                         (left + rng.randrange(1, 200), bottom)
+        else:
+            right, top = left + rng.randrange(0, 60), bottom + rng.randrange(0, 40)
+        graphics.append(SimpleNamespace(bbox=Rectangle(left, bottom, right, top)))
+    page._graphics = graphics
+    return page
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_graphic_clusters_random(seed):
+    rng = random.Random(seed)
+    page = _random_page(rng)
+    area = Rectangle(rng.randrange(0, 300), rng.randrange(0, 400),
+                     rng.randrange(300, 595), rng.randrange(400, 842))
+    predicate = lambda g: g.bbox.width >= 2 or g.bbox.height >= 2
+    for atol in (None, 0, 0.5, 1, 5, 20):
+        for kwargs in ({}, {"area": area}, {"predicate": predicate},
+                       {"area": area, "predicate": predicate}):
+            assert _clusters(page.graphic_clusters(atol=atol, **kwargs)) == \
+                   _clusters(page._graphic_clusters_reference(atol=atol, **kwargs))
+
+
+@pytest.mark.parametrize("param", [p for p in PAGES if Document(p[0]).page(p[1]).paths], ids=_id)
+def test_graphic_clusters_page(param):
+    page = Document(param[0]).page(param[1])
+    area = Rectangle(0, page.height / 3, page.width, page.height)
+    for atol in (None, 0, 2):
+        for kwargs in ({}, {"area": area}, {"predicate": lambda g: g.bbox.width > 100}):
+            assert _clusters(page.graphic_clusters(atol=atol, **kwargs)) == \
+                   _clusters(page._graphic_clusters_reference(atol=atol, **kwargs))
+
+
+@pytest.mark.parametrize("param", PAGES, ids=_id)
+def test_bounded_text(param):
+    # Without the cache the text is extracted by pdfium
+    page = Document(param[0]).page(param[1])
+    assert not page._restored
+    rng = random.Random(param[1])
+    width, height = round(page.width), round(page.height)
+    areas = [Rectangle(0, 0, page.width, page.height),
+             Rectangle(0, height * 0.9, page.width, page.height),
+             Rectangle(0, 0, page.width / 2, page.height)]
+    for _ in range(50):
+        left, bottom = rng.randrange(width), rng.randrange(height)
+        areas.append(Rectangle(left, bottom, rng.randrange(left, width + 1),
+                               rng.randrange(bottom, height + 1)))
+    for area in areas:
+        assert page._bounded_text(area) == page.text_in_area(area), area
+
+
+@pytest.mark.parametrize("param", PAGES, ids=_id)
+def test_char_geometry(param):
+    page = Document(param[0]).page(param[1])
+    for char in page.chars:
+        bbox, tbbox, origin = char.bbox, char.tbbox, char.origin
+        assert char.bbox is bbox and char.tbbox is tbbox and char.origin is origin
+        assert (bbox.left, bbox.bottom, bbox.right, bbox.top) == \
+               tuple(page._char_bboxes[char._index].tolist())
+    if page.char_count:
+        # Repairing the bbox must update the cached bbox
+        char = page.char(0)
+        char._bbox = Rectangle(1, 2, 3, 4)
+        assert (char.bbox.left, char.bbox.bottom, char.bbox.right, char.bbox.top) == (1, 2, 3, 4)
+
+
+@pytest.mark.parametrize("param", PAGES, ids=_id)
+def test_fingerprint(param):
+    # The bbox repair depends on the glyphs learned from the other pages
+    learned = Document(param[0], max_pages=0)
+    for index in range(learned.page_count):
+        learned.page(index)
+    document = Document(param[0], max_pages=0)
+    document._bbox_cache = dict(learned._bbox_cache)
+    page = Document(param[0]).page(param[1])
+    assert document.page(param[1]).fingerprint == page.fingerprint
+
+
+def _chars_in_area_reference(page, area) -> list:
+    # The linear scan over the char lines before the spatial grid
+    found = []
+    for ypos, chars in page.charlines.items():
+        if ypos > area.top:
+            break
+        if area.bottom <= ypos:
+            for char in chars:
+                if char.bbox.midpoint.x > area.right:
+                    break
+                if area.left <= char.bbox.midpoint.x:
+                    found.append(char)
+    return found
+
+
+@pytest.mark.parametrize("param", PAGES, ids=_id)
+def test_in_area(param):
+    page = Document(param[0]).page(param[1])
+    rng = random.Random(param[1])
+    width, height = round(page.width), round(page.height)
+    areas = [Rectangle(0, 0, page.width, page.height),
+             Rectangle(-math.inf, -math.inf, math.inf, math.inf)]
+    for _ in range(50):
+        left, bottom = rng.randrange(width), rng.randrange(height)
+        areas.append(Rectangle(left, bottom, rng.randrange(left, width + 1),
+                               rng.randrange(bottom, height + 1)))
+    for area in areas:
+        assert [c._index for c in page.chars_in_area(area)] == \
+               [c._index for c in _chars_in_area_reference(page, area)], area
+        assert page.graphics_in_area(area) == [g for g in page._graphics if area.contains(g.bbox)]
@@ -0,0 +1,34 @@
+# Copyright (c) 2022, Niklas Hauser
+#
+# This file is part of the modm-data project.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# -----------------------------------------------------------------------------
+
+from pathlib import Path
+import pypdfium2 as pp
+
+from modm_data.pdf import Document
+from modm_data.utils import Profiler
+
+PDF_FILE = Path(__file__).parent / "data" / "pdf" / "RM0000-v1.pdf"
+
+
+def test_pdfium_calls():
+    original = pp.FPDF_GetPageCount
+    profiler = Profiler()
+    profiler.enable()
+    try:
+        profiler.enable()
+        assert pp.FPDF_GetPageCount is not original
+        Document(PDF_FILE).page_count
+        assert profiler.report()["counters"]["pdfium_calls"] > 0
+    finally:
+        profiler.disable()
+    assert pp.FPDF_GetPageCount is original
+    assert not profiler._pdfium_functions
+    calls = profiler.report()["counters"]["pdfium_calls"]
+    Document(PDF_FILE).page_count
+    assert profiler.report()["counters"]["pdfium_calls"] == calls
@@ -0,0 +1,65 @@
+# Copyright (c) 2022, Niklas Hauser
+#
+# This file is part of the modm-data project.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# -----------------------------------------------------------------------------
+
+import math
+import random
+import numpy
+import pytest
+
+from modm_data.utils import SpatialGrid
+
+SPECIAL = [math.inf, -math.inf, math.nan]
+
+
+def _bboxes(rng, count: int, special: bool) -> numpy.ndarray:
+    bboxes = []
+    for _ in range(count):
+        left, bottom = rng.uniform(-50, 600), rng.uniform(-50, 850)
+        if rng.random() < 0.3:
+            # Points as used for the chars
+            bbox = [left, bottom, left, bottom]
+        else:
+            bbox = [left, bottom, left + rng.uniform(0, 200), bottom + rng.uniform(0, 100)]
+        if special and rng.random() < 0.1:
+            bbox[rng.randrange(4)] = rng.choice(SPECIAL)
+        bboxes.append(bbox)
+    return numpy.array(bboxes, dtype=numpy.float64).reshape(-1, 4)
+
+
+def _area(rng, special: bool) -> tuple:
+    left, bottom = rng.uniform(-100, 600), rng.uniform(-100, 850)
+    area = [left, bottom, left + rng.uniform(0, 400), bottom + rng.uniform(0, 400)]
+    if special and rng.random() < 0.3:
+        area[rng.randrange(4)] = rng.choice(SPECIAL)
+    return tuple(area)
+
+
+def _overlapping(bboxes, left, bottom, right, top) -> list:
+    return [ii for ii, (l, b, r, t) in enumerate(bboxes.tolist())
+            if l <= right and left <= r and b <= top and bottom <= t]
+
+
+def _contained(bboxes, left, bottom, right, top) -> list:
+    return [ii for ii, (l, b, r, t) in enumerate(bboxes.tolist())
+            if bottom <= b and t <= top and left <= l and r <= right]
+
+
+@pytest.mark.parametrize("special", [False, True], ids=["finite", "special"])
+@pytest.mark.parametrize("seed", range(50))
+def test_grid(seed, special):
+    rng = random.Random(seed)
+    bboxes = _bboxes(rng, rng.randrange(100), special)
+    grid = SpatialGrid(bboxes, rng.choice([1, 595 / 64, 100, 1000]))
+    areas = [_area(rng, special) for _ in range(50)]
+    areas += [(-math.inf, -math.inf, math.inf, math.inf), (0, 0, 0, 0)]
+    for area in areas:
+        overlapping = grid.overlapping(*area)
+        assert overlapping.tolist() == _overlapping(bboxes, *area), area
+        assert set(overlapping.tolist()) <= set(grid.candidates(*area).tolist())
+        assert grid.contained(*area).tolist() == _contained(bboxes, *area), area
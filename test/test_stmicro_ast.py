@@ -0,0 +1,85 @@
+# Copyright (c) 2022, Niklas Hauser
+#
+# This file is part of the modm-data project.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# -----------------------------------------------------------------------------
+
+from pathlib import Path
+import pytest
+
+from modm_data.pdf import Document
+from modm_data.pdf2html.stmicro import Page, merge_area, normalize_document
+from modm_data.pdf2html.stmicro import format_document, write_html, write_html_stream
+from modm_data.pdf2html.stmicro import dumps_ast, loads_ast
+from modm_data.pdf2html.stmicro.convert import _is_skipped
+
+PDF_FILES = sorted((Path(__file__).parent / "data" / "pdf").glob("*.pdf"))
+DOCUMENTS = [(path, start) for path in PDF_FILES for start in range(Document(path).page_count)]
+
+
+def _id(param) -> str:
+    return f"{param[0].stem}-{param[1]}"
+
+
+def _areas(param):
+    # A fresh document, since the normalization modifies the areas
+    doc = Document(param[0])
+    for index in range(param[1], doc.page_count):
+        page = Page(doc.page(index))
+        if not _is_skipped(page, False):
+            yield from page.content_ast
+
+
+def _write_html(param, path, pretty) -> bool:
+    document = None
+    for area in _areas(param):
+        document = merge_area(document, area)
+    if document is None:
+        return False
+    write_html(format_document(normalize_document(document)), path, pretty)
+    return True
+
+
+@pytest.mark.parametrize("param", DOCUMENTS, ids=map(_id, DOCUMENTS))
+def test_write_html_stream(tmp_path, param):
+    written = _write_html(param, tmp_path / "document.html", True)
+    assert write_html_stream(_areas(param), tmp_path / "stream.html") == written
+    if written:
+        assert (tmp_path / "stream.html").read_bytes() == (tmp_path / "document.html").read_bytes()
+
+
+@pytest.mark.parametrize("path", PDF_FILES, ids=lambda p: p.stem)
+def test_write_html_stream_compact(tmp_path, path):
+    assert _write_html((path, 0), tmp_path / "document.html", False)
+    assert write_html_stream(_areas((path, 0)), tmp_path / "stream.html", pretty=False)
+    assert (tmp_path / "stream.html").read_bytes() == (tmp_path / "document.html").read_bytes()
+
+
+def _serialized_areas(param):
+    doc = Document(param[0])
+    for index in range(param[1], doc.page_count):
+        page = Page(doc.page(index))
+        if not _is_skipped(page, False):
+            yield from loads_ast(dumps_ast(page, page.content_ast))[1]
+
+
+@pytest.mark.parametrize("path", PDF_FILES, ids=lambda p: p.stem)
+def test_serialized_ast(tmp_path, path):
+    # The serialized AST must format to the same HTML as the live AST
+    assert write_html_stream(_areas((path, 0)), tmp_path / "document.html")
+    assert write_html_stream(_serialized_areas((path, 0)), tmp_path / "serialized.html")
+    assert (tmp_path / "serialized.html").read_bytes() == (tmp_path / "document.html").read_bytes()
+
+
+def test_serialized_ast_type_error():
+    page = Page(Document(PDF_FILES[0]).page(3))
+    areas = page.content_ast
+    areas[0].children[0].unknown = (1, 2)
+    with pytest.raises(TypeError):
+        dumps_ast(page, areas)
+    areas[0].children[0].unknown = object()
+    with pytest.raises(TypeError):
+        dumps_ast(page, areas)
@@ -0,0 +1,73 @@
+# Copyright (c) 2022, Niklas Hauser
+#
+# This file is part of the modm-data project.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# -----------------------------------------------------------------------------
+
+from pathlib import Path
+import pytest
+
+from modm_data.pdf import Document, FontStyle
+from modm_data.pdf2html.stmicro import Page
+
+PDF_FILES = sorted((Path(__file__).parent / "data" / "pdf").glob("*.pdf"))
+PAGES = [(path, index) for path in PDF_FILES
+         for index in range(Document(path).page_count)]
+
+
+def _id(param) -> str:
+    return f"{param[0].stem}-{param[1]}"
+
+
+def _page(param) -> Page:
+    # A fresh document, so that no char objects are shared
+    return Page(Document(param[0]).page(param[1]))
+
+
+def _lines(lines) -> list:
+    return [([c._index for c in line.chars], [c.unicode for c in line.chars],
+             line.bottom, line.origin, line.top, line.height, line.rotation,
+             line.offset, line._sort_origin) for line in lines]
+
+
+def _areas(page) -> list:
+    areas = list(page._areas["content"])
+    for area in page._areas["content"]:
+        areas.extend(obj.bbox for obj in page._graphics_filtered(area))
+    return areas
+
+
+@pytest.mark.parametrize("param", PAGES, ids=_id)
+def test_charlines_reference(param):
+    page, reference = _page(param), _page(param)
+    for area in _areas(page):
+        assert _lines(page._charlines_filtered(area)) == \
+               _lines(reference._charlines_filtered_reference(area))
+        assert _lines(page._charlines_filtered(area, style=FontStyle.BOLD)) == \
+               _lines(reference._charlines_filtered_reference(
+                   area, lambda c: c.style & FontStyle.BOLD))
+        assert _lines(page._charlines_filtered(area, lambda c: c.unicode != ord("e"), rtol=1)) == \
+               _lines(reference._charlines_filtered_reference(
+                   area, lambda c: c.unicode != ord("e"), rtol=1))
+
+
+@pytest.mark.parametrize("param", [p for p in PAGES if p[1] == 3], ids=_id)
+def test_charlines_unicode_fixups(param):
+    page, reference = _page(param), _page(param)
+    area = page._areas["content"][0]
+    indices = [ii for ii in page._page._char_indices_in_area(area).tolist()
+               if page._page.char(ii).unicode > 0x20][:3]
+    # Stuff the unicodes that are corrected into the char tables
+    for ppage in (page, reference):
+        ppage._page._chars["unicode"][indices] = [2, 61623, 61664]
+    text = page._page.text
+    lines = page._charlines_filtered(area)
+    assert _lines(lines) == _lines(reference._charlines_filtered_reference(area))
+    chars = {c._index: c.char for line in lines for c in line.chars}
+    assert [chars[ii] for ii in indices] == ["-", "•", "•"]
+    # The page text and char table remain unchanged
+    assert page._page._chars["unicode"][indices].tolist() == [2, 61623, 61664]
+    assert page._page.text == text
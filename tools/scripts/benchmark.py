@@ -0,0 +1,197 @@
+# Copyright (c) 2022, Niklas Hauser
+#
+# This file is part of the modm-data project.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# -----------------------------------------------------------------------------
+
+"""
+Benchmarks the PDF extraction and conversion stages on a pinned set of pages.
+
+The pages are listed per category in `test/data/benchmark.json` as 1-based
+page numbers of the synthetic documents in `test/data/pdf`, which are generated
+by `test/data/pdf/generate.py` in the layout of the ST documents. Other pages of
+the downloaded documents can be benchmarked with `--manifest` and `--pdfs`.
+Each stage is timed separately on freshly loaded pages of a fresh document and
+the best of all repetitions is reported. Results can be stored as a baseline and compared
+against later to catch regressions.
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import contextlib
+import argparse
+from pathlib import Path
+from collections import defaultdict
+sys.path.append(".")
+
+import modm_data.pdf
+from modm_data.pdf2html.stmicro import Page
+from modm_data.pdf2html.stmicro.table import Table
+from modm_data.pdf2html.stmicro import merge_area, normalize_document, format_document
+
+STAGES = ["load", "charlines", "cells", "content_ast", "normalize", "format"]
+# Differences below this are considered timing noise
+MIN_DELTA = 0.005
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def _tables(page) -> list:
+    return [obj for area in page._areas["content"]
+            for obj in page._graphics_filtered(area) if isinstance(obj, Table)]
+
+
+def bench_document(path: Path, numbers: list) -> dict:
+    """Times all stages once for the pages of a freshly opened document."""
+    # Do not reuse the open pages between the stages, nor the learned glyphs
+    # of previous repetitions
+    doc = modm_data.pdf.Document(path, max_pages=0)
+    times = defaultdict(float)
+    chars = 0
+    document = None
+    for number in numbers:
+        # Each stage gets a fresh page, so that no cached results are reused
+        elapsed, dpage = _timed(lambda: doc.page(number - 1))
+        times["load"] += elapsed
+        chars += dpage.char_count
+
+        page = Page(doc.page(number - 1))
+        times["charlines"] += sum(_timed(lambda: page._charlines_filtered(area))[0]
+                                  for area in page._areas["content"])
+
+        for table in _tables(Page(doc.page(number - 1))):
+            times["cells"] += _timed(lambda: table.cells)[0]
+
+        elapsed, areas = _timed(lambda: Page(doc.page(number - 1)).content_ast)
+        times["content_ast"] += elapsed
+        for area in areas:
+            document = merge_area(document, area)
+
+    if document is not None:
+        elapsed, document = _timed(lambda: normalize_document(document))
+        times["normalize"] += elapsed
+        times["format"] += _timed(lambda: format_document(document))[0]
+    return {"pages": len(numbers), "chars": chars, "times": dict(times)}
+
+
+def bench_category(pdf_path: Path, documents: dict, repeat: int) -> dict:
+    result = {"pages": 0, "chars": 0, "times": defaultdict(float)}
+    for name, numbers in sorted(documents.items()):
+        # The conversion prints and logs a lot of debug output
+        with open(os.devnull, "w") as devnull:
+            with contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+                runs = [bench_document(pdf_path / f"{name}.pdf", numbers) for _ in range(repeat)]
+        result["pages"] += runs[0]["pages"]
+        result["chars"] += runs[0]["chars"]
+        for stage in STAGES:
+            result["times"][stage] += min(run["times"].get(stage, 0) for run in runs)
+    times = result["times"]
+    total = times["load"] + times["content_ast"]
+    result["times"] = dict(times)
+    result["pages_per_s"] = result["pages"] / total if total else 0
+    result["chars_per_s"] = result["chars"] / times["load"] if times["load"] else 0
+    return result
+
+
+def discover(pdf_path: Path, manifest: dict, limit: int = 2):
+    """Pins the first rotated pages and bit field pages of all documents."""
+    bits = "".join(str(b) for b in range(31, 15, -1))
+    for name in sorted({name for docs in manifest.values() for name in docs}):
+        doc = modm_data.pdf.Document(pdf_path / f"{name}.pdf")
+        found = defaultdict(list)
+        for page in doc.pages():
+            if page.rotation and len(found["rotated"]) < limit:
+                found["rotated"].append(page.number)
+            text = "".join(map(chr, page._chars["unicode"].tolist())).replace(" ", "")
+            if bits in text and len(found["bit_fields"]) < limit:
+                found["bit_fields"].append(page.number)
+            if all(len(found[c]) >= limit for c in ("rotated", "bit_fields")):
+                break
+        for category, numbers in found.items():
+            if numbers:
+                manifest.setdefault(category, {})[name] = numbers
+
+
+def _dump_manifest(manifest: dict) -> str:
+    categories = []
+    for category, documents in manifest.items():
+        documents = [f'        "{name}": {json.dumps(numbers)}' for name, numbers in documents.items()]
+        documents = "\n" + ",\n".join(documents) + "\n    " if documents else ""
+        categories.append(f'    "{category}": {{{documents}}}')
+    return "{\n" + ",\n".join(categories) + "\n}\n"
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    success = True
+    for category, result in results["results"].items():
+        if category not in baseline["results"]:
+            continue
+        for stage, value in result["times"].items():
+            reference = baseline["results"][category]["times"].get(stage)
+            if not reference or abs(value - reference) < MIN_DELTA:
+                continue
+            ratio = value / reference
+            if ratio > 1 + tolerance:
+                print(f"REGRESSION {category}/{stage}: {reference:.3f}s -> {value:.3f}s ({ratio:.2f}x)")
+                success = False
+            elif ratio < 1 - tolerance:
+                print(f"Improved {category}/{stage}: {reference:.3f}s -> {value:.3f}s ({ratio:.2f}x)")
+    ratio = results["peak_rss_mib"] / baseline["peak_rss_mib"]
+    if ratio > 1 + tolerance:
+        print(f"REGRESSION peak RSS: {baseline['peak_rss_mib']:.1f}MiB -> "
+              f"{results['peak_rss_mib']:.1f}MiB ({ratio:.2f}x)")
+        success = False
+    return success
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--manifest", type=Path, default=Path("test/data/benchmark.json"))
+    parser.add_argument("--pdfs", type=Path, default=Path("test/data/pdf"))
+    parser.add_argument("--category", action="append")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--discover", action="store_true")
+    args = parser.parse_args()
+
+    manifest = json.loads(args.manifest.read_text())
+    if args.discover:
+        discover(args.pdfs, manifest)
+        args.manifest.write_text(_dump_manifest(manifest))
+        return True
+
+    results = {}
+    for category, documents in manifest.items():
+        if not documents or (args.category and category not in args.category):
+            continue
+        result = results[category] = bench_category(args.pdfs, documents, args.repeat)
+        times = " ".join(f"{stage}={result['times'].get(stage, 0):.3f}s" for stage in STAGES)
+        print(f"{category:>16}: {result['pages']:3} pages {result['pages_per_s']:6.2f} pages/s "
+              f"{result['chars_per_s']:9.0f} chars/s  {times}")
+    # Linux reports the maximum resident set size in KiB
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Peak RSS: {peak_rss:.1f} MiB")
+
+    results = {"results": results, "peak_rss_mib": peak_rss}
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=4))
+    if args.baseline:
+        return compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+    return True
+
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -50,6 +50,8 @@ def main():
             doc = DatasheetMicro(path)
         elif path.stem.startswith("RM"):
             doc = ReferenceManual(path)
+        # Later processes load the parsed chapters from the cache
+        doc.preload()
 
         print(doc.path_pdf.relative_to(Path().cwd()),
               doc.path.relative_to(Path().cwd()),
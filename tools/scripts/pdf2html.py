@@ -7,22 +7,90 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # -----------------------------------------------------------------------------
 
-import os
 import re
 import sys
+import shutil
+import atexit
 import argparse
-import multiprocessing
 from pathlib import Path
 sys.path.append(".")
 
 import modm_data.pdf
 import modm_data.pdf2html
+from modm_data.utils import PROFILER
+from modm_data.html import write_manifest
 from modm_data.pdf2html.stmicro import convert as convert_st, patch as patch_st
+from modm_data.pdf2html.stmicro import convert_chapters as convert_chapters_st
+from modm_data.pdf2html.stmicro import convert_documents as convert_documents_st
+
+
+def _chapters(doc, output_dir: Path) -> list:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    dests = [(0, "introduction")]
+    for toc in doc.toc:
+        if toc.level == 0 and not toc.title.startswith("Table"):
+            title = toc.title.lower().strip("0123456789").strip()
+            title = re.sub(r"[\(\)/®&\n\r,;:™]", "", title)
+            title = re.sub(r"[ -]", "_", title)
+            title = re.sub(r"_+", "_", title)
+            title = title.replace("²", "2")
+            if not any(c in toc.title for c in {"Contents", "List of ", "Index"}):
+                dests.append((toc.page, title))
+            print(toc.page, toc.title)
+    dests.append((doc.page_count, None))
+    ranges = [(p0, p1, t0) for (p0, t0), (p1, t1) in zip(dests, dests[1:]) if p0 != p1]
+    chapters = []
+    for ii, (p0, p1, title) in enumerate(ranges):
+        output_file = output_dir / f"chapter_{ii}_{title}.html"
+        chapters.append((range(p0, p1), output_file))
+        print(p0 + 1, p1, output_file)
+    return chapters
+
+
+def convert_batch(args) -> bool:
+    # Each document is converted into chapters of a folder with its name.
+    # The folder is only moved into the output once it is complete, so that
+    # failed or interrupted documents are converted again next time.
+    success = True
+    documents = []
+    output = Path(args.output)
+    partial = output / ".partial"
+    for path in args.batch:
+        # The document is only opened here to plan the chapters, the workers
+        # open it again when its pages are converted
+        doc = modm_data.pdf.Document(path)
+        print(doc.name, doc.page_count, doc.metadata, doc.is_tagged)
+        if doc.page_count == 0 or not doc.page(1).width:
+            print(f"Corrupt PDF '{path}'!", file=sys.stderr)
+            success = False
+            continue
+        shutil.rmtree(partial / doc.name, ignore_errors=True)
+        documents.append((path, _chapters(doc, partial / doc.name)))
+        del doc
+
+    converted = convert_documents_st(documents, jobs=args.jobs, incremental=args.incremental,
+                                     stream=args.stream, log_path=args.log,
+                                     cache=args.cache, glyphs=args.glyph_cache)
+    if len(converted) != len(documents):
+        success = False
+    for path in converted:
+        doc = modm_data.pdf.Document(path)
+        if not patch_st(doc, partial / doc.name):
+            print(f"Patching {doc.name} failed!", file=sys.stderr)
+            success = False
+            continue
+        write_manifest(partial / doc.name)
+        shutil.rmtree(output / doc.name, ignore_errors=True)
+        (partial / doc.name).replace(output / doc.name)
+    if partial.exists() and not any(partial.iterdir()):
+        partial.rmdir()
+    return success
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--document", type=str)
+    parser.add_argument("--batch", nargs="+")
     parser.add_argument("--output", type=str, default="")
     parser.add_argument("--page", type=int, action="append")
     parser.add_argument("--range", action="append")
@@ -33,12 +101,29 @@ def main():
     parser.add_argument("--ascii", action="store_true")
     parser.add_argument("--html", action="store_true")
     parser.add_argument("--parallel", action="store_true")
+    parser.add_argument("--jobs", type=int)
     parser.add_argument("--chapters", action="store_true")
     parser.add_argument("--tags", action="store_true")
     parser.add_argument("--all", action="store_true")
+    parser.add_argument("--cache", action="store_true")
+    parser.add_argument("--glyph-cache", action="store_true")
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--profile", type=str)
+    parser.add_argument("--log", type=Path)
     args = parser.parse_args()
 
-    doc = modm_data.pdf.Document(args.document)
+    if args.profile:
+        PROFILER.enable()
+        # Writes the .json, .csv and .folded reports also on errors and only
+        # then restores the pdfium functions, since exit handlers run reversed
+        atexit.register(PROFILER.disable)
+        atexit.register(PROFILER.write, args.profile)
+
+    if args.batch:
+        return convert_batch(args)
+
+    doc = modm_data.pdf.Document(args.document, cache=args.cache, glyphs=args.glyph_cache)
     print(doc.page_count, doc.metadata, doc.is_tagged)
     if doc.page_count == 0 or not doc.page(1).width:
         print("Corrupt PDF!")
@@ -63,30 +148,15 @@ def main():
     if modm_data.pdf2html.stmicro.is_compatible(doc) or True:
         if args.parallel:
             output_dir = (output_path.parent / output_path.stem)
-            output_dir.mkdir(parents=True, exist_ok=True)
-            dests = [(0, "introduction")]
-            for toc in doc.toc:
-                if toc.level == 0 and not toc.title.startswith("Table"):
-                    title = toc.title.lower().strip("0123456789").strip()
-                    title = re.sub(r"[\(\)/®&\n\r,;:™]", "", title)
-                    title = re.sub(r"[ -]", "_", title)
-                    title = re.sub(r"_+", "_", title)
-                    title = title.replace("²", "2")
-                    if not any(c in toc.title for c in {"Contents", "List of ", "Index"}):
-                        dests.append((toc.page, title))
-                    print(toc.page, toc.title)
-            dests.append((doc.page_count, None))
-            ranges = [(p0, p1, t0) for (p0, t0), (p1, t1) in zip(dests, dests[1:]) if p0 != p1]
-            calls = []
-            for ii, (p0, p1, title) in enumerate(ranges):
-                call = f"python3 {__file__} --document {args.document} --html " \
-                       f"--output {output_dir}/chapter_{ii}_{title}.html --range {p0 + 1}:{p1}"
-                calls.append(call)
-                print(call)
-            with multiprocessing.Pool() as pool:
-                retvals = pool.map(os.system, calls)
-            if all(os.WEXITSTATUS(r) == 0 for r in retvals):
-                return patch_st(doc, output_dir)
+            chapters = _chapters(doc, output_dir)
+            # A failed conversion must not leave the manifest of the last one
+            (output_dir / "chapters.json").unlink(missing_ok=True)
+            if convert_chapters_st(doc, chapters, jobs=args.jobs,
+                                   incremental=args.incremental, stream=args.stream) and \
+                    patch_st(doc, output_dir):
+                # The manifest must describe the patched chapters
+                write_manifest(output_dir)
+                return True
             return False
         else:
             return convert_st(doc, page_range, output_path,
@@ -94,7 +164,9 @@ def main():
                               render_html=args.html, render_png=args.png,
                               render_pdf=args.pdf, render_all=args.all,
                               show_ascii=args.ascii, show_ast=args.ast,
-                              show_tree=args.tree, show_tags=args.tags)
+                              show_tree=args.tree, show_tags=args.tags,
+                              jobs=args.jobs or 1, incremental=args.incremental,
+                              stream=args.stream)
     else:
         print("Unknown document template!")
         return False